@@ -7,6 +7,8 @@ from pathlib import Path
 # Configurações do banco de dados
 DATABASE_PATH = "data/mdm_database.db"
 DATABASE_DIR = "data"
+STORAGE_BACKEND = os.getenv("MDM_STORAGE", "arquivo")  # 'arquivo' ou 'memoria' (database.storage)
+MEMORY_STORAGE_LOAD = True  # em memória: carregar DATABASE_PATH (se existir) na inicialização
 
 # Configurações de autenticação
 SECRET_KEY = os.getenv("SECRET_KEY", "mdm_secret_key_2024")
@@ -29,6 +31,55 @@ DUPLICATE_CHECK_FIELDS = {
     'fornecedores': ['nome', 'cnpj', 'email']
 }
 
+# Configurações do cache de registros (get_* e get_many*)
+RECORD_CACHE_SIZE = 10000  # registros mantidos em memória (LRU)
+
+# Configurações da replicação para o standby (database.replication)
+REPLICATION_ENABLED = os.getenv("MDM_REPLICATION", "0") == "1"
+REPLICA_PATH = "data/mdm_replica.db"
+REPLICATION_INTERVAL = 5  # segundos entre ciclos de aplicação do feed
+REPLICA_MAX_LAG = 30  # segundos de atraso acima dos quais as leituras voltam ao primário
+
+# Configurações de backup online (utils.backup_manager)
+BACKUP_DIR = "data/backups"
+BACKUP_PAGES_PER_STEP = 256  # páginas copiadas por passo (1 MB com páginas de 4 KB)
+BACKUP_STEP_SLEEP = 0.02  # segundos de pausa entre passos, para limitar o I/O
+BACKUP_MAX_RESTARTS = 3  # recomeços tolerados antes de copiar em um só passo
+
+# Configurações de arquivamento (utils.archive_manager)
+ARCHIVE_AFTER_DAYS = 180  # inativos sem alteração há mais tempo saem das tabelas quentes
+ARCHIVE_BATCH_SIZE = 500  # registros movidos por transação
+
+# Configurações da manutenção agendada (database.maintenance)
+MAINTENANCE_ENABLED = os.getenv("MDM_MAINTENANCE", "1") == "1"
+MAINTENANCE_INTERVAL = 6 * 3600  # segundos entre manutenções completas
+MAINTENANCE_CHECK_INTERVAL = 60  # segundos entre verificações de lotes grandes
+MAINTENANCE_CHANGES_THRESHOLD = 10000  # linhas alteradas que antecipam o ANALYZE
+MAINTENANCE_FREE_PAGES = 2560  # páginas livres (10 MB com páginas de 4 KB) que antecipam o incremental_vacuum
+MAINTENANCE_WAL_BYTES = 64 * 1024 * 1024  # tamanho do WAL que antecipa o checkpoint
+MAINTENANCE_VACUUM_STEP = 1000  # páginas devolvidas por transação da fila de escrita
+MAINTENANCE_ANALYSIS_LIMIT = 1000  # linhas amostradas por índice no ANALYZE
+MAINTENANCE_HISTORY = 20  # execuções mantidas no histórico
+
+# Configurações dos orçamentos de tempo das consultas (database.query_budget)
+QUERY_BUDGETS = {
+    'interativa': 5.0,  # segundos por requisição dos servidores web
+    'lote': 600.0  # segundos por exportação, importação ou varredura completa
+}
+QUERY_BUDGET_CHECK_STEPS = 10000  # instruções da VM do SQLite entre verificações do prazo
+
+# Configurações do rastreamento de SQL (database.sql_trace); desligado por padrão: mede cada
+# instrução e cada linha lida, para diagnóstico (MDM_SQL_TRACE=1)
+SQL_TRACE_ENABLED = os.getenv("MDM_SQL_TRACE", "0") == "1"
+SLOW_QUERY_THRESHOLD = 0.5  # segundos a partir dos quais a instrução vai para o log de lentas
+SLOW_QUERY_LOG_PATH = "data/slow_queries.log"
+SLOW_QUERY_LOG_SIZE = 200  # instruções lentas mantidas em memória para a API
+SQL_TRACE_MAX_FINGERPRINTS = 1000  # impressões digitais distintas agregadas
+
+# Configurações do snapshot de caches para a partida a quente (database.cache_snapshot)
+CACHE_SNAPSHOT_ENABLED = os.getenv("MDM_CACHE_SNAPSHOT", "1") == "1"
+CACHE_SNAPSHOT_PATH = "data/cache_snapshot.bin"
+
 # Configurações de paginação
 ITEMS_PER_PAGE = 20
 
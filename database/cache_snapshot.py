@@ -0,0 +1,170 @@
+"""
+Snapshot dos caches em arquivo, para a partida a quente depois de um reinício
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+import mmap
+import os
+import pickle
+import struct
+import time
+
+from .database_manager import DatabaseManager, db_manager
+from .record_cache import RecordCache
+from config import CACHE_SNAPSHOT_PATH
+
+# Cabeçalho do arquivo: assinatura, versão do formato e tamanho do índice (pickle); depois
+# do índice vêm as seções, cada uma um pickle próprio
+SNAPSHOT_MAGIC = b'MDMCACHE'
+SNAPSHOT_FORMAT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct('<8sIQ')
+
+class CacheSnapshot:
+    """Grava e recarrega os resultados memoizados por geração e os caches de registros
+
+    Cada resultado memoizado já traz as gerações lidas antes do seu cálculo, e cada
+    registro do cache a geração da sua tabela lida antes da consulta que o trouxe; o
+    arquivo guarda essas gerações, não as do momento da gravação. Assim uma alteração
+    feita depois da leitura, inclusive por outro processo (outro servidor, a CLI de
+    arquivamento), invalida a entrada.
+
+    O arquivo tem um índice pequeno e uma seção por resultado memoizado e por (tabela,
+    geração) dos registros. Na carga o arquivo é mapeado em memória (mmap), o índice é
+    lido e só as seções cujas gerações ainda são as atuais são desserializadas; o que
+    ficou velho nem é lido, e será recalculado no primeiro uso, como antes. Arquivo de
+    outra versão do formato ou de outro banco é ignorado.
+
+    Os gerenciadores registrados entram juntos no arquivo (os caches de registros são um
+    por banco; os resultados memoizados, um por gerenciador), e cada um recebe de volta
+    tudo o que ainda vale.
+    """
+
+    def __init__(self, *db_managers: DatabaseManager, path: str = None):
+        self.db_managers = list(db_managers)
+        self.path = path or CACHE_SNAPSHOT_PATH
+
+    def register(self, db_manager: DatabaseManager):
+        """Incluir os caches de mais um gerenciador (mesmo banco) no snapshot"""
+        if db_manager not in self.db_managers:
+            self.db_managers.append(db_manager)
+
+    def _database_id(self) -> Optional[str]:
+        """Banco a que o snapshot pertence (None: banco em memória sem arquivo de origem)"""
+        storage = self.db_managers[0].storage
+        caminho = storage.path or getattr(storage, 'carregado_de', None)
+        return str(Path(caminho).resolve()) if caminho else None
+
+    def _caches(self) -> List[RecordCache]:
+        """Caches de registros distintos dos gerenciadores registrados"""
+        return list({id(gerenciador.cache): gerenciador.cache for gerenciador in self.db_managers}.values())
+
+    def save(self) -> Dict[str, Any]:
+        """Gravar os caches atuais no arquivo (substituído só no fim, de uma vez)"""
+        inicio = time.monotonic()
+        banco = self._database_id()
+        if banco is None:
+            return {'gravado': False, 'motivo': 'banco_sem_arquivo'}
+
+        # (tipo, nome, gerações de que depende, conteúdo)
+        secoes = []
+        memo = {}
+        for gerenciador in self.db_managers:
+            memo.update(gerenciador._generation_memo)
+        for chave, (geracoes, valor) in memo.items():
+            secoes.append(('memo', chave, geracoes, (geracoes, valor)))
+
+        registros = {}
+        for cache in self._caches():
+            for tabela, entradas in cache.export().items():
+                for registro, chaves, geracao in entradas:
+                    # Sem geração (lido fora de get_many_by_key) não há como validar depois
+                    if geracao is not None:
+                        registros.setdefault((tabela, geracao), {})[registro.id] = (registro, chaves, geracao)
+        for (tabela, geracao), unicos in registros.items():
+            secoes.append(('registros', tabela, {tabela: geracao}, list(unicos.values())))
+
+        indice, dados, posicao = [], [], 0
+        for tipo, nome, geracoes, conteudo in secoes:
+            serializado = pickle.dumps(conteudo, protocol=pickle.HIGHEST_PROTOCOL)
+            indice.append((tipo, nome, geracoes, posicao, len(serializado)))
+            dados.append(serializado)
+            posicao += len(serializado)
+        cabecalho = pickle.dumps({
+            'banco': banco,
+            'salvo_em': datetime.now().isoformat(),
+            'secoes': indice
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        parcial = self.path + '.parcial'
+        with open(parcial, 'wb') as arquivo:
+            arquivo.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, len(cabecalho)))
+            arquivo.write(cabecalho)
+            arquivo.writelines(dados)
+        os.replace(parcial, self.path)
+
+        return {
+            'gravado': True,
+            'arquivo': self.path,
+            'bytes': SNAPSHOT_HEADER.size + len(cabecalho) + posicao,
+            'memo': len(memo),
+            'registros': sum(len(unicos) for unicos in registros.values()),
+            'duracao': round(time.monotonic() - inicio, 3)
+        }
+
+    def load(self) -> Dict[str, Any]:
+        """Recarregar nos gerenciadores o que do arquivo ainda vale para as gerações atuais"""
+        inicio = time.monotonic()
+        if not Path(self.path).exists():
+            return {'carregado': False, 'motivo': 'sem_snapshot'}
+
+        with open(self.path, 'rb') as arquivo:
+            if os.fstat(arquivo.fileno()).st_size < SNAPSHOT_HEADER.size:
+                return {'carregado': False, 'motivo': 'snapshot_invalido'}
+            with mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa, memoryview(mapa) as vista:
+                assinatura, versao, tamanho = SNAPSHOT_HEADER.unpack_from(mapa)
+                if assinatura != SNAPSHOT_MAGIC or versao != SNAPSHOT_FORMAT_VERSION:
+                    return {'carregado': False, 'motivo': 'outra_versao'}
+                base = SNAPSHOT_HEADER.size + tamanho
+                try:
+                    with vista[SNAPSHOT_HEADER.size:base] as dados:
+                        cabecalho = pickle.loads(dados)
+                    if cabecalho['banco'] != self._database_id():
+                        return {'carregado': False, 'motivo': 'outro_banco'}
+
+                    atuais = self.db_managers[0].get_generations()
+                    memo, registros, descartadas = {}, {}, 0
+                    for tipo, nome, geracoes, posicao, tamanho in cabecalho['secoes']:
+                        if any(atuais.get(tabela) != geracao for tabela, geracao in geracoes.items()):
+                            descartadas += 1
+                            continue
+                        if base + posicao + tamanho > len(mapa):
+                            raise EOFError("snapshot truncado")
+                        with vista[base + posicao:base + posicao + tamanho] as dados:
+                            conteudo = pickle.loads(dados)
+                        if tipo == 'memo':
+                            memo[nome] = conteudo
+                        else:
+                            registros.setdefault(nome, []).extend(conteudo)
+                except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, KeyError, ValueError):
+                    return {'carregado': False, 'motivo': 'snapshot_invalido'}
+
+        for gerenciador in self.db_managers:
+            for chave, entrada in memo.items():
+                gerenciador._generation_memo.setdefault(chave, entrada)
+        for cache in self._caches():
+            for tabela, entradas in registros.items():
+                cache.load_entries(tabela, entradas)
+
+        return {
+            'carregado': True,
+            'salvo_em': cabecalho['salvo_em'],
+            'memo_validos': len(memo),
+            'registros_validos': sum(len(entradas) for entradas in registros.values()),
+            'secoes_descartadas': descartadas,
+            'duracao': round(time.monotonic() - inicio, 3)
+        }
+
+# Instância global do snapshot (o servidor registra os gerenciadores dos demais módulos)
+cache_snapshot = CacheSnapshot(db_manager)
@@ -3,33 +3,537 @@ Gerenciador de banco de dados SQLite para o sistema MDM
 """
 import sqlite3
 import hashlib
-from datetime import datetime
-from pathlib import Path
-from typing import List, Optional, Dict, Any, Tuple
+import threading
+import re
+import copy
+import weakref
+from contextlib import contextmanager
+from typing import List, Optional, Dict, Any, Tuple, Callable, Iterable
+from concurrent.futures import Future
 import json
+from dataclasses import fields
+from functools import partial
+from sys import intern
 import pandas as pd
 
-from .models import Cliente, Produto, Fornecedor, AuditLog, Usuario
-from config import DATABASE_PATH, DATABASE_DIR, create_directories
+from .write_queue import WriteQueue, WriteOperation
+from .record_cache import RecordCache
+from .value_dictionary import ValueDictionary
+from .query_budget import query_budgets
+from .sql_trace import sql_tracer
+from .storage import StorageBackend, SQLiteFileBackend, create_storage
+from .models import (
+    Cliente, Produto, Fornecedor, AuditLog, Usuario,
+    ClienteRecord, ProdutoRecord, FornecedorRecord, AuditLogRecord, UsuarioRecord
+)
+from config import DATABASE_DIR, RECORD_CACHE_SIZE, create_directories
+
+# Colunas de baixa cardinalidade: o mesmo texto se repete em milhares de linhas
+SHARED_VALUE_FIELDS = {
+    'tipo', 'cidade', 'estado', 'categoria', 'subcategoria', 'unidade_medida',
+    'data_criacao', 'data_atualizacao', 'criado_por', 'atualizado_por',
+    'tabela', 'operacao', 'usuario', 'data_operacao', 'perfil'
+}
+
+# Colunas gravadas como códigos inteiros da tabela dicionario (ver ValueDictionary); os
+# modelos e as APIs continuam vendo o texto
+ENCODED_COLUMNS = {
+    'clientes': ('cidade', 'estado', 'tipo'),
+    'produtos': ('categoria', 'subcategoria', 'unidade_medida'),
+    'fornecedores': ('cidade', 'estado')
+}
+
+# Códigos fixos, usados no CHECK de clientes.tipo
+FIXED_CODES = {'tipo': {'pessoa_fisica': 1, 'pessoa_juridica': 2}}
+
+def decoded_value(tabela: str, coluna: str) -> str:
+    """Expressão SQL com o texto de uma coluna codificada (nas demais, a própria coluna)"""
+    if coluna not in ENCODED_COLUMNS.get(tabela.removesuffix('_arquivo'), ()):
+        return coluna
+    return f"(SELECT valor FROM dicionario WHERE campo = '{coluna}' AND codigo = {tabela}.{coluna})"
+
+def decoded_column(tabela: str, coluna: str) -> str:
+    """Coluna do SELECT com o texto de uma coluna codificada, sob o nome original"""
+    valor = decoded_value(tabela, coluna)
+    return valor if valor == coluna else f"{valor} AS {coluna}"
+
+def encoded_condition(tabela: str, coluna: str, operador: str) -> str:
+    """Condição do WHERE sobre o texto de uma coluna (ex.: operador 'LIKE ?'), resolvida no dicionário"""
+    if coluna not in ENCODED_COLUMNS.get(tabela, ()):
+        return f"{coluna} {operador}"
+    if operador.startswith('='):
+        return f"{coluna} = (SELECT codigo FROM dicionario WHERE campo = '{coluna}' AND valor {operador})"
+    return f"{coluna} IN (SELECT codigo FROM dicionario WHERE campo = '{coluna}' AND valor {operador})"
+
+def _compile_row_factory(record_cls, encoded: Tuple[str, ...] = ()) -> Tuple[str, Any]:
+    """Pré-compilar lista de colunas e row factory que constroem o registro posicionalmente
+
+    Nas colunas codificadas a factory recebe decode (ver query_records) e troca o código pelo texto.
+    """
+    names = [f.name for f in fields(record_cls)]
+    columns = ', '.join(names)
+    shared = tuple(i for i, name in enumerate(names) if name in SHARED_VALUE_FIELDS and name not in encoded)
+    codificadas = tuple((i, name) for i, name in enumerate(names) if name in encoded)
+    ativo = names.index('ativo') if 'ativo' in names else None
+
+    def factory(cursor, row, decode=None):
+        values = list(row)
+        # Compartilhar uma única instância de cada texto repetido entre os registros
+        for i in shared:
+            value = values[i]
+            if value.__class__ is str:
+                values[i] = intern(value)
+        # Textos do dicionário já são instâncias únicas
+        for i, name in codificadas:
+            values[i] = decode(name, values[i])
+        if ativo is not None:
+            values[ativo] = values[ativo] == 1
+        return record_cls(*values)
+
+    return columns, factory
+
+# Colunas na ordem dos campos de cada modelo e row factory correspondente
+RECORD_MAPPINGS = {
+    'clientes': _compile_row_factory(ClienteRecord, ENCODED_COLUMNS['clientes']),
+    'produtos': _compile_row_factory(ProdutoRecord, ENCODED_COLUMNS['produtos']),
+    'fornecedores': _compile_row_factory(FornecedorRecord, ENCODED_COLUMNS['fornecedores']),
+    'audit_log': _compile_row_factory(AuditLogRecord),
+    'usuarios': _compile_row_factory(UsuarioRecord)
+}
+
+# Índices parciais sobre as linhas ativas (quase toda consulta filtra ativo = 1) e compostos
+# que cobrem as consultas do SearchEngine e do dashboard. A coluna ativo ao final permite
+# que o SQLite use o índice parcial como covering index.
+ACTIVE_ROW_INDEXES = {
+    'idx_clientes_ativos_nome': "clientes(nome, cpf_cnpj, ativo) WHERE ativo = 1",
+    'idx_clientes_ativos_estado': "clientes(estado, nome, ativo) WHERE ativo = 1",
+    'idx_clientes_ativos_tipo': "clientes(tipo, nome, ativo) WHERE ativo = 1",
+    'idx_clientes_ativos_cidade': "clientes(cidade, ativo) WHERE ativo = 1",
+    'idx_clientes_ativos_email': "clientes(email, ativo) WHERE ativo = 1",
+    'idx_clientes_ativos_data_criacao': "clientes(data_criacao, ativo) WHERE ativo = 1",
+    'idx_produtos_ativos_nome': "produtos(nome, codigo, ativo) WHERE ativo = 1",
+    'idx_produtos_ativos_categoria': "produtos(categoria, subcategoria, ativo) WHERE ativo = 1",
+    'idx_produtos_ativos_subcategoria': "produtos(subcategoria, ativo) WHERE ativo = 1",
+    'idx_produtos_ativos_preco': "produtos(preco, ativo) WHERE ativo = 1",
+    'idx_produtos_ativos_data_criacao': "produtos(data_criacao, ativo) WHERE ativo = 1",
+    'idx_fornecedores_ativos_nome': "fornecedores(nome, cnpj, ativo) WHERE ativo = 1",
+    'idx_fornecedores_ativos_estado': "fornecedores(estado, nome, ativo) WHERE ativo = 1",
+    'idx_fornecedores_ativos_cidade': "fornecedores(cidade, ativo) WHERE ativo = 1",
+    'idx_fornecedores_ativos_email': "fornecedores(email, ativo) WHERE ativo = 1",
+    'idx_fornecedores_ativos_data_criacao': "fornecedores(data_criacao, ativo) WHERE ativo = 1"
+}
+
+# Documento (CPF/CNPJ) só com dígitos, mantido pelo DatabaseManager a cada escrita:
+# tabela -> (coluna digitada pelo usuário, coluna normalizada)
+DOCUMENT_COLUMNS = {
+    'clientes': ('cpf_cnpj', 'cpf_cnpj_digitos'),
+    'fornecedores': ('cnpj', 'cnpj_digitos')
+}
+
+# Únicos entre os ativos: duplicatas mescladas continuam na tabela, desativadas
+DOCUMENT_INDEXES = {
+    'idx_clientes_cpf_cnpj_digitos': "clientes(cpf_cnpj_digitos) WHERE ativo = 1",
+    'idx_fornecedores_cnpj_digitos': "fornecedores(cnpj_digitos) WHERE ativo = 1"
+}
+
+# Chaves aceitas por get_many_by_key: únicas na tabela (as de documento, entre os ativos)
+LOOKUP_KEYS = {
+    'clientes': {'id', 'cpf_cnpj', 'cpf_cnpj_digitos'},
+    'produtos': {'id', 'codigo'},
+    'fornecedores': {'id', 'cnpj', 'cnpj_digitos'},
+    'usuarios': {'id', 'username'},
+    'audit_log': {'id'}
+}
+
+# Tabelas cujos registros passam pelo RecordCache
+CACHED_TABLES = ('clientes', 'produtos', 'fornecedores')
+
+# Valores por consulta IN (...), bem abaixo do limite de parâmetros do SQLite
+BATCH_CHUNK_SIZE = 500
+
+def normalize_document(documento: str) -> Optional[str]:
+    """Apenas os dígitos de um CPF/CNPJ (None quando não há dígitos)"""
+    return re.sub(r'\D', '', documento or '') or None
+
+# Upsert: chave natural de cada tabela e campos de conteúdo (os que entram no hash)
+UPSERT_KEYS = {'clientes': 'cpf_cnpj', 'produtos': 'codigo', 'fornecedores': 'cnpj'}
+
+CONTENT_FIELDS = {
+    tabela: tuple(f.name for f in fields(model)
+                  if f.name not in ('id', 'data_criacao', 'data_atualizacao', 'criado_por', 'atualizado_por'))
+    for tabela, model in (('clientes', Cliente), ('produtos', Produto), ('fornecedores', Fornecedor))
+}
+
+def content_hash(tabela: str, registro: Any, **sobrescritos) -> str:
+    """Hash do conteúdo de negócio do registro (ignora id, datas e autoria)
+
+    sobrescritos substitui campos do registro (ex.: ativo=False ao desativar).
+    """
+    valores = []
+    for campo in CONTENT_FIELDS[tabela]:
+        valor = sobrescritos[campo] if campo in sobrescritos else getattr(registro, campo)
+        if valor is None:
+            valor = ''
+        elif isinstance(valor, bool):
+            valor = int(valor)
+        elif isinstance(valor, (int, float)):
+            valor = float(valor)
+        valores.append(valor)
+    dados = json.dumps(valores, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(dados.encode('utf-8'), digest_size=16).hexdigest()
+
+# Índices (chave, hash_conteudo): a comparação com os dados recebidos é respondida só pelo índice
+CONTENT_HASH_INDEXES = {
+    ('clientes', 'cpf_cnpj'): 'idx_clientes_cpf_cnpj_hash',
+    ('clientes', 'cpf_cnpj_digitos'): 'idx_clientes_cpf_cnpj_digitos_hash',
+    ('produtos', 'codigo'): 'idx_produtos_codigo_hash',
+    ('fornecedores', 'cnpj'): 'idx_fornecedores_cnpj_hash',
+    ('fornecedores', 'cnpj_digitos'): 'idx_fornecedores_cnpj_digitos_hash'
+}
+
+def _build_upsert_sql(tabela: str) -> str:
+    """INSERT ... ON CONFLICT DO UPDATE ... RETURNING id pela chave natural da tabela"""
+    chave = UPSERT_KEYS[tabela]
+    coluna_digitos = DOCUMENT_COLUMNS.get(tabela, (None, None))[1]
+    campos = list(CONTENT_FIELDS[tabela]) + ([coluna_digitos] if coluna_digitos else []) + ['hash_conteudo']
+    colunas = campos + ['criado_por', 'atualizado_por']
+    atualizacao = ', '.join([f"{campo} = excluded.{campo}" for campo in campos] +
+                            ["data_atualizacao = CURRENT_TIMESTAMP", "atualizado_por = excluded.atualizado_por"])
+
+    # Documento reformatado casa pelo índice de dígitos (ativos); inativo, pela chave exata
+    conflitos = []
+    if coluna_digitos:
+        conflitos.append(f"ON CONFLICT ({coluna_digitos}) WHERE ativo = 1 DO UPDATE SET {atualizacao}")
+    conflitos.append(f"ON CONFLICT ({chave}) DO UPDATE SET {atualizacao}")
+    return (f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))}) "
+            f"{' '.join(conflitos)} RETURNING id")
+
+UPSERT_SQL = {tabela: _build_upsert_sql(tabela) for tabela in UPSERT_KEYS}
+
+# Índices da auditoria: histórico por registro, por tabela, por período e por usuário
+AUDIT_INDEXES = {
+    'idx_audit_registro': "audit_log(tabela, registro_id, data_operacao)",
+    'idx_audit_tabela_data': "audit_log(tabela, data_operacao)",
+    'idx_audit_data': "audit_log(data_operacao, tabela)",
+    'idx_audit_usuario': "audit_log(usuario, data_operacao)"
+}
+
+# Contadores mantidos por triggers: o dashboard lê uma linha por chave em vez de contar tabelas
+COUNTED_TABLES = ('clientes', 'produtos', 'fornecedores')
+
+COUNTER_TRIGGERS = {
+    'trg_{tabela}_contador_insert': """
+        AFTER INSERT ON {tabela} WHEN NEW.ativo = 1 BEGIN
+            UPDATE contadores_registros SET ativos = ativos + 1 WHERE tabela = '{tabela}';
+        END""",
+    'trg_{tabela}_contador_delete': """
+        AFTER DELETE ON {tabela} WHEN OLD.ativo = 1 BEGIN
+            UPDATE contadores_registros SET ativos = ativos - 1 WHERE tabela = '{tabela}';
+        END""",
+    'trg_{tabela}_contador_ativo': """
+        AFTER UPDATE OF ativo ON {tabela} WHEN (OLD.ativo = 1) != (NEW.ativo = 1) BEGIN
+            UPDATE contadores_registros SET ativos = ativos + (NEW.ativo = 1) - (OLD.ativo = 1)
+            WHERE tabela = '{tabela}';
+        END"""
+}
+
+AUDIT_COUNTER_TRIGGERS = {
+    'trg_audit_contador_insert': """
+        AFTER INSERT ON audit_log BEGIN
+            INSERT INTO contadores_auditoria (dia, tabela, total)
+            VALUES (COALESCE(date(NEW.data_operacao), date('now')), NEW.tabela, 1)
+            ON CONFLICT (dia, tabela) DO UPDATE SET total = total + 1;
+        END""",
+    'trg_audit_contador_delete': """
+        AFTER DELETE ON audit_log BEGIN
+            UPDATE contadores_auditoria SET total = total - 1
+            WHERE dia = COALESCE(date(OLD.data_operacao), date('now')) AND tabela = OLD.tabela;
+        END"""
+}
+
+# Gerações por tabela: incrementadas por trigger dentro da transação de cada escrita,
+# persistidas no banco para que caches (inclusive de outros processos) se validem
+GENERATION_TABLES = ('clientes', 'produtos', 'fornecedores', 'usuarios', 'audit_log')
+
+GENERATION_TRIGGER = """
+    AFTER {evento} ON {tabela} BEGIN
+        UPDATE geracoes SET geracao = geracao + 1 WHERE tabela = '{tabela}';
+    END"""
+
+# Faixas de ids da árvore de digests da sincronização incremental (utils.delta_sync).
+# Sem OR IGNORE no trigger: dentro de um upsert o ON CONFLICT externo prevaleceria
+DIGEST_TABLES = ('clientes', 'produtos', 'fornecedores')
+DIGEST_BUCKET_SIZE = 1024
+
+DIGEST_TRIGGER = """
+    AFTER {evento} ON {tabela} BEGIN
+        INSERT INTO faixas_pendentes (tabela, faixa) VALUES ('{tabela}', {linha}.id / {tamanho})
+        ON CONFLICT (tabela, faixa) DO NOTHING;
+    END"""
+
+def leaf_digest(pares: Iterable[Tuple[int, Optional[str]]]) -> str:
+    """Digest de uma faixa a partir dos pares (id, hash_conteudo) em ordem de id"""
+    digest = hashlib.blake2b(digest_size=16)
+    for registro_id, hash_conteudo in pares:
+        digest.update(f"{registro_id}:{hash_conteudo or ''}\n".encode())
+    return digest.hexdigest()
+
+# Colunas das tabelas mestre (também usadas ao recriá-las em migrate_encoded_columns)
+MASTER_TABLE_COLUMNS = {
+    'clientes': """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        cpf_cnpj TEXT NOT NULL UNIQUE,
+        cpf_cnpj_digitos TEXT,
+        email TEXT NOT NULL,
+        telefone TEXT,
+        endereco TEXT,
+        cidade INTEGER,
+        estado INTEGER,
+        cep TEXT,
+        tipo INTEGER NOT NULL CHECK (tipo IN (1, 2)),
+        ativo BOOLEAN NOT NULL DEFAULT 1,
+        data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+        data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+        criado_por TEXT,
+        atualizado_por TEXT,
+        hash_conteudo TEXT
+    """,
+    'produtos': """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        codigo TEXT NOT NULL UNIQUE,
+        descricao TEXT,
+        categoria INTEGER NOT NULL,
+        subcategoria INTEGER,
+        preco REAL NOT NULL DEFAULT 0.0,
+        unidade_medida INTEGER NOT NULL,
+        ativo BOOLEAN NOT NULL DEFAULT 1,
+        data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+        data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+        criado_por TEXT,
+        atualizado_por TEXT,
+        hash_conteudo TEXT
+    """,
+    'fornecedores': """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        cnpj TEXT NOT NULL UNIQUE,
+        cnpj_digitos TEXT,
+        email TEXT NOT NULL,
+        telefone TEXT,
+        endereco TEXT,
+        cidade INTEGER,
+        estado INTEGER,
+        cep TEXT,
+        contato_principal TEXT,
+        ativo BOOLEAN NOT NULL DEFAULT 1,
+        data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+        data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+        criado_por TEXT,
+        atualizado_por TEXT,
+        hash_conteudo TEXT
+    """
+}
+
+# Arquivamento (utils.archive_manager): inativos antigos saem das tabelas quentes para {tabela}_arquivo
+ARCHIVED_TABLES = ('clientes', 'produtos', 'fornecedores')
+
+# Candidatos ao arquivamento: o índice parcial cobre só os inativos
+ARCHIVE_INDEXES = {
+    'idx_clientes_inativos_atualizacao': "clientes(data_atualizacao) WHERE ativo = 0",
+    'idx_produtos_inativos_atualizacao': "produtos(data_atualizacao) WHERE ativo = 0",
+    'idx_fornecedores_inativos_atualizacao': "fornecedores(data_atualizacao) WHERE ativo = 0"
+}
+
+# Colunas que podem ser projetadas em listagens e buscas (fields=)
+SELECTABLE_FIELDS = {
+    tabela: frozenset(columns.split(', ')) - {'password_hash'}
+    for tabela, (columns, _) in RECORD_MAPPINGS.items()
+}
+
+# Colunas internas, só para buscas por chave, detecção de alterações e índices: fora da
+# projeção padrão (sem fields) de listagens, buscas e exportações
+INTERNAL_COLUMNS = frozenset(coluna_digitos for _, coluna_digitos in DOCUMENT_COLUMNS.values()) | {'hash_conteudo'}
+
+# Estado compartilhado por todos os DatabaseManager do processo que abrem o mesmo banco
+# (storage.chave): cada módulo cria o seu gerenciador, mas uma escrita feita por qualquer
+# um deles precisa invalidar o cache que os outros leem, e todas passam pela mesma thread
+# escritora (uma única conexão de escrita, sem filas disputando o lock do SQLite)
+_shared_lock = threading.Lock()
+_shared_caches = weakref.WeakValueDictionary()
+_shared_writers = weakref.WeakValueDictionary()
+
+def _shared(registro: weakref.WeakValueDictionary, chave: str, criar: Callable[[], Any]) -> Any:
+    """Objeto de registro para o banco chave, criado na primeira vez"""
+    with _shared_lock:
+        objeto = registro.get(chave)
+        if objeto is None:
+            objeto = criar()
+            registro[chave] = objeto
+        return objeto
+
+# Quem acompanha as conexões obtidas pela thread corrente (ver track_connections)
+_connection_tracking = threading.local()
+
+@contextmanager
+def track_connections(registrar: Callable[[sqlite3.Connection], None]):
+    """Chamar registrar(conn) para cada conexão que a thread obtiver de um DatabaseManager dentro do with
+
+    Inclui as de snapshot e a conexão fixa da thread; registrar pode recusar a conexão
+    levantando uma exceção, que sai pelo get_connection/get_snapshot_connection.
+    """
+    anterior = getattr(_connection_tracking, 'registrar', None)
+    _connection_tracking.registrar = registrar
+    try:
+        yield
+    finally:
+        _connection_tracking.registrar = anterior
+
+def _tracked(conn: sqlite3.Connection) -> sqlite3.Connection:
+    registrar = getattr(_connection_tracking, 'registrar', None)
+    if registrar is not None:
+        registrar(conn)
+    return conn
+
+class SnapshotConnection(sqlite3.Connection):
+    """Conexão somente leitura com snapshot consistente, para relatórios e exportações
+
+    Aberta com mode=ro. Ao entrar no with, inicia uma transação de leitura e fixa o
+    snapshot; todas as consultas enxergam o banco como estava nesse instante. Com o banco
+    em WAL, o escritor continua gravando sem esperar. Ao sair, encerra a transação e
+    fecha a conexão.
+    """
+
+    def __enter__(self) -> 'SnapshotConnection':
+        self.execute("BEGIN DEFERRED")
+        # A primeira leitura é que fixa o snapshot
+        self.execute("PRAGMA schema_version").fetchone()
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self.rollback()
+        finally:
+            self.close()
+        return False
 
 class DatabaseManager:
     """Gerenciador principal do banco de dados"""
     
-    def __init__(self):
+    def __init__(self, db_path: str = None, storage: StorageBackend = None):
         create_directories()
-        self.db_path = DATABASE_PATH
+        # Arquivo SQLite ou banco em memória (ver database.storage); db_path é None em memória
+        self.storage = storage or create_storage(db_path)
+        self.db_path = self.storage.path
+        # Conexões fixas das threads de pool (ver bind_thread_connection)
+        self._thread_connections = threading.local()
+        # Textos das colunas codificadas <-> códigos (ver ENCODED_COLUMNS)
+        self.dictionary = ValueDictionary(
+            self.get_connection, lambda conn: conn.in_transaction and not isinstance(conn, SnapshotConnection)
+        )
+        self._table_columns = {}
         self.init_database()
         self.create_default_user()
+        # Registros lidos por get_*/get_many*, invalidados a cada escrita (um cache por banco)
+        self.cache = _shared(_shared_caches, self.storage.chave, lambda: RecordCache(RECORD_CACHE_SIZE))
+        # Resultados derivados validados pelas gerações (ver memoize_by_generation)
+        self._generation_memo = {}
+        # Escritas passam todas pela thread escritora do banco (conexão aberta sob demanda
+        # pelo primeiro gerenciador que o abriu)
+        self.writer = _shared(_shared_writers, self.storage.chave, lambda: WriteQueue(lambda: self.get_connection()))
+        # Standby para onde vão as leituras de snapshot, quando em dia (ver database.replication)
+        self.read_replica = None
 
     def get_connection(self) -> sqlite3.Connection:
         """Obter conexão com o banco"""
-        conn = sqlite3.connect(self.db_path)
+        conn = getattr(self._thread_connections, 'conn', None)
+        if conn is not None:
+            return _tracked(conn)
+        conn = self.storage.connect(factory=sql_tracer.connection_class(sqlite3.Connection))
+        conn.row_factory = sqlite3.Row
+        # Prazo da operação corrente da thread (ver database.query_budget)
+        return _tracked(query_budgets.install(conn))
+
+    def get_snapshot_connection(self, replica: bool = True) -> SnapshotConnection:
+        """Obter conexão somente leitura com snapshot (usar com with)
+
+        Com read_replica definido a leitura vai para o standby; replica=False força o primário.
+        """
+        storage = SQLiteFileBackend(self.read_replica) if replica and self.read_replica else self.storage
+        conn = storage.connect(readonly=True, isolation_level=None,
+                               factory=sql_tracer.connection_class(SnapshotConnection))
         conn.row_factory = sqlite3.Row
-        return conn
+        return _tracked(query_budgets.install(conn))
+
+    def bind_thread_connection(self) -> sqlite3.Connection:
+        """Fixar uma conexão para a thread corrente, reaproveitada em todo get_connection dela"""
+        self._thread_connections.conn = None
+        self._thread_connections.conn = self.get_connection()
+        return self._thread_connections.conn
+
+    def submit_write(self, operacao: WriteOperation) -> Future:
+        """Enfileirar operação de escrita, que recebe a conexão de escrita, e obter seu Future"""
+        return self.writer.submit(operacao)
+
+    def execute_write(self, operacao: WriteOperation) -> Any:
+        """Executar operação de escrita na thread escritora e aguardar o resultado"""
+        return self.writer.execute(operacao)
+
+    def query_records(self, conn: sqlite3.Connection, tabela: str, clause: str = "",
+                      params: Any = (), decode: Callable[[str, Any], Any] = None) -> sqlite3.Cursor:
+        """Executar SELECT cujas linhas já saem como registros do modelo da tabela
+
+        decode troca o valor guardado nas colunas codificadas pelo texto (padrão: o dicionário).
+        """
+        columns, factory = RECORD_MAPPINGS[tabela]
+        cursor = conn.cursor()
+        cursor.row_factory = (partial(factory, decode=decode or self.dictionary.decoder(conn))
+                              if tabela in ENCODED_COLUMNS else factory)
+        return cursor.execute(f"SELECT {columns} FROM {tabela} {clause}", params)
+
+    def build_projection(self, tabela: str, fields: Any = None) -> str:
+        """Montar a lista de colunas do SELECT validando contra os campos permitidos da tabela"""
+        if not fields:
+            return "*"
+        if isinstance(fields, str):
+            fields = [campo.strip() for campo in fields.split(',') if campo.strip()]
+
+        allowed = SELECTABLE_FIELDS.get(tabela)
+        if allowed is None:
+            raise ValueError(f"Tabela inválida: {tabela}")
+        invalid = [campo for campo in fields if campo not in allowed]
+        if invalid:
+            raise ValueError(f"Campos inválidos para {tabela}: {', '.join(invalid)}")
+
+        # Remover repetições preservando a ordem pedida
+        return ', '.join(dict.fromkeys(fields))
+
+    def query_projection(self, conn: sqlite3.Connection, tabela: str, fields: Any,
+                         clause: str = "", params: Any = ()) -> List[Dict]:
+        """Executar SELECT apenas com as colunas pedidas, retornando dicionários"""
+        projection = self.decoded_projection(tabela, fields)
+        cursor = conn.execute(f"SELECT {projection} FROM {tabela} {clause}", params)
+        return [dict(row) for row in cursor.fetchall()]
+
+    def decoded_projection(self, tabela: str, fields: Any = None) -> str:
+        """Lista de colunas do SELECT (as públicas, sem fields) com o texto das colunas codificadas"""
+        projection = self.build_projection(tabela, fields)
+        if projection == "*":
+            if tabela not in self._table_columns:
+                with self.get_connection() as conn:
+                    self._table_columns[tabela] = [coluna for coluna in self.get_table_columns(conn, tabela)
+                                                   if coluna not in INTERNAL_COLUMNS]
+            colunas = self._table_columns[tabela]
+        else:
+            colunas = projection.split(', ')
+        return ', '.join(decoded_column(tabela, coluna) for coluna in colunas)
 
     def init_database(self):
         """Inicializar o banco de dados com as tabelas necessárias"""
         with self.get_connection() as conn:
+            self.storage.configure(conn)
+
             # Tabela de usuários
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS usuarios (
@@ -45,66 +549,9 @@ class DatabaseManager:
                 )
             """)
 
-            # Tabela de clientes
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS clientes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nome TEXT NOT NULL,
-                    cpf_cnpj TEXT NOT NULL UNIQUE,
-                    email TEXT NOT NULL,
-                    telefone TEXT,
-                    endereco TEXT,
-                    cidade TEXT,
-                    estado TEXT,
-                    cep TEXT,
-                    tipo TEXT NOT NULL CHECK (tipo IN ('pessoa_fisica', 'pessoa_juridica')),
-                    ativo BOOLEAN NOT NULL DEFAULT 1,
-                    data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    criado_por TEXT,
-                    atualizado_por TEXT
-                )
-            """)
-
-            # Tabela de produtos
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS produtos (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nome TEXT NOT NULL,
-                    codigo TEXT NOT NULL UNIQUE,
-                    descricao TEXT,
-                    categoria TEXT NOT NULL,
-                    subcategoria TEXT,
-                    preco REAL NOT NULL DEFAULT 0.0,
-                    unidade_medida TEXT NOT NULL,
-                    ativo BOOLEAN NOT NULL DEFAULT 1,
-                    data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    criado_por TEXT,
-                    atualizado_por TEXT
-                )
-            """)
-
-            # Tabela de fornecedores
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS fornecedores (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nome TEXT NOT NULL,
-                    cnpj TEXT NOT NULL UNIQUE,
-                    email TEXT NOT NULL,
-                    telefone TEXT,
-                    endereco TEXT,
-                    cidade TEXT,
-                    estado TEXT,
-                    cep TEXT,
-                    contato_principal TEXT,
-                    ativo BOOLEAN NOT NULL DEFAULT 1,
-                    data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    criado_por TEXT,
-                    atualizado_por TEXT
-                )
-            """)
+            # Tabelas mestre (clientes, produtos, fornecedores)
+            for tabela, colunas in MASTER_TABLE_COLUMNS.items():
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {tabela} ({colunas})")
 
             # Tabela de auditoria
             conn.execute("""
@@ -127,10 +574,344 @@ class DatabaseManager:
             conn.execute("CREATE INDEX IF NOT EXISTS idx_produtos_nome ON produtos(nome)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_fornecedores_cnpj ON fornecedores(cnpj)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_fornecedores_nome ON fornecedores(nome)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_tabela ON audit_log(tabela)")
+            for nome, definicao in {**ACTIVE_ROW_INDEXES, **AUDIT_INDEXES}.items():
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {nome} ON {definicao}")
+
+            # Substituído por idx_audit_registro / idx_audit_tabela_data
+            conn.execute("DROP INDEX IF EXISTS idx_audit_tabela")
 
+            self.migrate_document_columns(conn)
+            self.migrate_content_hash(conn)
+            self.init_dictionary(conn)
+            self.migrate_encoded_columns(conn)
+            self.init_counters(conn)
+            self.init_generations(conn)
+            self.init_range_digests(conn)
+            self.init_archive(conn)
             conn.commit()
 
+    def migrate_document_columns(self, conn: sqlite3.Connection):
+        """Criar e preencher as colunas de documento normalizado em bancos anteriores a elas"""
+        for tabela, (coluna, coluna_digitos) in DOCUMENT_COLUMNS.items():
+            colunas = {row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")}
+            if coluna_digitos in colunas:
+                continue
+
+            # ALTER e preenchimento na mesma transação (o commit é do init_database)
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna_digitos} TEXT")
+            vistos = set()
+            valores = []
+            conflitos = []
+            # Ativos primeiro, pelo id: em um conflito fica com o documento o registro mais antigo
+            for registro_id, documento, ativo in conn.execute(
+                f"SELECT id, {coluna}, ativo FROM {tabela} ORDER BY ativo DESC, id"
+            ):
+                digitos = normalize_document(documento)
+                if ativo == 1 and digitos is not None:
+                    if digitos in vistos:
+                        conflitos.append(registro_id)
+                        continue
+                    vistos.add(digitos)
+                valores.append((digitos, registro_id))
+            conn.executemany(f"UPDATE {tabela} SET {coluna_digitos} = ? WHERE id = ?", valores)
+
+            if conflitos:
+                print(f"Aviso: {len(conflitos)} {tabela} ativos repetem o documento de outro registro "
+                      f"e ficaram sem {coluna_digitos} (ids: {conflitos[:20]}); mescle as duplicatas")
+
+        for nome, definicao in DOCUMENT_INDEXES.items():
+            conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {nome} ON {definicao}")
+
+    def migrate_content_hash(self, conn: sqlite3.Connection):
+        """Criar e preencher a coluna hash_conteudo em bancos anteriores a ela"""
+        for tabela in UPSERT_KEYS:
+            colunas = {row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")}
+            if 'hash_conteudo' not in colunas:
+                if not conn.in_transaction:
+                    conn.execute("BEGIN")
+                conn.execute(f"ALTER TABLE {tabela} ADD COLUMN hash_conteudo TEXT")
+                # Roda antes de migrate_encoded_columns: as colunas codificadas ainda guardam o
+                # texto e o dicionário pode nem existir
+                self.refresh_content_hashes(conn, tabela, decode=lambda campo, valor: valor)
+
+        for (tabela, campo), nome in CONTENT_HASH_INDEXES.items():
+            # Colunas de documento só identificam linhas ativas (mesmo critério do índice único)
+            where = " WHERE ativo = 1" if campo == DOCUMENT_COLUMNS.get(tabela, (None, None))[1] else ""
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {nome} ON {tabela}({campo}, hash_conteudo){where}")
+
+    def init_dictionary(self, conn: sqlite3.Connection):
+        """Criar a tabela dicionario com os códigos fixos"""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS dicionario (
+                campo TEXT NOT NULL,
+                codigo INTEGER NOT NULL,
+                valor TEXT NOT NULL,
+                PRIMARY KEY (campo, codigo),
+                UNIQUE (campo, valor)
+            ) WITHOUT ROWID
+        """)
+        conn.executemany("INSERT OR IGNORE INTO dicionario (campo, codigo, valor) VALUES (?, ?, ?)",
+                         [(campo, codigo, valor) for campo, codigos in FIXED_CODES.items()
+                          for valor, codigo in codigos.items()])
+
+    def migrate_encoded_columns(self, conn: sqlite3.Connection):
+        """Converter em códigos do dicionário as colunas de texto de bancos anteriores a ele
+
+        O SQLite não muda o tipo de uma coluna: a tabela (e o seu arquivo) é recriada com o
+        esquema atual, mantendo ids, a sequência do AUTOINCREMENT, índices e triggers.
+        """
+        for tabela, campos in ENCODED_COLUMNS.items():
+            for nome in (tabela, f"{tabela}_arquivo"):
+                tipos = {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({nome})")}
+                if not tipos or all(tipos.get(campo) == 'INTEGER' for campo in campos):
+                    continue
+                if not conn.in_transaction:
+                    conn.execute("BEGIN")
+
+                for campo in campos:
+                    conn.execute(f"""
+                        INSERT INTO dicionario (campo, codigo, valor)
+                        SELECT '{campo}', (SELECT COALESCE(MAX(codigo), 0) FROM dicionario WHERE campo = '{campo}')
+                                          + ROW_NUMBER() OVER (ORDER BY valor), valor
+                        FROM (SELECT DISTINCT {campo} AS valor FROM {nome} WHERE {campo} IS NOT NULL)
+                        WHERE valor NOT IN (SELECT valor FROM dicionario WHERE campo = '{campo}')
+                    """)
+
+                # O DROP TABLE leva junto índices e triggers: recriados pelo SQL original
+                objetos = [row[0] for row in conn.execute(
+                    "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+                    (nome,)
+                )]
+                sequencia = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (nome,)).fetchone()
+
+                colunas = MASTER_TABLE_COLUMNS[tabela] if nome == tabela else self._archive_columns(conn, tabela)
+                conn.execute(f"CREATE TABLE {nome}_codificada ({colunas})")
+                copiadas = [coluna for coluna in self.get_table_columns(conn, f"{nome}_codificada") if coluna in tipos]
+                valores = ', '.join(
+                    f"(SELECT codigo FROM dicionario WHERE campo = '{coluna}' AND valor = {nome}.{coluna})"
+                    if coluna in campos else coluna
+                    for coluna in copiadas
+                )
+                conn.execute(f"INSERT INTO {nome}_codificada ({', '.join(copiadas)}) SELECT {valores} FROM {nome}")
+                conn.execute(f"DROP TABLE {nome}")
+                conn.execute(f"ALTER TABLE {nome}_codificada RENAME TO {nome}")
+
+                # Ids já usados (inclusive os dos registros arquivados) não voltam a ser gerados
+                if sequencia:
+                    conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (nome,))
+                    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (nome, sequencia[0]))
+                for sql in objetos:
+                    conn.execute(sql)
+
+    def refresh_content_hashes(self, conn: sqlite3.Connection, tabela: str, ids: List[int] = None,
+                               decode: Callable[[str, Any], Any] = None):
+        """Recalcular hash_conteudo das linhas indicadas (todas, se ids for None)"""
+        registros = (self.query_records(conn, tabela, decode=decode) if ids is None
+                     else self.query_in(conn, tabela, 'id', list(ids), decode=decode))
+        valores = [(content_hash(tabela, registro), registro.id) for registro in registros]
+        conn.executemany(f"UPDATE {tabela} SET hash_conteudo = ? WHERE id = ?", valores)
+
+    def get_content_hashes(self, tabela: str, campo: str, valores: List[Any],
+                           conn: sqlite3.Connection = None) -> Dict[Any, Tuple[int, Optional[str]]]:
+        """Id e hash de conteúdo por chave, sem carregar as linhas (valor -> (id, hash))
+
+        Para sincronizações: basta comparar com content_hash() dos dados recebidos.
+        """
+        if conn is None:
+            with self.get_connection() as conn:
+                return self.get_content_hashes(tabela, campo, valores, conn)
+
+        if (tabela, campo) not in CONTENT_HASH_INDEXES:
+            raise ValueError(f"Chave inválida para {tabela}: {campo}")
+        documento = campo == DOCUMENT_COLUMNS.get(tabela, (None, None))[1]
+        if documento:
+            valores = map(normalize_document, valores)
+        valores = list(dict.fromkeys(valor for valor in valores if valor is not None))
+
+        hashes = {}
+        for inicio in range(0, len(valores), BATCH_CHUNK_SIZE):
+            lote = valores[inicio:inicio + BATCH_CHUNK_SIZE]
+            clause = f"WHERE {campo} IN ({', '.join('?' * len(lote))})"
+            if documento:
+                clause += " AND ativo = 1"
+            # Sem ANALYZE o planejador prefere o índice único da chave, que obriga a ler a linha
+            indice = CONTENT_HASH_INDEXES[(tabela, campo)]
+            for row in conn.execute(f"SELECT id, {campo}, hash_conteudo FROM {tabela} INDEXED BY {indice} {clause}", lote):
+                hashes[row[1]] = (row[0], row[2])
+        return hashes
+
+    def init_counters(self, conn: sqlite3.Connection):
+        """Criar os contadores do dashboard e seus triggers, preenchendo-os a partir dos dados existentes"""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS contadores_registros (
+                tabela TEXT PRIMARY KEY,
+                ativos INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS contadores_auditoria (
+                dia TEXT NOT NULL,
+                tabela TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (dia, tabela)
+            ) WITHOUT ROWID
+        """)
+
+        # Sem a linha do contador o banco é anterior aos triggers: contar uma única vez
+        if conn.execute("SELECT COUNT(*) FROM contadores_registros").fetchone()[0] == 0:
+            for tabela in COUNTED_TABLES:
+                conn.execute(f"""
+                    INSERT INTO contadores_registros (tabela, ativos)
+                    SELECT '{tabela}', COUNT(*) FROM {tabela} WHERE ativo = 1
+                """)
+            conn.execute("DELETE FROM contadores_auditoria")
+            conn.execute("""
+                INSERT INTO contadores_auditoria (dia, tabela, total)
+                SELECT COALESCE(date(data_operacao), date('now')), tabela, COUNT(*)
+                FROM audit_log GROUP BY 1, 2
+            """)
+
+        for tabela in COUNTED_TABLES:
+            for nome, corpo in COUNTER_TRIGGERS.items():
+                conn.execute(f"CREATE TRIGGER IF NOT EXISTS {nome.format(tabela=tabela)} "
+                             f"{corpo.format(tabela=tabela)}")
+        for nome, corpo in AUDIT_COUNTER_TRIGGERS.items():
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {nome} {corpo}")
+
+    def init_generations(self, conn: sqlite3.Connection):
+        """Criar a tabela de gerações e os triggers que a incrementam"""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS geracoes (
+                tabela TEXT PRIMARY KEY,
+                geracao INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
+        conn.executemany("INSERT OR IGNORE INTO geracoes (tabela, geracao) VALUES (?, 0)",
+                         [(tabela,) for tabela in GENERATION_TABLES])
+        for tabela in GENERATION_TABLES:
+            for evento in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{tabela}_geracao_{evento.lower()} "
+                             f"{GENERATION_TRIGGER.format(evento=evento, tabela=tabela)}")
+
+    def init_archive(self, conn: sqlite3.Connection):
+        """Criar as tabelas {tabela}_arquivo com as mesmas colunas das tabelas quentes
+
+        Sem restrições de unicidade: a chave natural de um registro arquivado pode voltar a
+        ser usada. Colunas novas das tabelas quentes são acrescentadas ao arquivo.
+        """
+        for tabela in ARCHIVED_TABLES:
+            colunas = [(row[1], row[2]) for row in conn.execute(f"PRAGMA table_info({tabela})")]
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {tabela}_arquivo ({self._archive_columns(conn, tabela)})")
+            existentes = {row[1] for row in conn.execute(f"PRAGMA table_info({tabela}_arquivo)")}
+            for nome, tipo in colunas:
+                if nome not in existentes:
+                    conn.execute(f"ALTER TABLE {tabela}_arquivo ADD COLUMN {nome} {tipo}")
+
+        for nome, definicao in ARCHIVE_INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {nome} ON {definicao}")
+
+    def _archive_columns(self, conn: sqlite3.Connection, tabela: str) -> str:
+        """Colunas de {tabela}_arquivo: as da tabela quente, sem restrições, e as do arquivamento"""
+        colunas = [(row[1], row[2]) for row in conn.execute(f"PRAGMA table_info({tabela})")]
+        return f"""
+            id INTEGER PRIMARY KEY,
+            {', '.join(f'{nome} {tipo}' for nome, tipo in colunas if nome != 'id')},
+            arquivado_em DATETIME DEFAULT CURRENT_TIMESTAMP,
+            arquivado_por TEXT
+        """
+
+    def get_table_columns(self, conn: sqlite3.Connection, tabela: str) -> List[str]:
+        """Colunas da tabela, na ordem do esquema"""
+        return [row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")]
+
+    def init_range_digests(self, conn: sqlite3.Connection):
+        """Criar as tabelas de digests por faixa de ids e os triggers que marcam faixas alteradas"""
+        existia = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'digestos_faixas'"
+        ).fetchone()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS digestos_faixas (
+                tabela TEXT NOT NULL,
+                faixa INTEGER NOT NULL,
+                linhas INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (tabela, faixa)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS faixas_pendentes (
+                tabela TEXT NOT NULL,
+                faixa INTEGER NOT NULL,
+                PRIMARY KEY (tabela, faixa)
+            ) WITHOUT ROWID
+        """)
+
+        for tabela in DIGEST_TABLES:
+            # Banco anterior aos digests: todas as faixas com dados ficam pendentes
+            if not existia:
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO faixas_pendentes (tabela, faixa)
+                    SELECT DISTINCT '{tabela}', id / {DIGEST_BUCKET_SIZE} FROM {tabela}
+                """)
+            for evento, linha in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+                corpo = DIGEST_TRIGGER.format(evento=evento, tabela=tabela, linha=linha, tamanho=DIGEST_BUCKET_SIZE)
+                conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{tabela}_faixa_{evento.lower()} {corpo}")
+
+    def refresh_range_digests(self, tabelas: List[str] = None) -> int:
+        """Recalcular na fila de escrita os digests das faixas alteradas; retorna quantas faixas
+
+        Chamado pela manutenção agendada (database.maintenance), não pelas leituras da
+        sincronização incremental: enquanto isso as faixas pendentes saem como desatualizadas.
+        """
+        tabelas = tuple(tabelas or DIGEST_TABLES)
+        with self.get_connection() as conn:
+            if not conn.execute(f"""
+                SELECT 1 FROM faixas_pendentes WHERE tabela IN ({', '.join('?' * len(tabelas))}) LIMIT 1
+            """, tabelas).fetchone():
+                return 0
+
+        def operacao(conn):
+            total = 0
+            for tabela in tabelas:
+                faixas = [row[0] for row in conn.execute("SELECT faixa FROM faixas_pendentes WHERE tabela = ?", (tabela,))]
+                for faixa in faixas:
+                    inicio = faixa * DIGEST_BUCKET_SIZE
+                    pares = conn.execute(
+                        f"SELECT id, hash_conteudo FROM {tabela} WHERE id BETWEEN ? AND ? ORDER BY id",
+                        (inicio, inicio + DIGEST_BUCKET_SIZE - 1)
+                    ).fetchall()
+                    if pares:
+                        conn.execute("INSERT OR REPLACE INTO digestos_faixas (tabela, faixa, linhas, digest) VALUES (?, ?, ?, ?)",
+                                     (tabela, faixa, len(pares), leaf_digest(pares)))
+                    else:
+                        conn.execute("DELETE FROM digestos_faixas WHERE tabela = ? AND faixa = ?", (tabela, faixa))
+                conn.execute("DELETE FROM faixas_pendentes WHERE tabela = ?", (tabela,))
+                total += len(faixas)
+            return total
+
+        return self.execute_write(operacao)
+
+    def get_generations(self, tabelas: List[str] = None) -> Dict[str, int]:
+        """Geração atual de cada tabela (muda sempre que a tabela é alterada)"""
+        tabelas = tuple(tabelas or GENERATION_TABLES)
+        with self.get_connection() as conn:
+            return dict(conn.execute(f"""
+                SELECT tabela, geracao FROM geracoes
+                WHERE tabela IN ({', '.join('?' * len(tabelas))})
+            """, tabelas).fetchall())
+
+    def memoize_by_generation(self, chave: str, tabelas: List[str], calcular: Callable[[], Any]) -> Any:
+        """Reaproveitar o resultado de calcular() enquanto as gerações das tabelas não mudarem"""
+        geracoes = self.get_generations(tabelas)
+        memo = self._generation_memo.get(chave)
+        if memo is None or memo[0] != geracoes:
+            # Marcado com as gerações lidas antes do cálculo: escrita concorrente força recálculo
+            memo = (geracoes, calcular())
+            self._generation_memo[chave] = memo
+        return copy.deepcopy(memo[1])
+
     def create_default_user(self):
         """Criar usuário padrão admin se não existir"""
         with self.get_connection() as conn:
@@ -144,96 +925,293 @@ class DatabaseManager:
                 conn.commit()
 
     def log_audit(self, tabela: str, registro_id: int, operacao: str, 
-                  dados_anteriores: Dict = None, dados_novos: Dict = None, usuario: str = None):
-        """Registrar operação no log de auditoria"""
-        with self.get_connection() as conn:
-            conn.execute("""
-                INSERT INTO audit_log (tabela, registro_id, operacao, dados_anteriores, dados_novos, usuario)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                tabela, registro_id, operacao,
-                json.dumps(dados_anteriores) if dados_anteriores else None,
-                json.dumps(dados_novos) if dados_novos else None,
-                usuario
+                  dados_anteriores: Dict = None, dados_novos: Dict = None, usuario: str = None,
+                  conn: sqlite3.Connection = None):
+        """Registrar operação no log de auditoria
+
+        Com conn, grava na transação do chamador (que faz o commit); sem conn, a gravação
+        vai para a fila de escrita.
+        """
+        if conn is None:
+            self.execute_write(lambda conn: self.log_audit(
+                tabela, registro_id, operacao, dados_anteriores, dados_novos, usuario, conn
             ))
-            conn.commit()
+            return
+
+        conn.execute("""
+            INSERT INTO audit_log (tabela, registro_id, operacao, dados_anteriores, dados_novos, usuario)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            tabela, registro_id, operacao,
+            json.dumps(dados_anteriores) if dados_anteriores else None,
+            json.dumps(dados_novos) if dados_novos else None,
+            usuario
+        ))
+
+    def get_many(self, tabela: str, ids: List[int]) -> Dict[int, Any]:
+        """Obter vários registros por id, em lotes sobre uma só conexão (id -> registro)"""
+        return self.get_many_by_key(tabela, 'id', ids)
+
+    def get_many_by_key(self, tabela: str, campo: str, valores: List[Any]) -> Dict[Any, Any]:
+        """Obter vários registros por uma chave única, em lotes sobre uma só conexão (valor -> registro)
+
+        Nas colunas de documento normalizado os valores podem vir formatados; o dicionário
+        usa os dígitos e só considera registros ativos.
+        """
+        if campo not in LOOKUP_KEYS.get(tabela, ()):
+            raise ValueError(f"Chave inválida para {tabela}: {campo}")
+
+        coluna_documento = next((coluna for coluna, coluna_digitos in DOCUMENT_COLUMNS.values()
+                                 if coluna_digitos == campo), None)
+        if coluna_documento:
+            valores = map(normalize_document, valores)
+        valores = list(dict.fromkeys(valor for valor in valores if valor is not None))
+
+        registros = {}
+        em_cache = tabela in CACHED_TABLES
+        if em_cache:
+            faltantes = []
+            for valor in valores:
+                registro = (self.cache.get(tabela, valor) if campo == 'id'
+                            else self.cache.get_by_key(tabela, campo, valor))
+                if registro is None:
+                    faltantes.append(valor)
+                else:
+                    registros[valor] = registro
+            valores = faltantes
+            if not valores:
+                return registros
+            token = self.cache.token(tabela)
+
+        with self.get_connection() as conn:
+            if em_cache:
+                # Lida antes dos registros: se mudar até a leitura deles, o snapshot dos caches
+                # descarta a entrada (ver database.cache_snapshot)
+                geracao = conn.execute("SELECT geracao FROM geracoes WHERE tabela = ?", (tabela,)).fetchone()[0]
+            for registro in self.query_in(conn, tabela, campo, valores, ativos_apenas=bool(coluna_documento)):
+                chave = (normalize_document(getattr(registro, coluna_documento)) if coluna_documento
+                         else getattr(registro, campo))
+                registros[chave] = registro
+                if em_cache:
+                    self.cache.put(tabela, registro, token, self._cache_keys(tabela, registro), geracao)
+        return registros
+
+    def query_in(self, conn: sqlite3.Connection, tabela: str, campo: str, valores: List[Any],
+                 ativos_apenas: bool = False, decode: Callable[[str, Any], Any] = None):
+        """Registros cujo campo está em valores, em consultas IN (...) de até BATCH_CHUNK_SIZE"""
+        for inicio in range(0, len(valores), BATCH_CHUNK_SIZE):
+            lote = valores[inicio:inicio + BATCH_CHUNK_SIZE]
+            clause = f"WHERE {campo} IN ({', '.join('?' * len(lote))})"
+            if ativos_apenas:
+                clause += " AND ativo = 1"
+            yield from self.query_records(conn, tabela, clause, lote, decode)
+
+    def _cache_keys(self, tabela: str, registro: Any) -> List[Tuple[str, Any]]:
+        """Chaves naturais (campo, valor) pelas quais o registro também é encontrado no cache"""
+        chaves = []
+        for campo in LOOKUP_KEYS[tabela] - {'id'}:
+            coluna_documento = next((coluna for coluna, coluna_digitos in DOCUMENT_COLUMNS.values()
+                                     if coluna_digitos == campo), None)
+            if coluna_documento is None:
+                chaves.append((campo, getattr(registro, campo)))
+            elif registro.ativo:
+                chaves.append((campo, normalize_document(getattr(registro, coluna_documento))))
+        return chaves
+
+    def upsert_records(self, tabela: str, registros: List[Any], usuario: str = None) -> Dict[str, Any]:
+        """Inserir ou atualizar registros pela chave natural, gravando só o que mudou
+
+        Registros com o mesmo hash de conteúdo do que está no banco não são escritos nem
+        auditados. Cada lote de BATCH_CHUNK_SIZE é uma operação da fila de escrita; a falha
+        de um registro não desfaz os demais e aparece em 'erros' como (posição, exceção).
+        """
+        if tabela not in UPSERT_SQL:
+            raise ValueError(f"Tabela sem upsert: {tabela}")
+
+        resultado = {'inseridos': 0, 'atualizados': 0, 'inalterados': 0,
+                     'ids': [None] * len(registros), 'erros': []}
+        for inicio in range(0, len(registros), BATCH_CHUNK_SIZE):
+            lote = registros[inicio:inicio + BATCH_CHUNK_SIZE]
+            situacoes = self.execute_write(lambda conn: self._upsert_batch(conn, tabela, lote, usuario))
+
+            alterados = []
+            for posicao, (situacao, valor) in enumerate(situacoes, inicio):
+                if situacao == 'erro':
+                    resultado['erros'].append((posicao, valor))
+                    continue
+                resultado[situacao] += 1
+                resultado['ids'][posicao] = valor
+                if situacao != 'inalterados':
+                    alterados.append(valor)
+            self.cache.invalidate(tabela, alterados)
+        return resultado
+
+    def _upsert_batch(self, conn: sqlite3.Connection, tabela: str, lote: List[Any],
+                      usuario: str = None) -> List[Tuple[str, Any]]:
+        """Gravar um lote de upsert na transação da fila; retorna (situação, id ou exceção) por registro"""
+        chave = UPSERT_KEYS[tabela]
+        coluna_digitos = DOCUMENT_COLUMNS.get(tabela, (None, None))[1]
+        codificadas = ENCODED_COLUMNS[tabela]
+        hashes = [content_hash(tabela, registro) for registro in lote]
+
+        # Id e hash atuais de todo o lote, pelos índices, dentro da própria transação
+        existentes = self.get_content_hashes(tabela, chave, [getattr(r, chave) for r in lote], conn)
+        existentes_digitos = {}
+        if coluna_digitos:
+            existentes_digitos = self.get_content_hashes(
+                tabela, coluna_digitos, [getattr(r, chave) for r in lote], conn
+            )
+
+        def atual(registro):
+            digitos = normalize_document(getattr(registro, chave)) if coluna_digitos else None
+            return existentes_digitos.get(digitos) or existentes.get(getattr(registro, chave))
+
+        # Linhas completas (dados anteriores da auditoria) só dos registros que mudaram
+        alterados = [estado[0] for registro, hash_novo in zip(lote, hashes)
+                     for estado in [atual(registro)] if estado and estado[1] != hash_novo]
+        anteriores = {registro.id: registro for registro in self.query_in(conn, tabela, 'id', alterados)}
+
+        situacoes = []
+        for registro, hash_novo in zip(lote, hashes):
+            estado = atual(registro)
+            if estado is not None and estado[1] == hash_novo:
+                situacoes.append(('inalterados', estado[0]))
+                continue
+
+            valor_chave = getattr(registro, chave)
+            digitos = normalize_document(valor_chave) if coluna_digitos else None
+            valores = [self.dictionary.encode(conn, campo, getattr(registro, campo)) if campo in codificadas
+                       else getattr(registro, campo) for campo in CONTENT_FIELDS[tabela]]
+            if coluna_digitos:
+                valores.append(digitos)
+            valores.append(hash_novo)
+            anterior = anteriores.get(estado[0]) if estado else None
+
+            conn.execute("SAVEPOINT registro")
+            try:
+                registro_id = conn.execute(UPSERT_SQL[tabela], valores + [usuario, usuario]).fetchone()[0]
+                if anterior is None:
+                    self.log_audit(tabela, registro_id, "INSERT", None, registro.to_dict(), usuario, conn=conn)
+                else:
+                    self.log_audit(tabela, registro_id, "UPDATE", anterior.to_dict(), registro.to_dict(), usuario, conn=conn)
+            except sqlite3.Error as e:
+                conn.execute("ROLLBACK TO registro")
+                conn.execute("RELEASE registro")
+                situacoes.append(('erro', e))
+                continue
+            conn.execute("RELEASE registro")
+            situacoes.append(('inseridos' if anterior is None else 'atualizados', registro_id))
+
+            # Repetições da mesma chave no lote comparam com a versão recém-gravada
+            gravado = copy.copy(registro)
+            gravado.id = registro_id
+            anteriores[registro_id] = gravado
+            existentes[valor_chave] = (registro_id, hash_novo)
+            if digitos and gravado.ativo:
+                existentes_digitos[digitos] = (registro_id, hash_novo)
+        return situacoes
+
+    def upsert_cliente(self, cliente: Cliente, usuario: str = None) -> int:
+        """Inserir ou atualizar cliente pelo CPF/CNPJ"""
+        return self._upsert_one("clientes", cliente, usuario)
+
+    def upsert_produto(self, produto: Produto, usuario: str = None) -> int:
+        """Inserir ou atualizar produto pelo código"""
+        return self._upsert_one("produtos", produto, usuario)
+
+    def upsert_fornecedor(self, fornecedor: Fornecedor, usuario: str = None) -> int:
+        """Inserir ou atualizar fornecedor pelo CNPJ"""
+        return self._upsert_one("fornecedores", fornecedor, usuario)
+
+    def _upsert_one(self, tabela: str, registro: Any, usuario: str = None) -> int:
+        resultado = self.upsert_records(tabela, [registro], usuario)
+        if resultado['erros']:
+            raise resultado['erros'][0][1]
+        return resultado['ids'][0]
 
     # CRUD para Clientes
     def create_cliente(self, cliente: Cliente, usuario: str = None) -> int:
         """Criar novo cliente"""
-        with self.get_connection() as conn:
+        def operacao(conn):
             cursor = conn.execute("""
-                INSERT INTO clientes (nome, cpf_cnpj, email, telefone, endereco, cidade, estado, cep, tipo, criado_por, atualizado_por)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO clientes (nome, cpf_cnpj, cpf_cnpj_digitos, email, telefone, endereco, cidade, estado, cep, tipo, criado_por, atualizado_por, hash_conteudo)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
-                cliente.nome, cliente.cpf_cnpj, cliente.email, cliente.telefone,
-                cliente.endereco, cliente.cidade, cliente.estado, cliente.cep,
-                cliente.tipo, usuario, usuario
+                cliente.nome, cliente.cpf_cnpj, normalize_document(cliente.cpf_cnpj), cliente.email, cliente.telefone,
+                cliente.endereco, self.dictionary.encode(conn, 'cidade', cliente.cidade),
+                self.dictionary.encode(conn, 'estado', cliente.estado), cliente.cep,
+                self.dictionary.encode(conn, 'tipo', cliente.tipo), usuario, usuario, content_hash("clientes", cliente, ativo=True)
             ))
             cliente_id = cursor.lastrowid
             
             # Log de auditoria
-            self.log_audit("clientes", cliente_id, "INSERT", None, cliente.to_dict(), usuario)
-            conn.commit()
+            self.log_audit("clientes", cliente_id, "INSERT", None, cliente.to_dict(), usuario, conn=conn)
             return cliente_id
 
+        cliente_id = self.execute_write(operacao)
+        self.cache.invalidate("clientes", [cliente_id])
+        return cliente_id
+
     def get_cliente(self, cliente_id: int) -> Optional[Cliente]:
         """Obter cliente por ID"""
-        with self.get_connection() as conn:
-            cursor = conn.execute("SELECT * FROM clientes WHERE id = ?", (cliente_id,))
-            row = cursor.fetchone()
-            if row:
-                return Cliente(
-                    id=row['id'], nome=row['nome'], cpf_cnpj=row['cpf_cnpj'],
-                    email=row['email'], telefone=row['telefone'], endereco=row['endereco'],
-                    cidade=row['cidade'], estado=row['estado'], cep=row['cep'],
-                    tipo=row['tipo'], ativo=bool(row['ativo']),
-                    data_criacao=datetime.fromisoformat(row['data_criacao']) if row['data_criacao'] else None,
-                    data_atualizacao=datetime.fromisoformat(row['data_atualizacao']) if row['data_atualizacao'] else None,
-                    criado_por=row['criado_por'], atualizado_por=row['atualizado_por']
-                )
+        return self.get_many("clientes", [cliente_id]).get(cliente_id)
+
+    def get_cliente_by_documento(self, documento: str) -> Optional[Cliente]:
+        """Obter cliente ativo pelo CPF/CNPJ, com ou sem formatação"""
+        digitos = normalize_document(documento)
+        if digitos is None:
             return None
+        return self.get_many_by_key("clientes", "cpf_cnpj_digitos", [digitos]).get(digitos)
 
     def update_cliente(self, cliente_id: int, cliente: Cliente, usuario: str = None) -> bool:
         """Atualizar cliente"""
-        # Obter dados anteriores para auditoria
-        cliente_anterior = self.get_cliente(cliente_id)
-        if not cliente_anterior:
-            return False
+        def operacao(conn):
+            # Obter dados anteriores para auditoria
+            cliente_anterior = self.query_records(conn, "clientes", "WHERE id = ?", (cliente_id,)).fetchone()
+            if not cliente_anterior:
+                return False
 
-        with self.get_connection() as conn:
             conn.execute("""
-                UPDATE clientes SET nome=?, cpf_cnpj=?, email=?, telefone=?, endereco=?, cidade=?, estado=?, cep=?, tipo=?, ativo=?, data_atualizacao=CURRENT_TIMESTAMP, atualizado_por=?
+                UPDATE clientes SET nome=?, cpf_cnpj=?, cpf_cnpj_digitos=?, email=?, telefone=?, endereco=?, cidade=?, estado=?, cep=?, tipo=?, ativo=?, data_atualizacao=CURRENT_TIMESTAMP, atualizado_por=?, hash_conteudo=?
                 WHERE id=?
             """, (
-                cliente.nome, cliente.cpf_cnpj, cliente.email, cliente.telefone,
-                cliente.endereco, cliente.cidade, cliente.estado, cliente.cep,
-                cliente.tipo, cliente.ativo, usuario, cliente_id
+                cliente.nome, cliente.cpf_cnpj, normalize_document(cliente.cpf_cnpj), cliente.email, cliente.telefone,
+                cliente.endereco, self.dictionary.encode(conn, 'cidade', cliente.cidade),
+                self.dictionary.encode(conn, 'estado', cliente.estado), cliente.cep,
+                self.dictionary.encode(conn, 'tipo', cliente.tipo), cliente.ativo, usuario, content_hash("clientes", cliente), cliente_id
             ))
             
             # Log de auditoria
-            self.log_audit("clientes", cliente_id, "UPDATE", cliente_anterior.to_dict(), cliente.to_dict(), usuario)
-            conn.commit()
+            self.log_audit("clientes", cliente_id, "UPDATE", cliente_anterior.to_dict(), cliente.to_dict(), usuario, conn=conn)
             return True
 
+        resultado = self.execute_write(operacao)
+        self.cache.invalidate("clientes", [cliente_id])
+        return resultado
+
     def delete_cliente(self, cliente_id: int, usuario: str = None) -> bool:
         """Excluir cliente (soft delete)"""
-        cliente_anterior = self.get_cliente(cliente_id)
-        if not cliente_anterior:
-            return False
+        def operacao(conn):
+            cliente_anterior = self.query_records(conn, "clientes", "WHERE id = ?", (cliente_id,)).fetchone()
+            if not cliente_anterior:
+                return False
 
-        with self.get_connection() as conn:
-            conn.execute("UPDATE clientes SET ativo=0, data_atualizacao=CURRENT_TIMESTAMP, atualizado_por=? WHERE id=?", (usuario, cliente_id))
+            conn.execute("UPDATE clientes SET ativo=0, data_atualizacao=CURRENT_TIMESTAMP, atualizado_por=?, hash_conteudo=? WHERE id=?",
+                         (usuario, content_hash("clientes", cliente_anterior, ativo=False), cliente_id))
             
             # Log de auditoria
-            self.log_audit("clientes", cliente_id, "DELETE", cliente_anterior.to_dict(), None, usuario)
-            conn.commit()
+            self.log_audit("clientes", cliente_id, "DELETE", cliente_anterior.to_dict(), None, usuario, conn=conn)
             return True
 
-    def list_clientes(self, ativo_apenas: bool = True, limit: int = None, offset: int = 0) -> List[Cliente]:
-        """Listar clientes"""
+        resultado = self.execute_write(operacao)
+        self.cache.invalidate("clientes", [cliente_id])
+        return resultado
+
+    def list_clientes(self, ativo_apenas: bool = True, limit: int = None, offset: int = 0,
+                      fields: List[str] = None) -> List[Cliente]:
+        """Listar clientes (com fields, apenas as colunas pedidas, como dicionários)"""
         with self.get_connection() as conn:
-            query = "SELECT * FROM clientes"
+            query = ""
             params = []
             
             if ativo_apenas:
@@ -245,92 +1223,83 @@ class DatabaseManager:
                 query += " LIMIT ? OFFSET ?"
                 params.extend([limit, offset])
             
-            cursor = conn.execute(query, params)
-            clientes = []
-            for row in cursor.fetchall():
-                clientes.append(Cliente(
-                    id=row['id'], nome=row['nome'], cpf_cnpj=row['cpf_cnpj'],
-                    email=row['email'], telefone=row['telefone'], endereco=row['endereco'],
-                    cidade=row['cidade'], estado=row['estado'], cep=row['cep'],
-                    tipo=row['tipo'], ativo=bool(row['ativo']),
-                    data_criacao=datetime.fromisoformat(row['data_criacao']) if row['data_criacao'] else None,
-                    data_atualizacao=datetime.fromisoformat(row['data_atualizacao']) if row['data_atualizacao'] else None,
-                    criado_por=row['criado_por'], atualizado_por=row['atualizado_por']
-                ))
-            return clientes
+            if fields:
+                return self.query_projection(conn, "clientes", fields, query, params)
+            return self.query_records(conn, "clientes", query, params).fetchall()
 
     # CRUD para Produtos
     def create_produto(self, produto: Produto, usuario: str = None) -> int:
         """Criar novo produto"""
-        with self.get_connection() as conn:
+        def operacao(conn):
             cursor = conn.execute("""
-                INSERT INTO produtos (nome, codigo, descricao, categoria, subcategoria, preco, unidade_medida, criado_por, atualizado_por)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO produtos (nome, codigo, descricao, categoria, subcategoria, preco, unidade_medida, criado_por, atualizado_por, hash_conteudo)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
-                produto.nome, produto.codigo, produto.descricao, produto.categoria,
-                produto.subcategoria, produto.preco, produto.unidade_medida, usuario, usuario
+                produto.nome, produto.codigo, produto.descricao, self.dictionary.encode(conn, 'categoria', produto.categoria),
+                self.dictionary.encode(conn, 'subcategoria', produto.subcategoria), produto.preco,
+                self.dictionary.encode(conn, 'unidade_medida', produto.unidade_medida), usuario, usuario, content_hash("produtos", produto, ativo=True)
             ))
             produto_id = cursor.lastrowid
             
             # Log de auditoria
-            self.log_audit("produtos", produto_id, "INSERT", None, produto.to_dict(), usuario)
-            conn.commit()
+            self.log_audit("produtos", produto_id, "INSERT", None, produto.to_dict(), usuario, conn=conn)
             return produto_id
 
+        produto_id = self.execute_write(operacao)
+        self.cache.invalidate("produtos", [produto_id])
+        return produto_id
+
     def get_produto(self, produto_id: int) -> Optional[Produto]:
         """Obter produto por ID"""
-        with self.get_connection() as conn:
-            cursor = conn.execute("SELECT * FROM produtos WHERE id = ?", (produto_id,))
-            row = cursor.fetchone()
-            if row:
-                return Produto(
-                    id=row['id'], nome=row['nome'], codigo=row['codigo'],
-                    descricao=row['descricao'], categoria=row['categoria'], subcategoria=row['subcategoria'],
-                    preco=row['preco'], unidade_medida=row['unidade_medida'], ativo=bool(row['ativo']),
-                    data_criacao=datetime.fromisoformat(row['data_criacao']) if row['data_criacao'] else None,
-                    data_atualizacao=datetime.fromisoformat(row['data_atualizacao']) if row['data_atualizacao'] else None,
-                    criado_por=row['criado_por'], atualizado_por=row['atualizado_por']
-                )
-            return None
+        return self.get_many("produtos", [produto_id]).get(produto_id)
 
     def update_produto(self, produto_id: int, produto: Produto, usuario: str = None) -> bool:
         """Atualizar produto"""
-        produto_anterior = self.get_produto(produto_id)
-        if not produto_anterior:
-            return False
+        def operacao(conn):
+            produto_anterior = self.query_records(conn, "produtos", "WHERE id = ?", (produto_id,)).fetchone()
+            if not produto_anterior:
+                return False
 
-        with self.get_connection() as conn:
             conn.execute("""
-                UPDATE produtos SET nome=?, codigo=?, descricao=?, categoria=?, subcategoria=?, preco=?, unidade_medida=?, ativo=?, data_atualizacao=CURRENT_TIMESTAMP, atualizado_por=?
+                UPDATE produtos SET nome=?, codigo=?, descricao=?, categoria=?, subcategoria=?, preco=?, unidade_medida=?, ativo=?, data_atualizacao=CURRENT_TIMESTAMP, atualizado_por=?, hash_conteudo=?
                 WHERE id=?
             """, (
-                produto.nome, produto.codigo, produto.descricao, produto.categoria,
-                produto.subcategoria, produto.preco, produto.unidade_medida, produto.ativo, usuario, produto_id
+                produto.nome, produto.codigo, produto.descricao, self.dictionary.encode(conn, 'categoria', produto.categoria),
+                self.dictionary.encode(conn, 'subcategoria', produto.subcategoria), produto.preco,
+                self.dictionary.encode(conn, 'unidade_medida', produto.unidade_medida), produto.ativo, usuario, content_hash("produtos", produto), produto_id
             ))
             
             # Log de auditoria
-            self.log_audit("produtos", produto_id, "UPDATE", produto_anterior.to_dict(), produto.to_dict(), usuario)
-            conn.commit()
+            self.log_audit("produtos", produto_id, "UPDATE", produto_anterior.to_dict(), produto.to_dict(), usuario, conn=conn)
             return True
 
+        resultado = self.execute_write(operacao)
+        self.cache.invalidate("produtos", [produto_id])
+        return resultado
+
     def delete_produto(self, produto_id: int, usuario: str = None) -> bool:
         """Excluir produto (soft delete)"""
-        produto_anterior = self.get_produto(produto_id)
-        if not produto_anterior:
-            return False
+        def operacao(conn):
+            produto_anterior = self.query_records(conn, "produtos", "WHERE id = ?", (produto_id,)).fetchone()
+            if not produto_anterior:
+                return False
 
-        with self.get_connection() as conn:
-            conn.execute("UPDATE produtos SET ativo=0, data_atualizacao=CURRENT_TIMESTAMP, atualizado_por=? WHERE id=?", (usuario, produto_id))
+            conn.execute("UPDATE produtos SET ativo=0, data_atualizacao=CURRENT_TIMESTAMP, atualizado_por=?, hash_conteudo=? WHERE id=?",
+                         (usuario, content_hash("produtos", produto_anterior, ativo=False), produto_id))
             
             # Log de auditoria
-            self.log_audit("produtos", produto_id, "DELETE", produto_anterior.to_dict(), None, usuario)
-            conn.commit()
+            self.log_audit("produtos", produto_id, "DELETE", produto_anterior.to_dict(), None, usuario, conn=conn)
             return True
 
-    def list_produtos(self, ativo_apenas: bool = True, limit: int = None, offset: int = 0) -> List[Produto]:
-        """Listar produtos"""
+        resultado = self.execute_write(operacao)
+        self.cache.invalidate("produtos", [produto_id])
+        return resultado
+
+    def list_produtos(self, ativo_apenas: bool = True, limit: int = None, offset: int = 0,
+                      fields: List[str] = None) -> List[Produto]:
+        """Listar produtos (com fields, apenas as colunas pedidas, como dicionários)"""
         with self.get_connection() as conn:
-            query = "SELECT * FROM produtos"
+            query = ""
             params = []
             
             if ativo_apenas:
@@ -342,94 +1311,92 @@ class DatabaseManager:
                 query += " LIMIT ? OFFSET ?"
                 params.extend([limit, offset])
             
-            cursor = conn.execute(query, params)
-            produtos = []
-            for row in cursor.fetchall():
-                produtos.append(Produto(
-                    id=row['id'], nome=row['nome'], codigo=row['codigo'],
-                    descricao=row['descricao'], categoria=row['categoria'], subcategoria=row['subcategoria'],
-                    preco=row['preco'], unidade_medida=row['unidade_medida'], ativo=bool(row['ativo']),
-                    data_criacao=datetime.fromisoformat(row['data_criacao']) if row['data_criacao'] else None,
-                    data_atualizacao=datetime.fromisoformat(row['data_atualizacao']) if row['data_atualizacao'] else None,
-                    criado_por=row['criado_por'], atualizado_por=row['atualizado_por']
-                ))
-            return produtos
+            if fields:
+                return self.query_projection(conn, "produtos", fields, query, params)
+            return self.query_records(conn, "produtos", query, params).fetchall()
 
     # CRUD para Fornecedores
     def create_fornecedor(self, fornecedor: Fornecedor, usuario: str = None) -> int:
         """Criar novo fornecedor"""
-        with self.get_connection() as conn:
+        def operacao(conn):
             cursor = conn.execute("""
-                INSERT INTO fornecedores (nome, cnpj, email, telefone, endereco, cidade, estado, cep, contato_principal, criado_por, atualizado_por)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO fornecedores (nome, cnpj, cnpj_digitos, email, telefone, endereco, cidade, estado, cep, contato_principal, criado_por, atualizado_por, hash_conteudo)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
-                fornecedor.nome, fornecedor.cnpj, fornecedor.email, fornecedor.telefone,
-                fornecedor.endereco, fornecedor.cidade, fornecedor.estado, fornecedor.cep,
-                fornecedor.contato_principal, usuario, usuario
+                fornecedor.nome, fornecedor.cnpj, normalize_document(fornecedor.cnpj), fornecedor.email, fornecedor.telefone,
+                fornecedor.endereco, self.dictionary.encode(conn, 'cidade', fornecedor.cidade),
+                self.dictionary.encode(conn, 'estado', fornecedor.estado), fornecedor.cep,
+                fornecedor.contato_principal, usuario, usuario, content_hash("fornecedores", fornecedor, ativo=True)
             ))
             fornecedor_id = cursor.lastrowid
             
             # Log de auditoria
-            self.log_audit("fornecedores", fornecedor_id, "INSERT", None, fornecedor.to_dict(), usuario)
-            conn.commit()
+            self.log_audit("fornecedores", fornecedor_id, "INSERT", None, fornecedor.to_dict(), usuario, conn=conn)
             return fornecedor_id
 
+        fornecedor_id = self.execute_write(operacao)
+        self.cache.invalidate("fornecedores", [fornecedor_id])
+        return fornecedor_id
+
     def get_fornecedor(self, fornecedor_id: int) -> Optional[Fornecedor]:
         """Obter fornecedor por ID"""
-        with self.get_connection() as conn:
-            cursor = conn.execute("SELECT * FROM fornecedores WHERE id = ?", (fornecedor_id,))
-            row = cursor.fetchone()
-            if row:
-                return Fornecedor(
-                    id=row['id'], nome=row['nome'], cnpj=row['cnpj'],
-                    email=row['email'], telefone=row['telefone'], endereco=row['endereco'],
-                    cidade=row['cidade'], estado=row['estado'], cep=row['cep'],
-                    contato_principal=row['contato_principal'], ativo=bool(row['ativo']),
-                    data_criacao=datetime.fromisoformat(row['data_criacao']) if row['data_criacao'] else None,
-                    data_atualizacao=datetime.fromisoformat(row['data_atualizacao']) if row['data_atualizacao'] else None,
-                    criado_por=row['criado_por'], atualizado_por=row['atualizado_por']
-                )
+        return self.get_many("fornecedores", [fornecedor_id]).get(fornecedor_id)
+
+    def get_fornecedor_by_cnpj(self, cnpj: str) -> Optional[Fornecedor]:
+        """Obter fornecedor ativo pelo CNPJ, com ou sem formatação"""
+        digitos = normalize_document(cnpj)
+        if digitos is None:
             return None
+        return self.get_many_by_key("fornecedores", "cnpj_digitos", [digitos]).get(digitos)
 
     def update_fornecedor(self, fornecedor_id: int, fornecedor: Fornecedor, usuario: str = None) -> bool:
         """Atualizar fornecedor"""
-        fornecedor_anterior = self.get_fornecedor(fornecedor_id)
-        if not fornecedor_anterior:
-            return False
+        def operacao(conn):
+            fornecedor_anterior = self.query_records(conn, "fornecedores", "WHERE id = ?", (fornecedor_id,)).fetchone()
+            if not fornecedor_anterior:
+                return False
 
-        with self.get_connection() as conn:
             conn.execute("""
-                UPDATE fornecedores SET nome=?, cnpj=?, email=?, telefone=?, endereco=?, cidade=?, estado=?, cep=?, contato_principal=?, ativo=?, data_atualizacao=CURRENT_TIMESTAMP, atualizado_por=?
+                UPDATE fornecedores SET nome=?, cnpj=?, cnpj_digitos=?, email=?, telefone=?, endereco=?, cidade=?, estado=?, cep=?, contato_principal=?, ativo=?, data_atualizacao=CURRENT_TIMESTAMP, atualizado_por=?, hash_conteudo=?
                 WHERE id=?
             """, (
-                fornecedor.nome, fornecedor.cnpj, fornecedor.email, fornecedor.telefone,
-                fornecedor.endereco, fornecedor.cidade, fornecedor.estado, fornecedor.cep,
-                fornecedor.contato_principal, fornecedor.ativo, usuario, fornecedor_id
+                fornecedor.nome, fornecedor.cnpj, normalize_document(fornecedor.cnpj), fornecedor.email, fornecedor.telefone,
+                fornecedor.endereco, self.dictionary.encode(conn, 'cidade', fornecedor.cidade),
+                self.dictionary.encode(conn, 'estado', fornecedor.estado), fornecedor.cep,
+                fornecedor.contato_principal, fornecedor.ativo, usuario, content_hash("fornecedores", fornecedor), fornecedor_id
             ))
             
             # Log de auditoria
-            self.log_audit("fornecedores", fornecedor_id, "UPDATE", fornecedor_anterior.to_dict(), fornecedor.to_dict(), usuario)
-            conn.commit()
+            self.log_audit("fornecedores", fornecedor_id, "UPDATE", fornecedor_anterior.to_dict(), fornecedor.to_dict(), usuario, conn=conn)
             return True
 
+        resultado = self.execute_write(operacao)
+        self.cache.invalidate("fornecedores", [fornecedor_id])
+        return resultado
+
     def delete_fornecedor(self, fornecedor_id: int, usuario: str = None) -> bool:
         """Excluir fornecedor (soft delete)"""
-        fornecedor_anterior = self.get_fornecedor(fornecedor_id)
-        if not fornecedor_anterior:
-            return False
+        def operacao(conn):
+            fornecedor_anterior = self.query_records(conn, "fornecedores", "WHERE id = ?", (fornecedor_id,)).fetchone()
+            if not fornecedor_anterior:
+                return False
 
-        with self.get_connection() as conn:
-            conn.execute("UPDATE fornecedores SET ativo=0, data_atualizacao=CURRENT_TIMESTAMP, atualizado_por=? WHERE id=?", (usuario, fornecedor_id))
+            conn.execute("UPDATE fornecedores SET ativo=0, data_atualizacao=CURRENT_TIMESTAMP, atualizado_por=?, hash_conteudo=? WHERE id=?",
+                         (usuario, content_hash("fornecedores", fornecedor_anterior, ativo=False), fornecedor_id))
             
             # Log de auditoria
-            self.log_audit("fornecedores", fornecedor_id, "DELETE", fornecedor_anterior.to_dict(), None, usuario)
-            conn.commit()
+            self.log_audit("fornecedores", fornecedor_id, "DELETE", fornecedor_anterior.to_dict(), None, usuario, conn=conn)
             return True
 
-    def list_fornecedores(self, ativo_apenas: bool = True, limit: int = None, offset: int = 0) -> List[Fornecedor]:
-        """Listar fornecedores"""
+        resultado = self.execute_write(operacao)
+        self.cache.invalidate("fornecedores", [fornecedor_id])
+        return resultado
+
+    def list_fornecedores(self, ativo_apenas: bool = True, limit: int = None, offset: int = 0,
+                          fields: List[str] = None) -> List[Fornecedor]:
+        """Listar fornecedores (com fields, apenas as colunas pedidas, como dicionários)"""
         with self.get_connection() as conn:
-            query = "SELECT * FROM fornecedores"
+            query = ""
             params = []
             
             if ativo_apenas:
@@ -441,40 +1408,30 @@ class DatabaseManager:
                 query += " LIMIT ? OFFSET ?"
                 params.extend([limit, offset])
             
-            cursor = conn.execute(query, params)
-            fornecedores = []
-            for row in cursor.fetchall():
-                fornecedores.append(Fornecedor(
-                    id=row['id'], nome=row['nome'], cnpj=row['cnpj'],
-                    email=row['email'], telefone=row['telefone'], endereco=row['endereco'],
-                    cidade=row['cidade'], estado=row['estado'], cep=row['cep'],
-                    contato_principal=row['contato_principal'], ativo=bool(row['ativo']),
-                    data_criacao=datetime.fromisoformat(row['data_criacao']) if row['data_criacao'] else None,
-                    data_atualizacao=datetime.fromisoformat(row['data_atualizacao']) if row['data_atualizacao'] else None,
-                    criado_por=row['criado_por'], atualizado_por=row['atualizado_por']
-                ))
-            return fornecedores
+            if fields:
+                return self.query_projection(conn, "fornecedores", fields, query, params)
+            return self.query_records(conn, "fornecedores", query, params).fetchall()
     
     def get_dashboard_metrics(self) -> Dict[str, Any]:
         """Obter métricas para o dashboard"""
         with self.get_connection() as conn:
-            # Contar registros
-            clientes_count = conn.execute("SELECT COUNT(*) FROM clientes WHERE ativo = 1").fetchone()[0]
-            produtos_count = conn.execute("SELECT COUNT(*) FROM produtos WHERE ativo = 1").fetchone()[0]
-            fornecedores_count = conn.execute("SELECT COUNT(*) FROM fornecedores WHERE ativo = 1").fetchone()[0]
-            
-            # Últimas alterações
-            ultimas_alteracoes = conn.execute("""
-                SELECT tabela, COUNT(*) as count FROM audit_log 
-                WHERE date(data_operacao) = date('now') 
-                GROUP BY tabela
+            # Contadores mantidos pelos triggers (ver init_counters)
+            contadores = dict(conn.execute(f"""
+                SELECT tabela, ativos FROM contadores_registros
+                WHERE tabela IN ({', '.join('?' * len(COUNTED_TABLES))})
+            """, COUNTED_TABLES).fetchall())
+
+            # Alterações de hoje
+            alteracoes_hoje = conn.execute("""
+                SELECT tabela, total FROM contadores_auditoria
+                WHERE dia = date('now') AND total > 0
             """).fetchall()
             
             return {
-                'total_clientes': clientes_count,
-                'total_produtos': produtos_count,
-                'total_fornecedores': fornecedores_count,
-                'alteracoes_hoje': {row['tabela']: row['count'] for row in ultimas_alteracoes}
+                'total_clientes': contadores.get('clientes', 0),
+                'total_produtos': contadores.get('produtos', 0),
+                'total_fornecedores': contadores.get('fornecedores', 0),
+                'alteracoes_hoje': {row['tabela']: row['total'] for row in alteracoes_hoje}
             }
 
     def search_records(self, tabela: str, termo: str, campos: List[str] = None, limit: int = 50) -> List[Dict]:
@@ -488,11 +1445,11 @@ class DatabaseManager:
             params = []
             
             for campo in campos:
-                conditions.append(f"{campo} LIKE ?")
+                conditions.append(encoded_condition(tabela, campo, "LIKE ?"))
                 params.append(f"%{termo}%")
             
             query = f"""
-                SELECT * FROM {tabela} 
+                SELECT {self.decoded_projection(tabela)} FROM {tabela} 
                 WHERE ativo = 1 AND ({' OR '.join(conditions)})
                 ORDER BY nome
                 LIMIT ?
@@ -505,7 +1462,7 @@ class DatabaseManager:
     def get_audit_log(self, tabela: str = None, registro_id: int = None, limit: int = 100) -> List[AuditLog]:
         """Obter logs de auditoria"""
         with self.get_connection() as conn:
-            query = "SELECT * FROM audit_log"
+            query = ""
             params = []
             conditions = []
             
@@ -518,21 +1475,12 @@ class DatabaseManager:
                 params.append(registro_id)
             
             if conditions:
-                query += " WHERE " + " AND ".join(conditions)
+                query += "WHERE " + " AND ".join(conditions)
             
             query += " ORDER BY data_operacao DESC LIMIT ?"
             params.append(limit)
             
-            cursor = conn.execute(query, params)
-            logs = []
-            for row in cursor.fetchall():
-                logs.append(AuditLog(
-                    id=row['id'], tabela=row['tabela'], registro_id=row['registro_id'],
-                    operacao=row['operacao'], dados_anteriores=row['dados_anteriores'],
-                    dados_novos=row['dados_novos'], usuario=row['usuario'],
-                    data_operacao=datetime.fromisoformat(row['data_operacao']) if row['data_operacao'] else None
-                ))
-            return logs
+            return self.query_records(conn, "audit_log", query, params).fetchall()
 
 # Instância global do gerenciador
 db_manager = DatabaseManager()
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""
+Manutenção agendada do banco: digests da sincronização, estatísticas do planejador, páginas livres e WAL
+"""
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional
+import argparse
+import sqlite3
+import sys
+import threading
+import time
+
+from .database_manager import DatabaseManager, db_manager
+from config import (MAINTENANCE_INTERVAL, MAINTENANCE_CHECK_INTERVAL, MAINTENANCE_CHANGES_THRESHOLD,
+                    MAINTENANCE_FREE_PAGES, MAINTENANCE_WAL_BYTES, MAINTENANCE_VACUUM_STEP,
+                    MAINTENANCE_ANALYSIS_LIMIT, MAINTENANCE_HISTORY)
+
+# Valor de PRAGMA auto_vacuum em bancos com vacuum incremental
+AUTO_VACUUM_INCREMENTAL = 2
+
+class MaintenanceScheduler:
+    """Roda ANALYZE/PRAGMA optimize, incremental_vacuum e wal_checkpoint(TRUNCATE)
+
+    A cada verificacao segundos decide se a manutenção é devida: pelo intervalo, por um
+    lote grande de alterações (soma das gerações, que cresce a cada linha gravada ou
+    removida), por páginas livres acumuladas (clean_old_logs, arquivamento) ou por um WAL
+    grande. Estatísticas e vacuum passam pela fila de escrita em transações curtas,
+    intercalados com as demais escritas; o checkpoint usa uma conexão própria, fora de
+    transação. Cada execução fica no histórico com a duração de cada etapa.
+
+    A cada verificação também recalcula, na fila de escrita, os digests das faixas de ids
+    alteradas (utils.delta_sync), para que as leituras da sincronização não escrevam.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, intervalo: float = MAINTENANCE_INTERVAL,
+                 verificacao: float = MAINTENANCE_CHECK_INTERVAL,
+                 limite_alteracoes: int = MAINTENANCE_CHANGES_THRESHOLD,
+                 limite_paginas: int = MAINTENANCE_FREE_PAGES, limite_wal: int = MAINTENANCE_WAL_BYTES,
+                 passo_vacuum: int = MAINTENANCE_VACUUM_STEP, analysis_limit: int = MAINTENANCE_ANALYSIS_LIMIT):
+        self.db_manager = db_manager
+        self.intervalo = intervalo
+        self.verificacao = verificacao
+        self.limite_alteracoes = limite_alteracoes
+        self.limite_paginas = limite_paginas
+        self.limite_wal = limite_wal
+        self.passo_vacuum = passo_vacuum
+        self.analysis_limit = analysis_limit
+        self.historico = deque(maxlen=MAINTENANCE_HISTORY)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._ultima = None      # time.monotonic() da última execução (ou do start)
+        self._geracoes = None    # soma das gerações no último ANALYZE
+        self.stats = {'execucoes': 0, 'falhas': 0, 'ultima_execucao': None, 'ultimo_erro': None}
+
+    def _total_changes(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COALESCE(SUM(geracao), 0) FROM geracoes").fetchone()[0]
+
+    def get_file_stats(self) -> Dict[str, Any]:
+        """Páginas, páginas livres, modo de auto_vacuum e tamanho do WAL"""
+        with self.db_manager.get_connection() as conn:
+            tamanho_pagina = conn.execute("PRAGMA page_size").fetchone()[0]
+            paginas = conn.execute("PRAGMA page_count").fetchone()[0]
+            livres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            alteracoes = self._total_changes(conn)
+            estatisticas = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            ).fetchone() is not None
+        return {
+            'bytes': tamanho_pagina * paginas,
+            'paginas': paginas,
+            'paginas_livres': livres,
+            'vacuum_incremental': auto_vacuum == AUTO_VACUUM_INCREMENTAL,
+            'wal_bytes': self.db_manager.storage.wal_bytes(),
+            'alteracoes': alteracoes,
+            'estatisticas': estatisticas
+        }
+
+    def due(self, arquivo: Dict[str, Any] = None) -> Optional[str]:
+        """Motivo para rodar a manutenção agora (None se não é devida)"""
+        arquivo = arquivo or self.get_file_stats()
+        if self._geracoes is None:
+            self._geracoes = arquivo['alteracoes']
+        if self._ultima is None:
+            self._ultima = time.monotonic()
+
+        if not arquivo['estatisticas']:
+            return 'sem_estatisticas'
+        if arquivo['alteracoes'] - self._geracoes >= self.limite_alteracoes:
+            return 'alteracoes'
+        if arquivo['vacuum_incremental'] and arquivo['paginas_livres'] >= self.limite_paginas:
+            return 'paginas_livres'
+        if arquivo['wal_bytes'] >= self.limite_wal:
+            return 'wal'
+        if time.monotonic() - self._ultima >= self.intervalo:
+            return 'agendada'
+        return None
+
+    def run_once(self, motivo: str = 'manual') -> Dict[str, Any]:
+        """Rodar todas as etapas da manutenção; retorna o registro da execução"""
+        with self._lock:
+            inicio = time.monotonic()
+            antes = self.get_file_stats()
+            etapas = {}
+
+            etapa = time.monotonic()
+            faixas = self.db_manager.refresh_range_digests()
+            etapas['digestos'] = round(time.monotonic() - etapa, 3)
+
+            # ANALYZE completo quando faltam estatísticas ou depois de um lote grande;
+            # senão PRAGMA optimize, que só reanalisa as tabelas que mudaram bastante
+            completo = (not antes['estatisticas'] or self._geracoes is None
+                        or antes['alteracoes'] - self._geracoes >= self.limite_alteracoes)
+            etapa = time.monotonic()
+            self.db_manager.execute_write(lambda conn: self._analyze(conn, completo))
+            etapas['estatisticas'] = round(time.monotonic() - etapa, 3)
+            self._geracoes = antes['alteracoes']
+
+            liberadas = 0
+            if antes['vacuum_incremental']:
+                etapa = time.monotonic()
+                while True:
+                    passo = self.db_manager.execute_write(self._vacuum_step)
+                    liberadas += passo
+                    if passo < self.passo_vacuum:
+                        break
+                etapas['vacuum'] = round(time.monotonic() - etapa, 3)
+
+            etapa = time.monotonic()
+            ocupado, paginas_wal, copiadas = self._checkpoint()
+            etapas['checkpoint'] = round(time.monotonic() - etapa, 3)
+
+            depois = self.get_file_stats()
+            execucao = {
+                'inicio': datetime.now().isoformat(),
+                'motivo': motivo,
+                'analyze_completo': completo,
+                'duracao': round(time.monotonic() - inicio, 3),
+                'etapas': etapas,
+                'paginas_liberadas': liberadas,
+                'faixas_atualizadas': faixas,
+                'checkpoint': {'ocupado': bool(ocupado), 'paginas_wal': paginas_wal, 'paginas_copiadas': copiadas},
+                'bytes_antes': antes['bytes'] + antes['wal_bytes'],
+                'bytes_depois': depois['bytes'] + depois['wal_bytes']
+            }
+            self.historico.append(execucao)
+            self.stats['execucoes'] += 1
+            self.stats['ultima_execucao'] = execucao['inicio']
+            self._ultima = time.monotonic()
+            return execucao
+
+    def _analyze(self, conn: sqlite3.Connection, completo: bool):
+        """Atualizar sqlite_stat1, amostrando no máximo analysis_limit linhas por índice"""
+        conn.execute(f"PRAGMA analysis_limit = {int(self.analysis_limit)}")
+        conn.execute("ANALYZE" if completo else "PRAGMA optimize")
+
+    def _vacuum_step(self, conn: sqlite3.Connection) -> int:
+        """Devolver ao sistema até passo_vacuum páginas livres, dentro da transação da fila"""
+        paginas = min(conn.execute("PRAGMA freelist_count").fetchone()[0], self.passo_vacuum)
+        # O sqlite3 do Python avança o pragma um passo só, e cada passo libera uma página:
+        # incremental_vacuum(N) num único execute devolveria apenas uma
+        for _ in range(paginas):
+            conn.execute("PRAGMA incremental_vacuum(1)")
+        return paginas
+
+    def _checkpoint(self):
+        """Copiar o WAL para o banco e truncá-lo (espera os leitores até o timeout)"""
+        conn = self.db_manager.storage.connect(timeout=30.0, isolation_level=None)
+        try:
+            return conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        finally:
+            conn.close()
+
+    def enable_incremental_vacuum(self) -> Dict[str, Any]:
+        """Converter um banco criado sem auto_vacuum (VACUUM completo: rodar com a aplicação parada)"""
+        conn = self.db_manager.storage.connect(timeout=30.0, isolation_level=None)
+        try:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+        return self.get_file_stats()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Estado da manutenção para o health check"""
+        proxima = None
+        if self._ultima is not None:
+            proxima = round(max(0.0, self.intervalo - (time.monotonic() - self._ultima)), 1)
+        return {
+            'ativa': self._thread is not None and self._thread.is_alive(),
+            'proxima_em': proxima,
+            **self.get_file_stats(),
+            **self.stats,
+            'historico': list(self.historico)
+        }
+
+    def start(self):
+        """Iniciar a verificação periódica em uma thread própria"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mdm-manutencao", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Parar a verificação periódica"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                motivo = self.due()
+                if motivo:
+                    self.run_once(motivo)
+                else:
+                    self.db_manager.refresh_range_digests()
+            except Exception as e:
+                self.stats['falhas'] += 1
+                self.stats['ultimo_erro'] = str(e)
+                self._ultima = time.monotonic()
+            self._stop.wait(self.verificacao)
+
+# Instância global da manutenção (iniciada por start())
+maintenance_scheduler = MaintenanceScheduler(db_manager)
+
+def main() -> int:
+    """Rodar a manutenção pela linha de comando"""
+    parser = argparse.ArgumentParser(description="Manutenção do banco do MDM")
+    parser.add_argument('--vacuum', action='store_true',
+                        help="converter o banco para vacuum incremental (VACUUM completo, com a aplicação parada)")
+    args = parser.parse_args()
+
+    if args.vacuum:
+        arquivo = maintenance_scheduler.enable_incremental_vacuum()
+        print(f"🧹 VACUUM concluído: {arquivo['bytes']} bytes, vacuum incremental: {arquivo['vacuum_incremental']}")
+    execucao = maintenance_scheduler.run_once()
+    print(f"✅ Manutenção em {execucao['duracao']}s: {execucao['etapas']}, "
+          f"{execucao['paginas_liberadas']} páginas liberadas")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
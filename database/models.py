@@ -7,7 +7,42 @@ from datetime import datetime
 import sqlite3
 import json
 
-@dataclass
+class _LazyTimestamp:
+    """Descritor que converte o texto de data do SQLite em datetime apenas no primeiro acesso"""
+    __slots__ = ('slot',)
+
+    def __init__(self, model: type, name: str):
+        # Descritor do slot original da dataclass, onde o valor fica armazenado
+        self.slot = model.__dict__[name]
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = self.slot.__get__(obj, objtype)
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+            self.slot.__set__(obj, value)
+        return value
+
+    def __set__(self, obj, value):
+        self.slot.__set__(obj, value)
+
+    def raw(self, obj):
+        """Valor armazenado, sem conversão"""
+        return self.slot.__get__(obj)
+
+def _isoformat(obj, name: str) -> Optional[str]:
+    """Serializar um campo de data sem forçar a conversão de valores ainda em texto"""
+    descriptor = getattr(type(obj), name)
+    value = descriptor.raw(obj) if isinstance(descriptor, _LazyTimestamp) else getattr(obj, name)
+    if value is None:
+        return None
+    if isinstance(value, str):
+        # CURRENT_TIMESTAMP do SQLite ('YYYY-MM-DD HH:MM:SS') difere do isoformat apenas no separador
+        return value.replace(' ', 'T', 1)
+    return value.isoformat()
+
+@dataclass(slots=True)
 class Cliente:
     """Modelo de dados para clientes"""
     nome: str
@@ -40,13 +75,13 @@ class Cliente:
             'cep': self.cep,
             'tipo': self.tipo,
             'ativo': self.ativo,
-            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
-            'data_atualizacao': self.data_atualizacao.isoformat() if self.data_atualizacao else None,
+            'data_criacao': _isoformat(self, 'data_criacao'),
+            'data_atualizacao': _isoformat(self, 'data_atualizacao'),
             'criado_por': self.criado_por,
             'atualizado_por': self.atualizado_por
         }
 
-@dataclass
+@dataclass(slots=True)
 class Produto:
     """Modelo de dados para produtos"""
     nome: str
@@ -75,13 +110,13 @@ class Produto:
             'preco': self.preco,
             'unidade_medida': self.unidade_medida,
             'ativo': self.ativo,
-            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
-            'data_atualizacao': self.data_atualizacao.isoformat() if self.data_atualizacao else None,
+            'data_criacao': _isoformat(self, 'data_criacao'),
+            'data_atualizacao': _isoformat(self, 'data_atualizacao'),
             'criado_por': self.criado_por,
             'atualizado_por': self.atualizado_por
         }
 
-@dataclass
+@dataclass(slots=True)
 class Fornecedor:
     """Modelo de dados para fornecedores"""
     nome: str
@@ -114,13 +149,13 @@ class Fornecedor:
             'cep': self.cep,
             'contato_principal': self.contato_principal,
             'ativo': self.ativo,
-            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
-            'data_atualizacao': self.data_atualizacao.isoformat() if self.data_atualizacao else None,
+            'data_criacao': _isoformat(self, 'data_criacao'),
+            'data_atualizacao': _isoformat(self, 'data_atualizacao'),
             'criado_por': self.criado_por,
             'atualizado_por': self.atualizado_por
         }
 
-@dataclass
+@dataclass(slots=True)
 class AuditLog:
     """Modelo para log de auditoria"""
     tabela: str
@@ -142,10 +177,10 @@ class AuditLog:
             'dados_anteriores': self.dados_anteriores,
             'dados_novos': self.dados_novos,
             'usuario': self.usuario,
-            'data_operacao': self.data_operacao.isoformat() if self.data_operacao else None
+            'data_operacao': _isoformat(self, 'data_operacao')
         }
 
-@dataclass
+@dataclass(slots=True)
 class Usuario:
     """Modelo de dados para usuários"""
     username: str
@@ -167,6 +202,37 @@ class Usuario:
             'email': self.email,
             'perfil': self.perfil,
             'ativo': self.ativo,
-            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
-            'ultimo_login': self.ultimo_login.isoformat() if self.ultimo_login else None
-        }
\ No newline at end of file
+            'data_criacao': _isoformat(self, 'data_criacao'),
+            'ultimo_login': _isoformat(self, 'ultimo_login')
+        }
+
+# Variantes carregadas do banco: mesmos campos, datas convertidas sob demanda
+
+class ClienteRecord(Cliente):
+    """Cliente lido do banco"""
+    __slots__ = ()
+    data_criacao = _LazyTimestamp(Cliente, 'data_criacao')
+    data_atualizacao = _LazyTimestamp(Cliente, 'data_atualizacao')
+
+class ProdutoRecord(Produto):
+    """Produto lido do banco"""
+    __slots__ = ()
+    data_criacao = _LazyTimestamp(Produto, 'data_criacao')
+    data_atualizacao = _LazyTimestamp(Produto, 'data_atualizacao')
+
+class FornecedorRecord(Fornecedor):
+    """Fornecedor lido do banco"""
+    __slots__ = ()
+    data_criacao = _LazyTimestamp(Fornecedor, 'data_criacao')
+    data_atualizacao = _LazyTimestamp(Fornecedor, 'data_atualizacao')
+
+class AuditLogRecord(AuditLog):
+    """Entrada de auditoria lida do banco"""
+    __slots__ = ()
+    data_operacao = _LazyTimestamp(AuditLog, 'data_operacao')
+
+class UsuarioRecord(Usuario):
+    """Usuário lido do banco"""
+    __slots__ = ()
+    data_criacao = _LazyTimestamp(Usuario, 'data_criacao')
+    ultimo_login = _LazyTimestamp(Usuario, 'ultimo_login')
@@ -0,0 +1,98 @@
+"""
+Orçamentos de tempo por operação, impostos às consultas pelo progress handler do SQLite
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Optional
+import sqlite3
+import threading
+import time
+
+from config import QUERY_BUDGETS, QUERY_BUDGET_CHECK_STEPS
+
+class QueryBudgetExceeded(sqlite3.OperationalError):
+    """Consulta abortada por ultrapassar o orçamento de tempo da operação"""
+
+    def __init__(self, tipo: str, limite: float, decorrido: float):
+        super().__init__(f"Consulta abortada: operação {tipo} passou de {limite:g}s ({decorrido:.1f}s)")
+        self.tipo = tipo
+        self.limite = limite
+        self.decorrido = decorrido
+
+class _Budget:
+    __slots__ = ('tipo', 'limite', 'inicio', 'prazo', 'estourado')
+
+    def __init__(self, tipo: str, limite: float):
+        self.tipo = tipo
+        self.limite = limite
+        self.inicio = time.monotonic()
+        self.prazo = self.inicio + limite
+        self.estourado = False
+
+class QueryBudgets:
+    """Prazo da operação corrente de cada thread, verificado enquanto o SQLite executa
+
+    Toda conexão do DatabaseManager recebe o progress handler (install), chamado a cada
+    passos instruções da VM. Sem orçamento na thread ele só retorna; passado o prazo, a
+    instrução em andamento (e qualquer outra da mesma operação) é interrompida e o with
+    de budget() troca o OperationalError('interrupted') por QueryBudgetExceeded. Um
+    budget() dentro de outro vale até o fim do interno: a operação declarada por último
+    (ex.: uma exportação disparada por uma requisição) define o prazo.
+
+    A thread escritora nunca tem orçamento: interromper uma escrita desfaria a transação
+    inteira do grupo, com as operações de outras threads.
+    """
+
+    def __init__(self, limites: Dict[str, float] = None, passos: int = QUERY_BUDGET_CHECK_STEPS):
+        self.limites = dict(limites or QUERY_BUDGETS)
+        self.passos = passos
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {tipo: {'operacoes': 0, 'abortadas': 0, 'ultima_abortada': None} for tipo in self.limites}
+
+    def install(self, conn: sqlite3.Connection) -> sqlite3.Connection:
+        """Ligar a verificação do prazo em conn"""
+        conn.set_progress_handler(self._check, self.passos)
+        return conn
+
+    def _check(self) -> int:
+        orcamento = getattr(self._local, 'atual', None)
+        if orcamento is None:
+            return 0
+        if orcamento.estourado:
+            return 1
+        if time.monotonic() > orcamento.prazo:
+            # Contada aqui: o erro pode ser tratado antes de sair do with
+            orcamento.estourado = True
+            with self._lock:
+                self.stats[orcamento.tipo]['abortadas'] += 1
+                self.stats[orcamento.tipo]['ultima_abortada'] = datetime.now().isoformat()
+            return 1
+        return 0
+
+    @contextmanager
+    def budget(self, tipo: str = 'interativa', segundos: Optional[float] = None):
+        """Limitar as consultas da thread dentro do with ao orçamento de tipo (ou a segundos)"""
+        if tipo not in self.limites:
+            raise ValueError(f"Tipo de orçamento inválido: {tipo}")
+        orcamento = _Budget(tipo, segundos if segundos is not None else self.limites[tipo])
+        anterior = getattr(self._local, 'atual', None)
+        self._local.atual = orcamento
+        with self._lock:
+            self.stats[tipo]['operacoes'] += 1
+        try:
+            yield orcamento
+        except sqlite3.OperationalError as e:
+            if not orcamento.estourado or isinstance(e, QueryBudgetExceeded):
+                raise
+            raise QueryBudgetExceeded(tipo, orcamento.limite, time.monotonic() - orcamento.inicio) from e
+        finally:
+            self._local.atual = anterior
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Limite, operações e consultas abortadas por tipo de orçamento"""
+        with self._lock:
+            return {tipo: {'limite': self.limites[tipo], **contagem} for tipo, contagem in self.stats.items()}
+
+# Instância global dos orçamentos (instalada nas conexões pelo DatabaseManager)
+query_budgets = QueryBudgets()
@@ -0,0 +1,123 @@
+"""
+Cache LRU de registros lidos do banco
+"""
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+class RecordCache:
+    """Cache read-through de registros por (tabela, id) e por chaves naturais
+
+    Limitado a max_entries registros, com descarte do menos usado. As chaves naturais
+    são apelidos do registro do id: somem junto com ele. Cada tabela tem um contador de
+    invalidações; a leitura que começou antes de uma escrita não consegue gravar no cache
+    (put com token antigo é ignorado), então uma escrita confirmada nunca é sobrescrita
+    pela versão anterior. Cada registro guarda também a geração do banco lida antes da
+    consulta que o trouxe (ver database.cache_snapshot).
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._records = OrderedDict()   # (tabela, id) -> (registro, geração do banco na leitura)
+        self._aliases = {}              # (tabela, campo, valor) -> id
+        self._record_aliases = {}       # (tabela, id) -> {(tabela, campo, valor)}
+        self._generations = {}          # tabela -> nº de invalidações
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def token(self, tabela: str) -> int:
+        """Marcar o início de uma leitura no banco (passar depois para put)"""
+        with self._lock:
+            return self._generations.get(tabela, 0)
+
+    def get(self, tabela: str, registro_id: Any) -> Optional[Any]:
+        """Registro pelo id, ou None se não estiver no cache"""
+        with self._lock:
+            entrada = self._records.get((tabela, registro_id))
+            if entrada is None:
+                self.stats['misses'] += 1
+                return None
+            self._records.move_to_end((tabela, registro_id))
+            self.stats['hits'] += 1
+        return copy.copy(entrada[0])
+
+    def get_by_key(self, tabela: str, campo: str, valor: Hashable) -> Optional[Any]:
+        """Registro por chave natural, ou None se não estiver no cache"""
+        with self._lock:
+            registro_id = self._aliases.get((tabela, campo, valor))
+            entrada = self._records.get((tabela, registro_id)) if registro_id is not None else None
+            if entrada is None:
+                self.stats['misses'] += 1
+                return None
+            self._records.move_to_end((tabela, registro_id))
+            self.stats['hits'] += 1
+        return copy.copy(entrada[0])
+
+    def put(self, tabela: str, registro: Any, token: int, chaves: Iterable[Tuple[str, Hashable]] = (),
+            geracao: Optional[int] = None):
+        """Guardar registro lido do banco, com suas chaves naturais (campo, valor) e a geração da leitura"""
+        with self._lock:
+            if self._generations.get(tabela, 0) != token:
+                return
+            chave = (tabela, registro.id)
+            self._records[chave] = (copy.copy(registro), geracao)
+            self._records.move_to_end(chave)
+            for campo, valor in chaves:
+                if valor is not None:
+                    self._aliases[(tabela, campo, valor)] = registro.id
+                    self._record_aliases.setdefault(chave, set()).add((tabela, campo, valor))
+            while len(self._records) > self.max_entries:
+                antiga, _ = self._records.popitem(last=False)
+                self._drop_aliases(antiga)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, tabela: str, ids: Iterable[Any] = ()):
+        """Descartar registros alterados (chamar depois do commit da escrita)"""
+        with self._lock:
+            self._generations[tabela] = self._generations.get(tabela, 0) + 1
+            for registro_id in ids:
+                chave = (tabela, registro_id)
+                if self._records.pop(chave, None) is not None:
+                    self.stats['invalidations'] += 1
+                self._drop_aliases(chave)
+
+    def export(self) -> Dict[str, List[Tuple[Any, List[Tuple[str, Hashable]], Optional[int]]]]:
+        """Registros por tabela com chaves naturais e geração da leitura, do menos ao mais usado"""
+        with self._lock:
+            tabelas = {}
+            for (tabela, registro_id), (registro, geracao) in self._records.items():
+                chaves = [(campo, valor) for _, campo, valor in self._record_aliases.get((tabela, registro_id), ())]
+                tabelas.setdefault(tabela, []).append((copy.copy(registro), chaves, geracao))
+            return tabelas
+
+    def load_entries(self, tabela: str, entradas: Iterable[Tuple[Any, Iterable[Tuple[str, Hashable]], Optional[int]]]):
+        """Guardar registros exportados (ver export), do menos ao mais usado"""
+        token = self.token(tabela)
+        for registro, chaves, geracao in entradas:
+            self.put(tabela, registro, token, chaves, geracao)
+
+    def clear(self):
+        """Esvaziar o cache"""
+        with self._lock:
+            for tabela in self._generations:
+                self._generations[tabela] += 1
+            self._records.clear()
+            self._aliases.clear()
+            self._record_aliases.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estatísticas de uso (inclui taxa de acerto e ocupação)"""
+        with self._lock:
+            consultas = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._records),
+                'max_entries': self.max_entries,
+                'hit_ratio': self.stats['hits'] / consultas if consultas else 0.0
+            }
+
+    def _drop_aliases(self, chave: Tuple[str, Any]):
+        for alias in self._record_aliases.pop(chave, ()):
+            if self._aliases.get(alias) == chave[1]:
+                del self._aliases[alias]
@@ -0,0 +1,255 @@
+"""
+Replicação por envio de log para um arquivo SQLite de standby
+"""
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+from .database_manager import DatabaseManager, db_manager, BATCH_CHUNK_SIZE
+from config import REPLICA_PATH, REPLICATION_INTERVAL, REPLICA_MAX_LAG
+
+# Tabelas mestre: cada alteração do audit_log é aplicada copiando a linha atual do primário,
+# tanto da tabela quente quanto do arquivo (o arquivamento move a linha entre as duas)
+REPLICATED_TABLES = ('clientes', 'produtos', 'fornecedores')
+
+# Tabelas pequenas (ou escritas sem auditoria) copiadas inteiras a cada ciclo
+COPIED_TABLES = ('usuarios', 'dicionario', 'contadores_registros', 'contadores_auditoria', 'geracoes')
+
+class Replicator:
+    """Mantém um standby do banco aplicando o feed de alterações do audit_log
+
+    A primeira cópia (e qualquer ressincronização) usa a API de backup do SQLite. Depois,
+    cada ciclo lê, num único snapshot do primário, as entradas do audit_log após o cursor,
+    copia as linhas atuais dos registros citados, as próprias entradas e as tabelas
+    pequenas, e grava tudo no standby numa só transação junto com o novo cursor. Lacuna
+    no feed (clean_old_logs) ou falha ao aplicar levam a uma nova cópia completa.
+
+    Enquanto o atraso fica abaixo de max_lag, as leituras de snapshot do DatabaseManager
+    vão para o standby.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, replica_path: str = None,
+                 intervalo: float = REPLICATION_INTERVAL, max_lag: float = REPLICA_MAX_LAG,
+                 lote: int = 1000):
+        self.db_manager = db_manager
+        self.replica_path = replica_path or REPLICA_PATH
+        self.intervalo = intervalo
+        self.max_lag = max_lag
+        self.lote = lote
+        self.cursor = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'ciclos': 0, 'alteracoes': 0, 'ressincronizacoes': 0, 'falhas': 0,
+                      'ultima_sincronizacao': None, 'ultimo_erro': None}
+
+    def _connect_replica(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.replica_path, isolation_level=None, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def bootstrap(self):
+        """Copiar o banco inteiro para o standby (API de backup) e reiniciar o cursor"""
+        with self._lock:
+            # Leitores voltam ao primário enquanto o standby é sobrescrito
+            self.db_manager.read_replica = None
+            Path(self.replica_path).parent.mkdir(parents=True, exist_ok=True)
+
+            origem = self.db_manager.storage.connect()
+            destino = self._connect_replica()
+            try:
+                # Um só passo: a cópia corresponde a um único estado do primário
+                origem.backup(destino)
+                destino.execute("PRAGMA journal_mode=WAL")
+                sequencia = destino.execute("SELECT seq FROM sqlite_sequence WHERE name = 'audit_log'").fetchone()
+                self.cursor = sequencia[0] if sequencia else 0
+                destino.execute("""
+                    CREATE TABLE IF NOT EXISTS replicacao_estado (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
+                        cursor INTEGER NOT NULL,
+                        aplicado_em TEXT NOT NULL
+                    )
+                """)
+                destino.execute("INSERT OR REPLACE INTO replicacao_estado (id, cursor, aplicado_em) VALUES (1, ?, ?)",
+                                (self.cursor, datetime.now().isoformat()))
+            finally:
+                origem.close()
+                destino.close()
+            self.stats['ressincronizacoes'] += 1
+
+    def sync_once(self) -> int:
+        """Aplicar no standby as alterações pendentes; retorna quantas foram aplicadas"""
+        if self.cursor is None:
+            self.cursor = self._load_cursor()
+            if self.cursor is None:
+                self.bootstrap()
+
+        with self._lock:
+            with self.db_manager.get_snapshot_connection(replica=False) as origem:
+                primeiro = origem.execute("SELECT MIN(id) FROM audit_log").fetchone()[0]
+                lacuna = primeiro is not None and self.cursor < primeiro - 1
+                if not lacuna:
+                    alteracoes = origem.execute(
+                        "SELECT * FROM audit_log WHERE id > ? ORDER BY id LIMIT ?", (self.cursor, self.lote)
+                    ).fetchall()
+                    linhas = {}
+                    for tabela in REPLICATED_TABLES:
+                        ids = list(dict.fromkeys(row['registro_id'] for row in alteracoes if row['tabela'] == tabela))
+                        linhas[tabela] = self._read_rows(origem, tabela, ids)
+                        linhas[f"{tabela}_arquivo"] = self._read_rows(origem, f"{tabela}_arquivo", ids)
+                    copias = {tabela: origem.execute(f"SELECT * FROM {tabela}").fetchall() for tabela in COPIED_TABLES}
+
+            if not lacuna:
+                try:
+                    self._apply(alteracoes, linhas, copias, primeiro)
+                except sqlite3.Error as e:
+                    # Esquema divergente ou conflito de unicidade no meio do lote
+                    self.stats['ultimo_erro'] = str(e)
+                    lacuna = True
+                else:
+                    if alteracoes:
+                        self.cursor = alteracoes[-1]['id']
+                    self.stats['alteracoes'] += len(alteracoes)
+
+        if lacuna:
+            self.bootstrap()
+            return 0
+
+        self.stats['ciclos'] += 1
+        self.stats['ultima_sincronizacao'] = datetime.now().isoformat()
+        self._route_reads()
+        return len(alteracoes)
+
+    def _load_cursor(self) -> Optional[int]:
+        """Cursor gravado no standby (None se o standby ainda não existe)"""
+        if not Path(self.replica_path).exists():
+            return None
+        conn = self._connect_replica()
+        try:
+            row = conn.execute("SELECT cursor FROM replicacao_estado WHERE id = 1").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def _read_rows(self, origem: sqlite3.Connection, tabela: str,
+                   ids: List[int]) -> Dict[int, Optional[sqlite3.Row]]:
+        """Linha atual de cada id na tabela (None se não existe nela)"""
+        linhas = dict.fromkeys(ids)
+        for inicio in range(0, len(ids), BATCH_CHUNK_SIZE):
+            lote = ids[inicio:inicio + BATCH_CHUNK_SIZE]
+            for row in origem.execute(f"SELECT * FROM {tabela} WHERE id IN ({', '.join('?' * len(lote))})", lote):
+                linhas[row['id']] = row
+        return linhas
+
+    def _apply(self, alteracoes: List[sqlite3.Row], linhas: Dict[str, Dict[int, Optional[sqlite3.Row]]],
+               copias: Dict[str, List[sqlite3.Row]], primeiro: Optional[int]):
+        """Gravar o ciclo no standby numa única transação"""
+        conn = self._connect_replica()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for tabela, registros in linhas.items():
+                # Remoções antes: a chave natural (documento, código) de um registro removido pode
+                # ter passado a outro id, e o upsert dele esbarraria no índice único
+                removidos = [(registro_id,) for registro_id, row in registros.items() if row is None]
+                conn.executemany(f"DELETE FROM {tabela} WHERE id = ?", removidos)
+                existentes = [row for row in registros.values() if row is not None]
+                if existentes:
+                    colunas = existentes[0].keys()
+                    conn.executemany(f"""
+                        INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})
+                        ON CONFLICT (id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in colunas if c != 'id')}
+                    """, [tuple(row) for row in existentes])
+
+            if alteracoes:
+                colunas = alteracoes[0].keys()
+                conn.executemany(f"INSERT INTO audit_log ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+                                 [tuple(row) for row in alteracoes])
+            if primeiro is not None:
+                conn.execute("DELETE FROM audit_log WHERE id < ?", (primeiro,))
+
+            # Por último: sobrescreve também o que os triggers do standby alteraram acima
+            for tabela, registros in copias.items():
+                conn.execute(f"DELETE FROM {tabela}")
+                if registros:
+                    colunas = registros[0].keys()
+                    conn.executemany(f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+                                     [tuple(row) for row in registros])
+
+            cursor = alteracoes[-1]['id'] if alteracoes else self.cursor
+            conn.execute("UPDATE replicacao_estado SET cursor = ?, aplicado_em = ? WHERE id = 1",
+                         (cursor, datetime.now().isoformat()))
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def get_lag(self) -> Dict[str, Any]:
+        """Atraso do standby: alterações ainda não aplicadas e idade da mais antiga (segundos)"""
+        cursor = self.cursor if self.cursor is not None else 0
+        with self.db_manager.get_snapshot_connection(replica=False) as conn:
+            ultimo = conn.execute("SELECT MAX(id) FROM audit_log").fetchone()[0] or 0
+            pendente = conn.execute("""
+                SELECT (julianday('now') - julianday(data_operacao)) * 86400
+                FROM audit_log WHERE id > ? ORDER BY id LIMIT 1
+            """, (cursor,)).fetchone()
+        return {
+            'cursor': cursor,
+            'ultimo_id_primario': ultimo,
+            'atraso_alteracoes': max(0, ultimo - cursor),
+            'atraso_segundos': round(max(0.0, pendente[0] or 0.0), 3) if pendente else 0.0
+        }
+
+    def _route_reads(self):
+        """Ligar ou desligar as leituras no standby conforme o atraso"""
+        atrasado = self.get_lag()['atraso_segundos'] > self.max_lag
+        self.db_manager.read_replica = None if atrasado else self.replica_path
+
+    def get_status(self) -> Dict[str, Any]:
+        """Estado da replicação para monitoramento"""
+        return {
+            'ativa': self._thread is not None and self._thread.is_alive(),
+            'replica': self.replica_path,
+            'leituras_no_standby': self.db_manager.read_replica is not None,
+            **self.get_lag(),
+            **self.stats
+        }
+
+    def start(self):
+        """Iniciar a replicação contínua em uma thread própria"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mdm-replicacao", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Parar a replicação e devolver as leituras ao primário"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.db_manager.read_replica = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            inicio = time.monotonic()
+            try:
+                # Esvaziar o feed antes de esperar o próximo ciclo
+                while self.sync_once() >= self.lote and not self._stop.is_set():
+                    pass
+            except Exception as e:
+                self.stats['falhas'] += 1
+                self.stats['ultimo_erro'] = str(e)
+                self.db_manager.read_replica = None
+            self._stop.wait(max(0.0, self.intervalo - (time.monotonic() - inicio)))
+
+# Instância global da replicação (iniciada por start())
+replicator = Replicator(db_manager)
@@ -0,0 +1,290 @@
+"""
+Rastreamento de SQL: tempo, linhas e chamador de cada instrução, agregados por impressão digital
+"""
+from collections import deque, Counter
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from config import (SQL_TRACE_ENABLED, SLOW_QUERY_THRESHOLD, SLOW_QUERY_LOG_PATH, SLOW_QUERY_LOG_SIZE,
+                    SQL_TRACE_MAX_FINGERPRINTS)
+
+# Limites (ms) das faixas do histograma de duração; a última faixa é "acima do maior"
+HISTOGRAM_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+# Chamadores distintos guardados por impressão digital
+MAX_CALLERS = 10
+
+# Raiz do pacote: o chamador é o primeiro frame dentro dela fora da camada de banco
+PACKAGE_ROOT = str(Path(__file__).resolve().parent.parent)
+DATABASE_ROOT = str(Path(__file__).resolve().parent) + os.sep
+WRITE_QUEUE_FILE = str(Path(__file__).resolve().parent / 'write_queue.py')
+
+def fingerprint(sql: str) -> str:
+    """Normalizar uma instrução SQL trocando literais por ? (agrupa execuções da mesma consulta)"""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    # Listas IN (?, ?, ...) de qualquer tamanho são a mesma consulta
+    sql = re.sub(r"\?(?:\s*,\s*\?)+", "?, ...", sql)
+    return ' '.join(sql.split())
+
+# As instruções dos gerenciadores são poucas e fixas (parâmetros vão em ?)
+_cached_fingerprint = lru_cache(maxsize=4096)(fingerprint)
+
+def find_caller() -> str:
+    """arquivo:linha (função) do código do MDM que emitiu a instrução
+
+    Frames de database/ (DatabaseManager, fila de escrita) são pulados: o chamador é o
+    código da aplicação que os usou. Sem nenhum (ex.: operação de escrita do próprio
+    DatabaseManager, na thread escritora, ou script fora do pacote), fica o frame mais
+    externo da camada de banco, o do método chamado.
+    """
+    frame = sys._getframe(1)
+    chamador = None
+    while frame is not None:
+        arquivo = frame.f_code.co_filename
+        if arquivo.startswith(PACKAGE_ROOT):
+            if not arquivo.startswith(DATABASE_ROOT):
+                chamador = frame
+                break
+            if arquivo not in (__file__, WRITE_QUEUE_FILE):
+                chamador = frame
+        frame = frame.f_back
+    if chamador is None:
+        return "?"
+    return f"{chamador.f_code.co_filename[len(PACKAGE_ROOT) + 1:]}:{chamador.f_lineno} ({chamador.f_code.co_name})"
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor que mede cada instrução do execute até esgotar (ou descartar) as linhas"""
+
+    _trace = None   # [sql, duração acumulada, linhas, chamador]
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        inicio = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except BaseException:
+            sql_tracer.record(sql, time.perf_counter() - inicio, 0, find_caller(), erro=True)
+            raise
+        self._trace = [sql, time.perf_counter() - inicio, 0, find_caller()]
+        if self.description is None:
+            # Sem linhas a ler (INSERT/UPDATE/DELETE, pragmas de escrita)
+            self._trace[2] = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        inicio = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        except BaseException:
+            sql_tracer.record(sql, time.perf_counter() - inicio, 0, find_caller(), erro=True)
+            raise
+        sql_tracer.record(sql, time.perf_counter() - inicio, max(self.rowcount, 0), find_caller())
+        return self
+
+    def _read(self, inicio: float, linhas: int, esgotado: bool):
+        if self._trace is not None:
+            self._trace[1] += time.perf_counter() - inicio
+            self._trace[2] += linhas
+            if esgotado:
+                self._finish()
+
+    def _finish(self, adiar: bool = False):
+        if self._trace is not None:
+            trace, self._trace = self._trace, None
+            if adiar:
+                sql_tracer.defer(*trace)
+            else:
+                sql_tracer.record(*trace)
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        row = super().fetchone()
+        self._read(inicio, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        inicio = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._read(inicio, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        rows = super().fetchall()
+        self._read(inicio, len(rows), True)
+        return rows
+
+    def __next__(self):
+        inicio = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._read(inicio, 0, True)
+            raise
+        self._read(inicio, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Ex.: conn.execute(...).fetchone(), que não chega ao fim das linhas. O coletor de
+        # ciclos pode rodar aqui no meio de um record() da mesma thread, com o lock tomado:
+        # a execução só entra na fila, sem lock, e é agregada no próximo record()
+        self._finish(adiar=True)
+
+class _TracedConnection:
+    """Mistura para as classes de conexão: todo cursor (inclusive o de conn.execute) é rastreado"""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    # Os atalhos do sqlite3 criariam um cursor comum, sem passar por cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+class SqlTracer:
+    """Tempo, linhas e chamadores agregados por impressão digital, e o log de instruções lentas
+
+    Ligado, as conexões do DatabaseManager são abertas com connection_class(), cujos
+    cursores medem cada instrução: execute mais as leituras até a última linha. Cada
+    execução entra no histograma da sua impressão digital (a mesma de utils.query_plans);
+    as que passam de limite_lenta segundos vão também para o log (memória e arquivo JSON
+    por linha). Desligar só afeta as conexões abertas depois.
+    """
+
+    def __init__(self, enabled: bool = SQL_TRACE_ENABLED, limite_lenta: float = SLOW_QUERY_THRESHOLD,
+                 arquivo: Optional[str] = SLOW_QUERY_LOG_PATH, tamanho_log: int = SLOW_QUERY_LOG_SIZE,
+                 max_impressoes: int = SQL_TRACE_MAX_FINGERPRINTS):
+        self.enabled = enabled
+        self.limite_lenta = limite_lenta
+        self.arquivo = arquivo
+        self.max_impressoes = max_impressoes
+        self.lentas = deque(maxlen=tamanho_log)
+        self._lock = threading.Lock()
+        self._classes = {}
+        self._agregados = {}
+        # Execuções de cursores finalizados pelo coletor, ainda por agregar (ver defer)
+        self._pendentes = deque()
+
+    def connection_class(self, base: type) -> type:
+        """Classe de conexão para sqlite3.connect(factory=...): base, rastreada se ligado"""
+        if not self.enabled:
+            return base
+        if base not in self._classes:
+            self._classes[base] = type(f"Traced{base.__name__}", (_TracedConnection, base), {})
+        return self._classes[base]
+
+    def record(self, sql: str, duracao: float, linhas: int, chamador: str, erro: bool = False):
+        """Agregar uma execução (e registrá-la como lenta, se for o caso)"""
+        self._drain()
+        self._aggregate(sql, duracao, linhas, chamador, erro)
+
+    def defer(self, sql: str, duracao: float, linhas: int, chamador: str, erro: bool = False):
+        """Guardar uma execução para agregar depois, sem tomar o lock (seguro em __del__)"""
+        self._pendentes.append((sql, duracao, linhas, chamador, erro))
+
+    def _drain(self):
+        while True:
+            try:
+                trace = self._pendentes.popleft()
+            except IndexError:
+                return
+            self._aggregate(*trace)
+
+    def _aggregate(self, sql: str, duracao: float, linhas: int, chamador: str, erro: bool):
+        impressao = _cached_fingerprint(sql)
+        milissegundos = duracao * 1000
+        faixa = next((i for i, limite in enumerate(HISTOGRAM_BUCKETS) if milissegundos <= limite),
+                     len(HISTOGRAM_BUCKETS))
+        with self._lock:
+            agregado = self._agregados.get(impressao)
+            if agregado is None:
+                if len(self._agregados) >= self.max_impressoes:
+                    impressao = "(outras instruções)"
+                agregado = self._agregados.setdefault(impressao, {
+                    'execucoes': 0, 'erros': 0, 'total': 0.0, 'maximo': 0.0, 'linhas': 0,
+                    'histograma': [0] * (len(HISTOGRAM_BUCKETS) + 1), 'chamadores': Counter()
+                })
+            agregado['execucoes'] += 1
+            agregado['erros'] += erro
+            agregado['total'] += duracao
+            agregado['maximo'] = max(agregado['maximo'], duracao)
+            agregado['linhas'] += linhas
+            agregado['histograma'][faixa] += 1
+            if chamador in agregado['chamadores'] or len(agregado['chamadores']) < MAX_CALLERS:
+                agregado['chamadores'][chamador] += 1
+
+        if duracao >= self.limite_lenta:
+            self._log_slow({
+                'quando': datetime.now().isoformat(),
+                'duracao': round(duracao, 4),
+                'linhas': linhas,
+                'chamador': chamador,
+                'impressao': impressao,
+                'sql': sql,
+                'erro': erro
+            })
+
+    def _log_slow(self, entrada: Dict[str, Any]):
+        self.lentas.append(entrada)
+        if self.arquivo:
+            try:
+                Path(self.arquivo).parent.mkdir(parents=True, exist_ok=True)
+                with open(self.arquivo, 'a', encoding='utf-8') as log:
+                    log.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+            except OSError:
+                pass
+
+    def get_stats(self, limit: int = 50, ordem: str = 'total') -> List[Dict[str, Any]]:
+        """Impressões digitais mais custosas (ordem: total, execucoes, maximo, media ou linhas)"""
+        if ordem not in ('total', 'execucoes', 'maximo', 'media', 'linhas'):
+            raise ValueError(f"Ordem inválida: {ordem}")
+        rotulos = [f"<={limite}ms" for limite in HISTOGRAM_BUCKETS] + [f">{HISTOGRAM_BUCKETS[-1]}ms"]
+        self._drain()
+        with self._lock:
+            resultado = [{
+                'impressao': impressao,
+                'execucoes': agregado['execucoes'],
+                'erros': agregado['erros'],
+                'total': round(agregado['total'], 4),
+                'media': round(agregado['total'] / agregado['execucoes'], 6),
+                'maximo': round(agregado['maximo'], 4),
+                'linhas': agregado['linhas'],
+                'histograma': dict(zip(rotulos, agregado['histograma'])),
+                'chamadores': dict(agregado['chamadores'].most_common())
+            } for impressao, agregado in self._agregados.items()]
+        resultado.sort(key=lambda item: item[ordem], reverse=True)
+        return resultado[:limit]
+
+    def get_slow_queries(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Instruções lentas mais recentes primeiro"""
+        self._drain()
+        return list(self.lentas)[::-1][:limit]
+
+    def reset(self):
+        """Zerar os agregados e o log em memória (o arquivo é mantido)"""
+        with self._lock:
+            self._pendentes.clear()
+            self._agregados = {}
+            self.lentas.clear()
+
+# Instância global do rastreamento (usada pelas conexões do DatabaseManager)
+sql_tracer = SqlTracer()
@@ -0,0 +1,121 @@
+"""
+Backends de armazenamento do DatabaseManager: arquivo SQLite ou banco em memória
+"""
+from pathlib import Path
+from typing import Optional
+import hashlib
+import itertools
+import sqlite3
+
+from config import DATABASE_PATH, STORAGE_BACKEND, MEMORY_STORAGE_LOAD
+
+# Numeração dos bancos em memória criados sem nome
+_memory_ids = itertools.count(1)
+
+class StorageBackend:
+    """Onde fica o banco: como abrir conexões de leitura/escrita e somente leitura
+
+    Todo acesso ao banco (DatabaseManager, replicação, backup, manutenção) abre conexões
+    por connect(); kwargs seguem para sqlite3.connect (factory, timeout, isolation_level).
+    """
+
+    nome = None
+    # Caminho do arquivo no disco (None quando o banco não tem arquivo)
+    path: Optional[str] = None
+    # Identifica o banco: backends com a mesma chave abrem o mesmo banco
+    chave: Optional[str] = None
+
+    def connect(self, readonly: bool = False, **kwargs) -> sqlite3.Connection:
+        raise NotImplementedError
+
+    def configure(self, conn: sqlite3.Connection):
+        """Pragmas do banco aplicados na inicialização (init_database)"""
+
+    def wal_bytes(self) -> int:
+        """Tamanho atual do WAL (0 se o banco não usa WAL)"""
+        return 0
+
+    def close(self):
+        """Liberar o que o backend mantém aberto"""
+
+class SQLiteFileBackend(StorageBackend):
+    """Banco em arquivo, em WAL: leitores não bloqueiam o escritor"""
+
+    nome = 'arquivo'
+
+    def __init__(self, path: str = None):
+        self.path = path or DATABASE_PATH
+        self.chave = str(Path(self.path).resolve())
+
+    def connect(self, readonly: bool = False, **kwargs) -> sqlite3.Connection:
+        if readonly:
+            uri = Path(self.path).resolve().as_uri() + "?mode=ro"
+            return sqlite3.connect(uri, uri=True, **kwargs)
+        return sqlite3.connect(self.path, **kwargs)
+
+    def configure(self, conn: sqlite3.Connection):
+        # Só vale para bancos novos: páginas livres devolvidas aos poucos (ver database.maintenance)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL: leitores (inclusive os snapshots de relatório) não bloqueiam o escritor
+        conn.execute("PRAGMA journal_mode=WAL")
+
+    def wal_bytes(self) -> int:
+        wal = Path(self.path + '-wal')
+        return wal.stat().st_size if wal.exists() else 0
+
+class MemoryBackend(StorageBackend):
+    """Banco inteiro na RAM (VFS memdb do SQLite), compartilhado pelas conexões do processo
+
+    Backends com o mesmo nome usam o mesmo banco, que vive enquanto algum deles existir
+    (cada um mantém uma conexão âncora). Com carregar_de, um banco ainda vazio recebe o
+    conteúdo do arquivo (VACUUM INTO); save() faz o caminho inverso. Sem WAL, um
+    snapshot aberto segura os commits do escritor, que esperam até timeout segundos: serve
+    a testes, benchmarks e implantações de leitura. O memdb limita o banco a 1 GiB.
+    """
+
+    nome = 'memoria'
+
+    def __init__(self, nome: str = None, carregar_de: str = None, timeout: float = 30.0):
+        self.uri = f"file:/mdm-{nome or next(_memory_ids)}?vfs=memdb"
+        self.chave = self.uri
+        self.timeout = timeout
+        self.carregado_de = None
+        self._ancora = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        vazio = self._ancora.execute("PRAGMA page_count").fetchone()[0] == 0
+        if carregar_de and vazio and Path(carregar_de).exists():
+            # VACUUM INTO, e não a API de backup: a cópia de um banco em WAL manteria no
+            # cabeçalho o modo WAL, que o memdb não consegue abrir
+            origem = sqlite3.connect(carregar_de)
+            try:
+                origem.execute("VACUUM INTO ?", (self.uri,))
+            finally:
+                origem.close()
+            self.carregado_de = carregar_de
+
+    def connect(self, readonly: bool = False, **kwargs) -> sqlite3.Connection:
+        kwargs.setdefault('timeout', self.timeout)
+        return sqlite3.connect(self.uri + ("&mode=ro" if readonly else ""), uri=True, **kwargs)
+
+    def save(self, destino: str):
+        """Gravar o conteúdo atual da memória em um arquivo SQLite"""
+        Path(destino).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(destino)
+        try:
+            self._ancora.backup(conn)
+        finally:
+            conn.close()
+
+    def close(self):
+        self._ancora.close()
+
+def create_storage(db_path: str = None, backend: str = None) -> StorageBackend:
+    """Backend configurado (STORAGE_BACKEND); em memória, carrega db_path se existir"""
+    backend = backend or STORAGE_BACKEND
+    if backend == SQLiteFileBackend.nome:
+        return SQLiteFileBackend(db_path)
+    if backend == MemoryBackend.nome:
+        # Um banco em memória por caminho: todos os DatabaseManager do processo o compartilham
+        db_path = db_path or DATABASE_PATH
+        nome = hashlib.sha1(str(Path(db_path).resolve()).encode()).hexdigest()[:16]
+        return MemoryBackend(nome, carregar_de=db_path if MEMORY_STORAGE_LOAD else None)
+    raise ValueError(f"Backend de armazenamento inválido: {backend}")
@@ -0,0 +1,92 @@
+"""
+Dicionário de valores das colunas de baixa cardinalidade (códigos inteiros)
+"""
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Optional
+
+class ValueDictionary:
+    """Tradução entre o texto de uma coluna codificada e o seu código inteiro
+
+    Os códigos ficam na tabela dicionario, numerados por campo (o mesmo 'estado' serve a
+    clientes e fornecedores) e nunca mudam de valor. O cache em memória só aprende o que
+    já está confirmado no banco, recarregando a tabela por uma conexão própria: códigos
+    criados dentro de uma transação são lidos na conexão dela, e uma transação desfeita
+    não deixa nada errado para trás. Conexão com escrita em andamento (writing) não
+    recarrega: lê pela própria conexão, pois com o banco em memória (database.storage)
+    outra conexão da mesma thread esperaria por um commit que nunca vem.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection],
+                 writing: Callable[[sqlite3.Connection], bool] = lambda conn: False):
+        self.connect = connect
+        self.writing = writing
+        self._lock = threading.Lock()
+        self._codigos: Dict[str, Dict[Any, int]] = {}   # campo -> valor -> código
+        self._valores: Dict[str, Dict[int, Any]] = {}   # campo -> código -> valor
+        self._carregado = False
+
+    def reload(self):
+        """Recarregar o cache com os códigos confirmados no banco"""
+        codigos, valores = {}, {}
+        with self.connect() as conn:
+            for campo, codigo, valor in conn.execute("SELECT campo, codigo, valor FROM dicionario"):
+                codigos.setdefault(campo, {})[valor] = codigo
+                valores.setdefault(campo, {})[codigo] = valor
+        with self._lock:
+            self._codigos, self._valores = codigos, valores
+            self._carregado = True
+
+    def encode(self, conn: sqlite3.Connection, campo: str, valor: Any) -> Optional[int]:
+        """Código do valor, criado na transação de conn se ainda não existir"""
+        if valor is None:
+            return None
+        if not self._carregado and not self.writing(conn):
+            self.reload()
+        codigo = self._codigos.get(campo, {}).get(valor)
+        if codigo is not None:
+            return codigo
+
+        row = conn.execute("SELECT codigo FROM dicionario WHERE campo = ? AND valor = ?", (campo, valor)).fetchone()
+        if row is None:
+            row = conn.execute("""
+                INSERT INTO dicionario (campo, codigo, valor)
+                SELECT ?, COALESCE(MAX(codigo), 0) + 1, ? FROM dicionario WHERE campo = ?
+                RETURNING codigo
+            """, (campo, valor, campo)).fetchone()
+        return row[0]
+
+    def decode(self, conn: sqlite3.Connection, campo: str, codigo: Optional[int]) -> Any:
+        """Valor de um código (para muitos, usar decoder)"""
+        return self.decoder(conn)(campo, codigo)
+
+    def decoder(self, conn: sqlite3.Connection) -> Callable[[str, Optional[int]], Any]:
+        """Função (campo, código) -> valor para as linhas de uma consulta em conn
+
+        Código fora do cache: recarrega uma vez por consulta (confirmado por outra escrita)
+        e, se ainda faltar, lê em conn (criado na transação corrente, sem ir para o cache).
+        """
+        recarregado = self.writing(conn)
+        if not self._carregado and not recarregado:
+            self.reload()
+        valores = self._valores
+        locais = {}
+
+        def decodificar(campo, codigo):
+            nonlocal valores, recarregado
+            valor = valores.get(campo, {}).get(codigo)
+            if valor is not None or codigo is None:
+                return valor
+            if (campo, codigo) in locais:
+                return locais[(campo, codigo)]
+            if not recarregado:
+                self.reload()
+                valores, recarregado = self._valores, True
+                valor = valores.get(campo, {}).get(codigo)
+                if valor is not None:
+                    return valor
+            row = conn.execute("SELECT valor FROM dicionario WHERE campo = ? AND codigo = ?", (campo, codigo)).fetchone()
+            locais[(campo, codigo)] = valor = row[0] if row else None
+            return valor
+
+        return decodificar
@@ -0,0 +1,125 @@
+"""
+Fila de escrita única para o SQLite
+"""
+import atexit
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Tuple
+
+# Operação de escrita: recebe a conexão de escrita e executa dentro da transação corrente
+WriteOperation = Callable[[sqlite3.Connection], Any]
+
+class WriteQueue:
+    """Thread escritora dona da única conexão de escrita do processo
+
+    As operações enfileiradas são agrupadas em uma só transação (group commit): a thread
+    pega tudo o que já está na fila, até max_batch, e confirma com um único COMMIT. Cada
+    operação roda em um SAVEPOINT próprio, então a falha de uma não desfaz as demais.
+    Os Futures só são resolvidos depois do COMMIT.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], max_batch: int = 64):
+        self.connect = connect
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._conn = None
+        self.stats = {'transacoes': 0, 'operacoes': 0, 'falhas': 0}
+        atexit.register(self.close)
+
+    def submit(self, operacao: WriteOperation) -> Future:
+        """Enfileirar operação de escrita e obter o Future com o seu resultado"""
+        future = Future()
+
+        if threading.current_thread() is self._thread:
+            # Chamada de dentro de outra operação: já estamos na transação da thread escritora
+            try:
+                future.set_result(operacao(self._conn))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mdm-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((operacao, future))
+        return future
+
+    def execute(self, operacao: WriteOperation) -> Any:
+        """Executar operação de escrita e aguardar o resultado"""
+        return self.submit(operacao).result()
+
+    def close(self):
+        """Concluir as operações pendentes e encerrar a thread escritora"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._queue.put(None)
+        thread.join()
+
+    def _run(self):
+        conn = self.connect()
+        # Transações controladas aqui (BEGIN/COMMIT explícitos)
+        conn.isolation_level = None
+        self._conn = conn
+
+        try:
+            encerrar = False
+            while not encerrar:
+                item = self._queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        encerrar = True
+                        break
+                    batch.append(item)
+                self._commit_batch(conn, batch)
+        finally:
+            self._conn = None
+            conn.close()
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch: List[Tuple[WriteOperation, Future]]):
+        """Executar o lote em uma única transação"""
+        concluidas = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for operacao, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT operacao")
+                try:
+                    resultado = operacao(conn)
+                except BaseException as e:
+                    conn.execute("ROLLBACK TO operacao")
+                    conn.execute("RELEASE operacao")
+                    self.stats['falhas'] += 1
+                    future.set_exception(e)
+                else:
+                    conn.execute("RELEASE operacao")
+                    concluidas.append((future, resultado))
+            conn.execute("COMMIT")
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Nada do lote foi confirmado, inclusive as operações que já tinham concluído
+            for _, future in batch:
+                if not future.done():
+                    self.stats['falhas'] += 1
+                    future.set_exception(e)
+            return
+
+        self.stats['transacoes'] += 1
+        self.stats['operacoes'] += len(concluidas)
+        for future, resultado in concluidas:
+            future.set_result(resultado)
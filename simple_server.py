@@ -9,15 +9,29 @@ import urllib.parse
 import os
 from datetime import datetime
 
+from config import REPLICATION_ENABLED, MAINTENANCE_ENABLED, CACHE_SNAPSHOT_ENABLED
+from database.query_budget import query_budgets, QueryBudgetExceeded
+from database.sql_trace import sql_tracer
+
 # Importar os módulos do sistema
 try:
     from database.database_manager import db_manager
     from utils.duplicate_detector import duplicate_detector
+    from utils.delta_sync import delta_sync
+    from utils.audit_manager import audit_manager
+    from database.replication import replicator
+    from database.maintenance import maintenance_scheduler
+    from database.cache_snapshot import cache_snapshot
     print("✅ Módulos MDM carregados com sucesso")
 except Exception as e:
     print(f"❌ Erro ao carregar módulos: {e}")
     db_manager = None
     duplicate_detector = None
+    delta_sync = None
+    audit_manager = None
+    replicator = None
+    maintenance_scheduler = None
+    cache_snapshot = None
 
 class MDMRequestHandler(http.server.SimpleHTTPRequestHandler):
     """Handler customizado para o servidor MDM"""
@@ -37,6 +51,14 @@ class MDMRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.serve_status_api()
         elif path == '/health':
             self.serve_health_check()
+        elif path == '/api/replication':
+            self.serve_replication_api()
+        elif path == '/api/sql':
+            self.serve_sql_api(urllib.parse.parse_qs(parsed_path.query))
+        elif path == '/api/changes':
+            self.serve_changes_api(urllib.parse.parse_qs(parsed_path.query))
+        elif path.startswith('/api/sync/'):
+            self.serve_sync_api(path, urllib.parse.parse_qs(parsed_path.query))
         else:
             self.serve_default_page()
     
@@ -355,7 +377,7 @@ class MDMRequestHandler(http.server.SimpleHTTPRequestHandler):
     def serve_status_api(self):
         """Servir API de status do sistema"""
         try:
-            status_data = {{
+            status_data = {
                 'status': 'running',
                 'timestamp': datetime.now().isoformat(),
                 'version': '1.0.0',
@@ -367,27 +389,141 @@ class MDMRequestHandler(http.server.SimpleHTTPRequestHandler):
                     '/dashboard',
                     '/api/metrics',
                     '/api/status',
+                    '/api/sync/digests',
+                    '/api/sync/hashes',
+                    '/api/sync/registros',
+                    '/api/changes',
+                    '/api/replication',
+                    '/api/sql',
                     '/health'
                 ]
-            }}
+            }
             
             self.send_json_response(status_data)
             
         except Exception as e:
-            self.send_json_response({{
+            self.send_json_response({
                 'status': 'error',
                 'message': str(e),
                 'timestamp': datetime.now().isoformat()
-            }}, status=500)
+            }, status=500)
     
     def serve_health_check(self):
         """Health check endpoint"""
-        self.send_json_response({{
+        manutencao = None
+        if maintenance_scheduler is not None:
+            try:
+                manutencao = {'habilitada': MAINTENANCE_ENABLED, **maintenance_scheduler.get_status()}
+            except Exception as e:
+                manutencao = {'habilitada': MAINTENANCE_ENABLED, 'erro': str(e)}
+        self.send_json_response({
             'status': 'healthy',
             'timestamp': datetime.now().isoformat(),
-            'message': '💚 Sistema MDM funcionando corretamente'
-        }})
+            'message': '💚 Sistema MDM funcionando corretamente',
+            'manutencao': manutencao,
+            'orcamentos_consultas': query_budgets.get_stats()
+        })
     
+    def serve_replication_api(self):
+        """Servir estado e atraso da replicação para o standby"""
+        if replicator is None:
+            self.send_json_response({'status': 'error', 'message': 'Sistema não inicializado corretamente'}, status=503)
+            return
+
+        try:
+            self.send_json_response({
+                'status': 'success',
+                'timestamp': datetime.now().isoformat(),
+                'habilitada': REPLICATION_ENABLED,
+                'replicacao': replicator.get_status()
+            })
+        except Exception as e:
+            self.send_json_response({'status': 'error', 'message': str(e)}, status=500)
+
+    def serve_sql_api(self, params):
+        """Servir instruções SQL agregadas por impressão digital e o log de consultas lentas"""
+        try:
+            limit = int(params.get('limit', ['50'])[0])
+            ordem = params.get('ordem', ['total'])[0]
+            self.send_json_response({
+                'status': 'success',
+                'timestamp': datetime.now().isoformat(),
+                'rastreamento_ativo': sql_tracer.enabled,
+                'limite_lenta': sql_tracer.limite_lenta,
+                'instrucoes': sql_tracer.get_stats(limit, ordem),
+                'lentas': sql_tracer.get_slow_queries(limit)
+            })
+        except ValueError as e:
+            self.send_json_response({'status': 'error', 'message': str(e)}, status=400)
+        except Exception as e:
+            self.send_json_response({'status': 'error', 'message': str(e)}, status=500)
+
+    def serve_changes_api(self, params):
+        """Servir feed de alterações (CDC) a partir de um cursor do audit_log"""
+        if audit_manager is None:
+            self.send_json_response({'status': 'error', 'message': 'Sistema não inicializado corretamente'}, status=503)
+            return
+
+        try:
+            cursor = int(params.get('cursor', ['0'])[0])
+            limit = int(params.get('limit', ['1000'])[0])
+        except ValueError as e:
+            self.send_json_response({'status': 'error', 'message': str(e)}, status=400)
+            return
+
+        try:
+            with query_budgets.budget('interativa'):
+                feed = audit_manager.changes_since(cursor, limit)
+        except QueryBudgetExceeded as e:
+            self.send_json_response({'status': 'error', 'message': str(e)}, status=503)
+            return
+        except Exception as e:
+            self.send_json_response({'status': 'error', 'message': str(e)}, status=500)
+            return
+
+        self.send_json_response({'status': 'success', 'timestamp': datetime.now().isoformat(), **feed})
+
+    def serve_sync_api(self, path, params):
+        """Servir API de sincronização incremental (digests por faixa de ids)"""
+        if delta_sync is None:
+            self.send_json_response({'status': 'error', 'message': 'Sistema não inicializado corretamente'}, status=503)
+            return
+
+        def param(nome, padrao=None):
+            return params[nome][0] if nome in params else padrao
+
+        try:
+            tabela = param('tabela')
+            with query_budgets.budget('interativa'):
+                if path == '/api/sync/digests':
+                    fim = param('fim')
+                    dados = delta_sync.get_range_digests(tabela, int(param('inicio', 0)),
+                                                         int(fim) if fim is not None else None,
+                                                         int(param('partes', 16)))
+                elif path == '/api/sync/hashes':
+                    dados = delta_sync.get_range_hashes(tabela, int(param('inicio')), int(param('fim')))
+                elif path == '/api/sync/registros':
+                    dados = delta_sync.get_records(tabela, [int(i) for i in param('ids', '').split(',') if i])
+                else:
+                    self.send_json_response({'status': 'error', 'message': f'Endpoint desconhecido: {path}'}, status=404)
+                    return
+        except QueryBudgetExceeded as e:
+            self.send_json_response({'status': 'error', 'message': str(e)}, status=503)
+            return
+        except (TypeError, ValueError) as e:
+            self.send_json_response({'status': 'error', 'message': str(e)}, status=400)
+            return
+        except Exception as e:
+            self.send_json_response({'status': 'error', 'message': str(e)}, status=500)
+            return
+
+        self.send_json_response({
+            'status': 'success',
+            'timestamp': datetime.now().isoformat(),
+            'tabela': tabela,
+            'dados': dados
+        })
+
     def serve_default_page(self):
         """Servir página padrão para rotas não encontradas"""
         html_content = '''
@@ -472,6 +608,23 @@ def main():
     else:
         print("⚠️  Alguns módulos não foram carregados, funcionalidade limitada")
     
+    if replicator and REPLICATION_ENABLED:
+        replicator.start()
+        print(f"🔁 Replicação ativa para {replicator.replica_path}")
+    if maintenance_scheduler and MAINTENANCE_ENABLED:
+        maintenance_scheduler.start()
+        print("🧹 Manutenção agendada do banco ativa")
+    if cache_snapshot and CACHE_SNAPSHOT_ENABLED:
+        for modulo in (duplicate_detector, delta_sync, audit_manager):
+            cache_snapshot.register(modulo.db_manager)
+        try:
+            carga = cache_snapshot.load()
+            if carga['carregado']:
+                print(f"♨️  Caches restaurados: {carga['memo_validos']} resultados, "
+                      f"{carga['registros_validos']} registros ({carga['secoes_descartadas']} seções desatualizadas)")
+        except Exception as e:
+            print(f"⚠️  Erro ao carregar snapshot dos caches: {e}")
+    
     print("=" * 50)
     
     try:
@@ -492,6 +645,14 @@ def main():
         print("\\n🛑 Servidor encerrado pelo usuário.")
     except Exception as e:
         print(f"❌ Erro ao iniciar servidor: {e}")
+    finally:
+        if cache_snapshot and CACHE_SNAPSHOT_ENABLED:
+            try:
+                gravacao = cache_snapshot.save()
+                if gravacao['gravado']:
+                    print(f"💾 Snapshot dos caches gravado: {gravacao['memo']} resultados, {gravacao['registros']} registros")
+            except Exception as e:
+                print(f"⚠️  Erro ao gravar snapshot dos caches: {e}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+Atualização de bancos criados antes das migrações do DatabaseManager
+"""
+import sqlite3
+
+from database.database_manager import DatabaseManager, content_hash
+
+# Esquema do banco na versão inicial do sistema (sem colunas normalizadas, hash, dicionário...)
+BASELINE_SCHEMA = """
+CREATE TABLE usuarios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    nome TEXT NOT NULL,
+    email TEXT NOT NULL,
+    perfil TEXT NOT NULL DEFAULT 'visualizador',
+    ativo BOOLEAN NOT NULL DEFAULT 1,
+    data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+    ultimo_login DATETIME
+);
+CREATE TABLE clientes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nome TEXT NOT NULL,
+    cpf_cnpj TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL,
+    telefone TEXT,
+    endereco TEXT,
+    cidade TEXT,
+    estado TEXT,
+    cep TEXT,
+    tipo TEXT NOT NULL CHECK (tipo IN ('pessoa_fisica', 'pessoa_juridica')),
+    ativo BOOLEAN NOT NULL DEFAULT 1,
+    data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+    data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+    criado_por TEXT,
+    atualizado_por TEXT
+);
+CREATE TABLE produtos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nome TEXT NOT NULL,
+    codigo TEXT NOT NULL UNIQUE,
+    descricao TEXT,
+    categoria TEXT NOT NULL,
+    subcategoria TEXT,
+    preco REAL NOT NULL DEFAULT 0.0,
+    unidade_medida TEXT NOT NULL,
+    ativo BOOLEAN NOT NULL DEFAULT 1,
+    data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+    data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+    criado_por TEXT,
+    atualizado_por TEXT
+);
+CREATE TABLE fornecedores (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nome TEXT NOT NULL,
+    cnpj TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL,
+    telefone TEXT,
+    endereco TEXT,
+    cidade TEXT,
+    estado TEXT,
+    cep TEXT,
+    contato_principal TEXT,
+    ativo BOOLEAN NOT NULL DEFAULT 1,
+    data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+    data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+    criado_por TEXT,
+    atualizado_por TEXT
+);
+CREATE TABLE audit_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tabela TEXT NOT NULL,
+    registro_id INTEGER NOT NULL,
+    operacao TEXT NOT NULL CHECK (operacao IN ('INSERT', 'UPDATE', 'DELETE')),
+    dados_anteriores TEXT,
+    dados_novos TEXT,
+    usuario TEXT,
+    data_operacao DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_clientes_cpf_cnpj ON clientes(cpf_cnpj);
+CREATE INDEX idx_clientes_nome ON clientes(nome);
+CREATE INDEX idx_produtos_codigo ON produtos(codigo);
+CREATE INDEX idx_produtos_nome ON produtos(nome);
+CREATE INDEX idx_fornecedores_cnpj ON fornecedores(cnpj);
+CREATE INDEX idx_fornecedores_nome ON fornecedores(nome);
+CREATE INDEX idx_audit_tabela ON audit_log(tabela);
+
+INSERT INTO clientes (nome, cpf_cnpj, email, cidade, estado, tipo)
+VALUES ('Maria Silva', '123.456.789-09', 'maria@exemplo.com', 'Campinas', 'SP', 'pessoa_fisica');
+INSERT INTO produtos (nome, codigo, categoria, preco, unidade_medida)
+VALUES ('Parafuso', 'PAR-01', 'Ferragens', 0.5, 'UN');
+INSERT INTO fornecedores (nome, cnpj, email, estado)
+VALUES ('Ferragens Ltda', '11.222.333/0001-81', 'contato@ferragens.com', 'RJ');
+"""
+
+def create_baseline_database(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.close()
+
+def test_upgrade_baseline_database(tmp_path):
+    path = str(tmp_path / "mdm_inicial.db")
+    create_baseline_database(path)
+
+    manager = DatabaseManager(path)
+
+    cliente = manager.get_cliente(1)
+    assert cliente.nome == 'Maria Silva'
+    assert cliente.estado == 'SP'
+    assert cliente.tipo == 'pessoa_fisica'
+    assert manager.get_cliente_by_documento('12345678909').id == 1
+    assert manager.get_produto(1).categoria == 'Ferragens'
+    assert manager.get_fornecedor(1).estado == 'RJ'
+
+    # Hashes calculados sobre o texto, iguais aos de uma gravação feita já no esquema novo
+    with manager.get_connection() as conn:
+        for tabela, registro in (('clientes', cliente), ('produtos', manager.get_produto(1))):
+            armazenado = conn.execute(f"SELECT hash_conteudo FROM {tabela} WHERE id = 1").fetchone()[0]
+            assert armazenado == content_hash(tabela, registro)
+        tipos = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(clientes)")}
+    assert tipos['estado'] == 'INTEGER'
+
+    # Reabrir o banco já atualizado não repete as migrações
+    assert DatabaseManager(path).get_cliente(1).nome == 'Maria Silva'
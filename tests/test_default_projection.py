@@ -0,0 +1,40 @@
+"""
+Colunas de exportações e buscas sem fields: as mesmas do esquema inicial
+"""
+import sqlite3
+
+from database.database_manager import DatabaseManager
+from utils.import_export import ImportExportManager
+from utils.search_engine import SearchEngine
+from test_database_migrations import create_baseline_database
+
+TABLES = ('clientes', 'produtos', 'fornecedores')
+
+def baseline_columns(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {tabela: [row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")] for tabela in TABLES}
+    finally:
+        conn.close()
+
+def test_export_and_search_columns_match_baseline(tmp_path):
+    path = str(tmp_path / "mdm_inicial.db")
+    create_baseline_database(path)
+    esperadas = baseline_columns(path)
+
+    manager = DatabaseManager(path)
+    import_export = ImportExportManager(manager)
+    search_engine = SearchEngine(manager)
+    buscas = {
+        'clientes': search_engine.search_clientes,
+        'produtos': search_engine.search_produtos,
+        'fornecedores': search_engine.search_fornecedores
+    }
+
+    for tabela in TABLES:
+        cabecalho = import_export.export_to_csv(tabela).decode('utf-8').splitlines()[0]
+        assert cabecalho.split(',') == esperadas[tabela]
+
+        resultados = buscas[tabela]({})
+        assert len(resultados) == 1
+        assert set(resultados[0]) == set(esperadas[tabela])
@@ -0,0 +1,152 @@
+"""
+Arquivamento de registros inativos (separação quente/fria)
+"""
+from typing import List, Dict, Any
+import argparse
+import sqlite3
+import sys
+
+from database.database_manager import DatabaseManager, ARCHIVED_TABLES
+from config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+
+class ArchiveManager:
+    """Move registros inativos antigos para {tabela}_arquivo e os restaura quando preciso
+
+    O registro arquivado mantém o id, então o histórico do audit_log continua valendo.
+    Cada lote é uma transação própria na fila de escrita, intercalada com as demais
+    escritas. Arquivamento e restauração ficam registrados na auditoria (DELETE e
+    INSERT), o que também os leva ao feed de alterações e à replicação.
+    """
+
+    def __init__(self, db_manager: DatabaseManager = None):
+        self.db_manager = db_manager or DatabaseManager()
+
+    def _check_table(self, tabela: str):
+        if tabela not in ARCHIVED_TABLES:
+            raise ValueError(f"Tabela sem arquivamento: {tabela}")
+
+    def archive_inactive(self, dias: int = ARCHIVE_AFTER_DAYS, lote: int = ARCHIVE_BATCH_SIZE,
+                         usuario: str = None, tabelas: List[str] = None) -> Dict[str, int]:
+        """Arquivar os registros inativos sem alteração há mais de dias dias; retorna o total por tabela"""
+        totais = {}
+        for tabela in tabelas or ARCHIVED_TABLES:
+            self._check_table(tabela)
+            totais[tabela] = 0
+            while True:
+                ids = self.db_manager.execute_write(
+                    lambda conn: self._archive_batch(conn, tabela, dias, lote, usuario)
+                )
+                if not ids:
+                    break
+                self.db_manager.cache.invalidate(tabela, ids)
+                totais[tabela] += len(ids)
+        return totais
+
+    def _archive_batch(self, conn: sqlite3.Connection, tabela: str, dias: int, lote: int,
+                       usuario: str = None) -> List[int]:
+        """Mover um lote de inativos para o arquivo, dentro da transação da fila"""
+        ids = [row[0] for row in conn.execute(f"""
+            SELECT id FROM {tabela}
+            WHERE ativo = 0 AND data_atualizacao < datetime('now', ?)
+            LIMIT ?
+        """, (f"-{int(dias)} days", lote))]
+        if not ids:
+            return []
+
+        colunas = ', '.join(self.db_manager.get_table_columns(conn, tabela))
+        placeholders = ', '.join('?' * len(ids))
+        conn.execute(f"""
+            INSERT INTO {tabela}_arquivo ({colunas}, arquivado_em, arquivado_por)
+            SELECT {colunas}, CURRENT_TIMESTAMP, ? FROM {tabela} WHERE id IN ({placeholders})
+        """, [usuario] + ids)
+        conn.execute(f"DELETE FROM {tabela} WHERE id IN ({placeholders})", ids)
+
+        for registro_id in ids:
+            self.db_manager.log_audit(tabela, registro_id, "DELETE", {'ativo': False},
+                                      {'arquivado': True}, usuario, conn=conn)
+        return ids
+
+    def restore_archived(self, tabela: str, ids: List[int], usuario: str = None) -> Dict[str, Any]:
+        """Devolver registros arquivados à tabela quente (continuam inativos)
+
+        Um registro cuja chave natural já voltou a ser usada não é restaurado: fica em
+        'erros' com a exceção, sem impedir os demais.
+        """
+        self._check_table(tabela)
+
+        def operacao(conn):
+            colunas = ', '.join(self.db_manager.get_table_columns(conn, tabela))
+            restaurados, erros = [], []
+            for registro_id in ids:
+                conn.execute("SAVEPOINT restauracao")
+                try:
+                    cursor = conn.execute(f"""
+                        INSERT INTO {tabela} ({colunas})
+                        SELECT {colunas} FROM {tabela}_arquivo WHERE id = ?
+                    """, (registro_id,))
+                    if cursor.rowcount == 0:
+                        raise ValueError(f"Registro {registro_id} não está arquivado em {tabela}")
+                    conn.execute(f"DELETE FROM {tabela}_arquivo WHERE id = ?", (registro_id,))
+                    self.db_manager.log_audit(tabela, registro_id, "INSERT", {'arquivado': True},
+                                              {'arquivado': False}, usuario, conn=conn)
+                except (sqlite3.Error, ValueError) as e:
+                    conn.execute("ROLLBACK TO restauracao")
+                    conn.execute("RELEASE restauracao")
+                    erros.append((registro_id, e))
+                    continue
+                conn.execute("RELEASE restauracao")
+                restaurados.append(registro_id)
+            return {'restaurados': restaurados, 'erros': erros}
+
+        resultado = self.db_manager.execute_write(operacao)
+        self.db_manager.cache.invalidate(tabela, resultado['restaurados'])
+        return resultado
+
+    def get_archived(self, tabela: str, registro_id: int) -> Dict[str, Any]:
+        """Obter registro arquivado por ID (None se não estiver arquivado)"""
+        self._check_table(tabela)
+        with self.db_manager.get_connection() as conn:
+            row = conn.execute(f"""
+                SELECT {self.db_manager.decoded_projection(f'{tabela}_arquivo')} FROM {tabela}_arquivo WHERE id = ?
+            """, (registro_id,)).fetchone()
+            return dict(row) if row else None
+
+    def list_archived(self, tabela: str, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """Listar registros arquivados, mais recentes primeiro"""
+        self._check_table(tabela)
+        with self.db_manager.get_snapshot_connection() as conn:
+            rows = conn.execute(f"""
+                SELECT {self.db_manager.decoded_projection(f'{tabela}_arquivo')} FROM {tabela}_arquivo
+                ORDER BY id DESC LIMIT ? OFFSET ?
+            """, (limit, offset)).fetchall()
+            return [dict(row) for row in rows]
+
+    def get_archive_stats(self) -> Dict[str, Dict[str, int]]:
+        """Linhas quentes e arquivadas por tabela"""
+        with self.db_manager.get_snapshot_connection() as conn:
+            return {
+                tabela: {
+                    'quentes': conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0],
+                    'arquivados': conn.execute(f"SELECT COUNT(*) FROM {tabela}_arquivo").fetchone()[0]
+                }
+                for tabela in ARCHIVED_TABLES
+            }
+
+# Instância global do arquivamento
+archive_manager = ArchiveManager()
+
+def main() -> int:
+    """Rodar o arquivamento pela linha de comando (ex.: agendado no cron)"""
+    parser = argparse.ArgumentParser(description="Arquivamento de registros inativos do MDM")
+    parser.add_argument('--dias', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="arquivar inativos sem alteração há mais de N dias")
+    parser.add_argument('--lote', type=int, default=ARCHIVE_BATCH_SIZE, help="registros por transação")
+    args = parser.parse_args()
+
+    totais = archive_manager.archive_inactive(args.dias, args.lote, usuario='arquivamento')
+    for tabela, total in totais.items():
+        print(f"📦 {tabela}: {total} registros arquivados")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Fachada assíncrona (asyncio) para o banco de dados do MDM
+"""
+import asyncio
+import functools
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from database.database_manager import DatabaseManager, db_manager, track_connections
+from utils.search_engine import SearchEngine
+from utils.audit_manager import AuditManager
+
+class _Job:
+    """Chamada em execução no pool; permite interromper as consultas correntes ao cancelar"""
+    __slots__ = ('lock', 'conns', 'cancelled')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conns = set()
+        self.cancelled = False
+
+    def attach(self, conn: sqlite3.Connection):
+        """Registrar uma conexão obtida pela chamada (ver track_connections)"""
+        with self.lock:
+            if self.cancelled:
+                # Cancelada enquanto rodava: não começa consulta nova
+                raise sqlite3.OperationalError("interrupted")
+            self.conns.add(conn)
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            for conn in self.conns:
+                try:
+                    # Thread-safe: a instrução em andamento falha com OperationalError('interrupted')
+                    conn.interrupt()
+                except sqlite3.ProgrammingError:
+                    # Snapshot já encerrado
+                    pass
+
+class AsyncProxy:
+    """Expõe os métodos públicos de um gerenciador síncrono como corrotinas
+
+    Cada método aceita ainda timeout= (segundos) além dos próprios argumentos.
+    """
+
+    def __init__(self, database: 'AsyncDatabase', target: Any):
+        self._database = database
+        self._target = target
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, timeout: Optional[float] = None, **kwargs):
+            return await self._database.run(attr, *args, timeout=timeout, **kwargs)
+
+        # Guardar no proxy para as próximas chamadas não passarem por __getattr__
+        setattr(self, name, method)
+        return method
+
+class AsyncDatabase(AsyncProxy):
+    """API assíncrona espelhando DatabaseManager (direto), SearchEngine (.search) e AuditManager (.audit)
+
+    As chamadas rodam em um pool limitado de threads, cada uma com sua conexão fixa. Ao
+    cancelar ou estourar o timeout, as consultas em andamento são interrompidas em todas
+    as conexões que a chamada obteve (a da thread e as de snapshot). Escritas seguem pela
+    fila de escrita do DatabaseManager: cancelar a espera não desfaz uma escrita que já
+    entrou na fila.
+    """
+
+    def __init__(self, db_manager: DatabaseManager = None, max_workers: int = 4,
+                 timeout: Optional[float] = 30.0):
+        self.db_manager = db_manager or DatabaseManager()
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="mdm-async",
+            initializer=self.db_manager.bind_thread_connection
+        )
+        super().__init__(self, self.db_manager)
+        self.search = AsyncProxy(self, SearchEngine(self.db_manager))
+        self.audit = AsyncProxy(self, AuditManager(self.db_manager))
+
+    async def run(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Executar func no pool, com cancelamento e timeout (padrão: self.timeout)"""
+        job = _Job()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, self._call, job, func, args, kwargs)
+        try:
+            return await asyncio.wait_for(future, timeout if timeout is not None else self.timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            job.cancel()
+            raise
+
+    def _call(self, job: _Job, func: Callable, args: tuple, kwargs: dict) -> Any:
+        # Toda conexão que a chamada obtiver (a fixa da thread, snapshots de relatórios e
+        # exportações) fica registrada no job e é interrompida junto ao cancelar
+        with track_connections(job.attach):
+            try:
+                self.db_manager.get_connection()
+            except sqlite3.OperationalError:
+                # Cancelada antes de começar
+                return None
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with job.lock:
+                    job.conns.clear()
+
+    def close(self):
+        """Encerrar o pool de threads"""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def __aenter__(self) -> 'AsyncDatabase':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+# Instância global da fachada assíncrona
+async_database = AsyncDatabase(db_manager)
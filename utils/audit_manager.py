@@ -6,13 +6,17 @@ from datetime import datetime, timedelta
 import json
 
 from database.database_manager import DatabaseManager
+from database.query_budget import query_budgets
 from database.models import AuditLog
 
+# Maior lote devolvido por changes_since
+MAX_CHANGES_BATCH = 10000
+
 class AuditManager:
     """Gerenciador de auditoria e versionamento"""
     
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager: DatabaseManager = None):
+        self.db_manager = db_manager or DatabaseManager()
     
     def get_audit_history(self, tabela: str = None, registro_id: int = None, 
                          usuario: str = None, dias: int = 30, limit: int = 100) -> List[Dict[str, Any]]:
@@ -125,7 +129,7 @@ class AuditManager:
         """Obter resumo de atividades dos últimos dias"""
         data_limite = datetime.now() - timedelta(days=dias)
         
-        with self.db_manager.get_connection() as conn:
+        with self.db_manager.get_snapshot_connection() as conn:
             # Atividades por dia
             atividades_dia = conn.execute("""
                 SELECT DATE(data_operacao) as dia, COUNT(*) as total
@@ -183,17 +187,61 @@ class AuditManager:
         """Limpar logs antigos (manter apenas dos últimos X dias)"""
         data_limite = datetime.now() - timedelta(days=dias_manter)
         
-        with self.db_manager.get_connection() as conn:
+        def operacao(conn):
             cursor = conn.execute("""
                 DELETE FROM audit_log 
                 WHERE data_operacao < ?
             """, (data_limite.isoformat(),))
             
-            deleted_count = cursor.rowcount
-            conn.commit()
-            
-            return deleted_count
+            return cursor.rowcount
+
+        return self.db_manager.execute_write(operacao)
     
+    def changes_since(self, cursor: int = 0, limit: int = 1000) -> Dict[str, Any]:
+        """Alterações confirmadas depois do cursor, em ordem de commit (CDC)
+
+        O cursor é o id do audit_log: crescente na ordem dos commits, pois toda escrita
+        passa pela fila de escrita única, e nunca reaproveitado (AUTOINCREMENT). Passe o
+        'cursor' devolvido na chamada seguinte. 'lacuna' indica que clean_old_logs já
+        removeu alterações posteriores ao cursor informado.
+        """
+        limit = max(1, min(limit, MAX_CHANGES_BATCH))
+        with self.db_manager.get_snapshot_connection(replica=False) as conn:
+            primeiro = conn.execute("SELECT MIN(id) FROM audit_log").fetchone()[0]
+            if primeiro is None:
+                sequencia = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'audit_log'").fetchone()
+                primeiro = (sequencia[0] if sequencia else 0) + 1
+            rows = conn.execute("""
+                SELECT id, tabela, registro_id, operacao, dados_anteriores, dados_novos, usuario, data_operacao
+                FROM audit_log
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (cursor, limit + 1)).fetchall()
+
+        mais = len(rows) > limit
+        rows = rows[:limit]
+        # Um só json.loads para o lote: [anteriores, novos, anteriores, novos, ...]
+        dados = json.loads('[' + ','.join(row[coluna] or 'null' for row in rows for coluna in (4, 5)) + ']')
+
+        mudancas = [{
+            'cursor': row[0],
+            'tabela': row[1],
+            'registro_id': row[2],
+            'operacao': row[3],
+            'dados_anteriores': dados[2 * i],
+            'dados_novos': dados[2 * i + 1],
+            'usuario': row[6],
+            'data_operacao': row[7]
+        } for i, row in enumerate(rows)]
+
+        return {
+            'mudancas': mudancas,
+            'cursor': rows[-1][0] if rows else cursor,
+            'mais': mais,
+            'lacuna': cursor < primeiro - 1
+        }
+
     def export_audit_log(self, filtros: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """Exportar log de auditoria para relatórios"""
         if not filtros:
@@ -236,7 +284,7 @@ class AuditManager:
         """Gerar relatório de compliance"""
         data_inicio = datetime.now() - timedelta(days=periodo_dias)
         
-        with self.db_manager.get_connection() as conn:
+        with query_budgets.budget('lote'), self.db_manager.get_snapshot_connection() as conn:
             # Total de operações
             total_operacoes = conn.execute("""
                 SELECT COUNT(*) FROM audit_log WHERE data_operacao >= ?
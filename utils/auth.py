@@ -27,44 +27,30 @@ class AuthManager:
     def authenticate(self, username: str, password: str) -> Optional[Usuario]:
         """Autenticar usuário"""
         with self.db_manager.get_connection() as conn:
-            cursor = conn.execute("""
-                SELECT * FROM usuarios 
-                WHERE username = ? AND ativo = 1
-            """, (username,))
-            row = cursor.fetchone()
+            user = self.db_manager.query_records(
+                conn, "usuarios", "WHERE username = ? AND ativo = 1", (username,)
+            ).fetchone()
             
-            if row and self.verify_password(password, row['password_hash']):
+            if user and self.verify_password(password, user.password_hash):
                 # Atualizar último login
-                conn.execute("""
+                self.db_manager.execute_write(lambda conn: conn.execute("""
                     UPDATE usuarios 
                     SET ultimo_login = CURRENT_TIMESTAMP 
                     WHERE id = ?
-                """, (row['id'],))
-                conn.commit()
+                """, (user.id,)))
                 
-                return Usuario(
-                    id=row['id'],
-                    username=row['username'],
-                    password_hash=row['password_hash'],
-                    nome=row['nome'],
-                    email=row['email'],
-                    perfil=row['perfil'],
-                    ativo=bool(row['ativo']),
-                    data_criacao=datetime.fromisoformat(row['data_criacao']) if row['data_criacao'] else None,
-                    ultimo_login=datetime.now()
-                )
+                user.ultimo_login = datetime.now()
+                return user
         return None
     
     def create_user(self, username: str, password: str, nome: str, email: str, perfil: str = 'visualizador') -> bool:
         """Criar novo usuário"""
         try:
             password_hash = self.hash_password(password)
-            with self.db_manager.get_connection() as conn:
-                conn.execute("""
-                    INSERT INTO usuarios (username, password_hash, nome, email, perfil)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (username, password_hash, nome, email, perfil))
-                conn.commit()
+            self.db_manager.execute_write(lambda conn: conn.execute("""
+                INSERT INTO usuarios (username, password_hash, nome, email, perfil)
+                VALUES (?, ?, ?, ?, ?)
+            """, (username, password_hash, nome, email, perfil)))
             return True
         except sqlite3.IntegrityError:
             return False  # Username já existe
@@ -0,0 +1,148 @@
+"""
+Backup online do banco via API de backup do SQLite
+"""
+from typing import Dict, Any, Optional, Callable
+from datetime import datetime
+from pathlib import Path
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import time
+
+from database.database_manager import DatabaseManager
+from config import BACKUP_DIR, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP, BACKUP_MAX_RESTARTS
+
+# Bloco de leitura/escrita da compactação
+GZIP_CHUNK_SIZE = 1024 * 1024
+
+class _BackupRestarted(Exception):
+    """Cópia recomeçada pelo SQLite porque o banco foi alterado por outra conexão"""
+
+class BackupManager:
+    """Cópias consistentes do banco em uso, sem travar leitores e escritores
+
+    A cópia avança paginas páginas por passo, dormindo pausa segundos entre os passos
+    para limitar o I/O. Cada passo só lê o banco (em WAL, escritas continuam). Se outra
+    conexão alterar o banco no meio, o SQLite recomeça a cópia; depois de max_reinicios
+    recomeços, a cópia é concluída em um único passo, sob um só snapshot de leitura.
+    """
+
+    def __init__(self, db_manager: DatabaseManager = None):
+        self.db_manager = db_manager or DatabaseManager()
+
+    def create_backup(self, destino: str = None, compactar: bool = False,
+                      paginas: int = BACKUP_PAGES_PER_STEP, pausa: float = BACKUP_STEP_SLEEP,
+                      max_reinicios: int = BACKUP_MAX_RESTARTS,
+                      progresso: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Copiar o banco para destino (padrão: BACKUP_DIR com data e hora), opcionalmente em gzip"""
+        inicio = time.monotonic()
+        if destino is None:
+            nome = f"mdm_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+            destino = str(Path(BACKUP_DIR) / (nome + ('.gz' if compactar else '')))
+        Path(destino).parent.mkdir(parents=True, exist_ok=True)
+
+        # Grava ao lado do destino e só renomeia no fim: nunca deixa um backup pela metade
+        copia = destino[:-3] if compactar and destino.endswith('.gz') else destino
+        copia_parcial = copia + '.parcial'
+        estado = {'reinicios': 0, 'restantes': None}
+
+        def passo(status, restantes, total):
+            if estado['restantes'] is not None and restantes > estado['restantes']:
+                estado['reinicios'] += 1
+                if estado['reinicios'] > max_reinicios:
+                    raise _BackupRestarted()
+            estado['restantes'] = restantes
+            if progresso:
+                progresso({'etapa': 'copia', 'paginas_copiadas': total - restantes, 'paginas_total': total,
+                           'percentual': round(100.0 * (total - restantes) / total, 1) if total else 100.0})
+            if restantes:
+                time.sleep(pausa)
+
+        origem = self.db_manager.storage.connect()
+        destino_conn = sqlite3.connect(copia_parcial)
+        try:
+            try:
+                origem.backup(destino_conn, pages=paginas, progress=passo)
+            except _BackupRestarted:
+                # Banco muito movimentado: um passo só, que em WAL não bloqueia os escritores
+                origem.backup(destino_conn)
+            # Arquivo autocontido, sem depender de -wal/-shm
+            destino_conn.execute("PRAGMA journal_mode=DELETE")
+            integridade = destino_conn.execute("PRAGMA quick_check").fetchone()[0]
+            total_paginas = destino_conn.execute("PRAGMA page_count").fetchone()[0]
+        except BaseException:
+            destino_conn.close()
+            Path(copia_parcial).unlink(missing_ok=True)
+            raise
+        finally:
+            origem.close()
+        destino_conn.close()
+
+        if compactar:
+            self._compress(copia_parcial, destino, pausa, progresso)
+            Path(copia_parcial).unlink()
+        else:
+            os.replace(copia_parcial, destino)
+
+        return {
+            'arquivo': destino,
+            'bytes': Path(destino).stat().st_size,
+            'paginas': total_paginas,
+            'compactado': compactar,
+            'reinicios': estado['reinicios'],
+            'integridade': integridade,
+            'duracao': round(time.monotonic() - inicio, 3)
+        }
+
+    def _compress(self, origem: str, destino: str, pausa: float,
+                  progresso: Optional[Callable[[Dict[str, Any]], None]]):
+        """Compactar a cópia em gzip, em blocos e com a mesma pausa entre eles"""
+        total = Path(origem).stat().st_size
+        parcial = destino + '.parcial'
+        with open(origem, 'rb') as entrada, gzip.open(parcial, 'wb') as saida:
+            lidos = 0
+            while True:
+                bloco = entrada.read(GZIP_CHUNK_SIZE)
+                if not bloco:
+                    break
+                saida.write(bloco)
+                lidos += len(bloco)
+                if progresso:
+                    progresso({'etapa': 'compactacao', 'bytes_lidos': lidos, 'bytes_total': total,
+                               'percentual': round(100.0 * lidos / total, 1) if total else 100.0})
+                time.sleep(pausa)
+        os.replace(parcial, destino)
+
+    def restore_backup(self, arquivo: str, destino: str):
+        """Descompactar (se .gz) um backup para destino, para inspeção ou restauração manual"""
+        if arquivo.endswith('.gz'):
+            with gzip.open(arquivo, 'rb') as entrada, open(destino, 'wb') as saida:
+                shutil.copyfileobj(entrada, saida, GZIP_CHUNK_SIZE)
+        else:
+            shutil.copyfile(arquivo, destino)
+
+# Instância global do gerenciador de backups
+backup_manager = BackupManager()
+
+def main() -> int:
+    """Gerar um backup online pela linha de comando"""
+    parser = argparse.ArgumentParser(description="Backup online do banco do MDM")
+    parser.add_argument('--destino', help="arquivo de saída (padrão: diretório de backups com data e hora)")
+    parser.add_argument('--gzip', action='store_true', help="compactar o backup")
+    parser.add_argument('--paginas', type=int, default=BACKUP_PAGES_PER_STEP, help="páginas copiadas por passo")
+    parser.add_argument('--pausa', type=float, default=BACKUP_STEP_SLEEP, help="segundos de pausa entre passos")
+    args = parser.parse_args()
+
+    def progresso(info):
+        print(f"\r{info['etapa']}: {info['percentual']:5.1f}%", end='', flush=True)
+
+    resultado = backup_manager.create_backup(args.destino, args.gzip, args.paginas, args.pausa, progresso=progresso)
+    print(f"\n✅ {resultado['arquivo']} ({resultado['bytes']} bytes, {resultado['duracao']}s, "
+          f"integridade: {resultado['integridade']})")
+    return 0 if resultado['integridade'] == 'ok' else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Sincronização incremental por digests de faixas de ids (árvore de Merkle)
+
+Cada tabela é dividida em faixas de DIGEST_BUCKET_SIZE ids. O digest de uma faixa
+cobre os pares (id, hash_conteudo) das suas linhas; o de um nó, os digests das faixas
+que ele abrange. O consumidor calcula os mesmos digests sobre a sua cópia (local_leaves
+e build_nodes), desce só pelos nós diferentes e busca apenas as linhas alteradas.
+"""
+import hashlib
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from database.database_manager import DatabaseManager, DIGEST_TABLES, DIGEST_BUCKET_SIZE, leaf_digest
+
+# Folha da árvore: (faixa, linhas, digest)
+Leaf = Tuple[int, int, str]
+
+def node_digest(folhas: Iterable[Leaf]) -> str:
+    """Digest de um nó a partir das folhas não vazias que ele cobre, em ordem de faixa"""
+    digest = hashlib.blake2b(digest_size=16)
+    for faixa, linhas, digest_folha in folhas:
+        digest.update(f"{faixa}:{linhas}:{digest_folha}\n".encode())
+    return digest.hexdigest()
+
+def local_leaves(hashes: Dict[int, Optional[str]]) -> List[Leaf]:
+    """Folhas de uma cópia local {id: hash_conteudo}, para o lado consumidor"""
+    faixas = {}
+    for registro_id in sorted(hashes):
+        faixas.setdefault(registro_id // DIGEST_BUCKET_SIZE, []).append((registro_id, hashes[registro_id]))
+    return [(faixa, len(pares), leaf_digest(pares)) for faixa, pares in faixas.items()]
+
+def build_nodes(folhas: List[Leaf], inicio: int, fim: int, partes: int = 16) -> List[Dict[str, Any]]:
+    """Dividir os ids [inicio, fim] (alinhados às faixas) em até partes nós contíguos"""
+    primeira, ultima = inicio // DIGEST_BUCKET_SIZE, fim // DIGEST_BUCKET_SIZE
+    total = ultima - primeira + 1
+    if total <= 0:
+        return []
+    partes = max(1, min(partes, total))
+    folhas = sorted(folha for folha in folhas if primeira <= folha[0] <= ultima)
+
+    nos = []
+    posicao = 0
+    for parte in range(partes):
+        faixa_final = primeira + total * (parte + 1) // partes - 1
+        grupo = []
+        while posicao < len(folhas) and folhas[posicao][0] <= faixa_final:
+            grupo.append(folhas[posicao])
+            posicao += 1
+        faixa_inicial = primeira + total * parte // partes
+        nos.append({
+            'inicio': faixa_inicial * DIGEST_BUCKET_SIZE,
+            'fim': (faixa_final + 1) * DIGEST_BUCKET_SIZE - 1,
+            'linhas': sum(folha[1] for folha in grupo),
+            'digest': node_digest(grupo)
+        })
+    return nos
+
+class DeltaSync:
+    """API de sincronização incremental para sistemas consumidores"""
+
+    def __init__(self, db_manager: DatabaseManager = None):
+        self.db_manager = db_manager or DatabaseManager()
+
+    def _check_table(self, tabela: str):
+        if tabela not in DIGEST_TABLES:
+            raise ValueError(f"Tabela sem sincronização incremental: {tabela}")
+
+    def refresh_digests(self, tabela: str) -> int:
+        """Recalcular os digests das faixas alteradas (escrita: a manutenção agendada faz isso)"""
+        self._check_table(tabela)
+        return self.db_manager.refresh_range_digests([tabela])
+
+    def get_max_id(self, tabela: str) -> int:
+        """Maior id da tabela (0 se vazia)"""
+        self._check_table(tabela)
+        with self.db_manager.get_connection() as conn:
+            return conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabela}").fetchone()[0]
+
+    def get_range_digests(self, tabela: str, inicio: int = 0, fim: int = None,
+                          partes: int = 16) -> List[Dict[str, Any]]:
+        """Digests de até partes nós cobrindo os ids [inicio, fim] (fim padrão: maior id)
+
+        Só lê os digests gravados: as faixas alteradas desde a última atualização (ver
+        DatabaseManager.refresh_range_digests) marcam o nó como 'desatualizado', e o
+        consumidor deve descer por ele mesmo com digests iguais. Nós com uma única faixa
+        (fim - inicio + 1 == DIGEST_BUCKET_SIZE) são folhas: a comparação continua com
+        get_range_hashes, que lê as linhas atuais.
+        """
+        self._check_table(tabela)
+        if fim is None:
+            fim = self.get_max_id(tabela)
+        faixas = (tabela, inicio // DIGEST_BUCKET_SIZE, fim // DIGEST_BUCKET_SIZE)
+        with self.db_manager.get_connection() as conn:
+            folhas = conn.execute("""
+                SELECT faixa, linhas, digest FROM digestos_faixas
+                WHERE tabela = ? AND faixa BETWEEN ? AND ?
+                ORDER BY faixa
+            """, faixas).fetchall()
+            pendentes = [row[0] for row in conn.execute(
+                "SELECT faixa FROM faixas_pendentes WHERE tabela = ? AND faixa BETWEEN ? AND ?", faixas
+            )]
+
+        nos = build_nodes([tuple(folha) for folha in folhas], inicio, fim, partes)
+        for no in nos:
+            no['desatualizado'] = any(no['inicio'] <= faixa * DIGEST_BUCKET_SIZE <= no['fim'] for faixa in pendentes)
+        return nos
+
+    def get_range_hashes(self, tabela: str, inicio: int, fim: int) -> Dict[int, Optional[str]]:
+        """Hash de conteúdo de cada linha com id em [inicio, fim]"""
+        self._check_table(tabela)
+        with self.db_manager.get_connection() as conn:
+            return dict(conn.execute(
+                f"SELECT id, hash_conteudo FROM {tabela} WHERE id BETWEEN ? AND ? ORDER BY id", (inicio, fim)
+            ).fetchall())
+
+    def get_records(self, tabela: str, ids: List[int]) -> List[Dict[str, Any]]:
+        """Linhas completas (to_dict) dos ids indicados, para buscar só o que mudou"""
+        self._check_table(tabela)
+        registros = self.db_manager.get_many(tabela, ids)
+        return [registros[registro_id].to_dict() for registro_id in ids if registro_id in registros]
+
+    def diff(self, tabela: str, locais: Dict[int, Optional[str]], partes: int = 16) -> Dict[str, List[int]]:
+        """Comparar uma cópia local {id: hash_conteudo} com o banco, descendo só pelos nós diferentes
+
+        Implementação de referência do lado consumidor. Retorna os ids a buscar
+        ('alterados', inclusive novos) e os que só existem na cópia ('removidos').
+        """
+        folhas_locais = local_leaves(locais)
+        fim = max([self.get_max_id(tabela)] + list(locais))
+        alterados, removidos = [], []
+
+        pendentes = [(0, fim)]
+        while pendentes:
+            inicio, fim = pendentes.pop()
+            remotos = self.get_range_digests(tabela, inicio, fim, partes)
+            for remoto, local in zip(remotos, build_nodes(folhas_locais, inicio, fim, partes)):
+                if remoto['digest'] == local['digest'] and not remoto['desatualizado']:
+                    continue
+                if remoto['fim'] - remoto['inicio'] + 1 > DIGEST_BUCKET_SIZE:
+                    pendentes.append((remoto['inicio'], remoto['fim']))
+                    continue
+
+                hashes = self.get_range_hashes(tabela, remoto['inicio'], remoto['fim'])
+                alterados.extend(registro_id for registro_id, hash_conteudo in hashes.items()
+                                 if locais.get(registro_id, 0) != hash_conteudo)
+                removidos.extend(registro_id for registro_id in range(remoto['inicio'], remoto['fim'] + 1)
+                                 if registro_id in locais and registro_id not in hashes)
+
+        return {'alterados': sorted(alterados), 'removidos': sorted(removidos)}
+
+# Instância global da sincronização incremental
+delta_sync = DeltaSync()
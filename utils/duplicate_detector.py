@@ -7,14 +7,14 @@ from fuzzywuzzy import fuzz
 import re
 import unicodedata
 
-from database.database_manager import DatabaseManager
+from database.database_manager import DatabaseManager, decoded_column
 from config import DUPLICATE_CHECK_FIELDS, SIMILARITY_THRESHOLD
 
 class DuplicateDetector:
     """Detector de duplicidades para registros MDM"""
     
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager: DatabaseManager = None):
+        self.db_manager = db_manager or DatabaseManager()
         self.threshold = SIMILARITY_THRESHOLD
     
     def normalize_text(self, text: str) -> str:
@@ -62,16 +62,19 @@ class DuplicateDetector:
             # Usar ratio da fuzzywuzzy
             return fuzz.ratio(text1, text2) / 100.0
     
-    def find_duplicates_clientes(self) -> List[Dict[str, Any]]:
+    def find_duplicates_clientes(self, conn: sqlite3.Connection = None) -> List[Dict[str, Any]]:
         """Encontrar duplicatas na tabela de clientes"""
-        with self.db_manager.get_connection() as conn:
-            cursor = conn.execute("""
-                SELECT id, nome, cpf_cnpj, email 
-                FROM clientes 
-                WHERE ativo = 1 
-                ORDER BY id
-            """)
-            records = cursor.fetchall()
+        if conn is None:
+            with self.db_manager.get_snapshot_connection() as conn:
+                return self.find_duplicates_clientes(conn)
+
+        cursor = conn.execute("""
+            SELECT id, nome, cpf_cnpj, email 
+            FROM clientes 
+            WHERE ativo = 1 
+            ORDER BY id
+        """)
+        records = cursor.fetchall()
         
         duplicates = []
         processed_ids = set()
@@ -135,16 +138,19 @@ class DuplicateDetector:
         
         return duplicates
     
-    def find_duplicates_produtos(self) -> List[Dict[str, Any]]:
+    def find_duplicates_produtos(self, conn: sqlite3.Connection = None) -> List[Dict[str, Any]]:
         """Encontrar duplicatas na tabela de produtos"""
-        with self.db_manager.get_connection() as conn:
-            cursor = conn.execute("""
-                SELECT id, nome, codigo, categoria 
-                FROM produtos 
-                WHERE ativo = 1 
-                ORDER BY id
-            """)
-            records = cursor.fetchall()
+        if conn is None:
+            with self.db_manager.get_snapshot_connection() as conn:
+                return self.find_duplicates_produtos(conn)
+
+        cursor = conn.execute(f"""
+            SELECT id, nome, codigo, {decoded_column('produtos', 'categoria')} 
+            FROM produtos 
+            WHERE ativo = 1 
+            ORDER BY id
+        """)
+        records = cursor.fetchall()
         
         duplicates = []
         processed_ids = set()
@@ -204,16 +210,19 @@ class DuplicateDetector:
         
         return duplicates
     
-    def find_duplicates_fornecedores(self) -> List[Dict[str, Any]]:
+    def find_duplicates_fornecedores(self, conn: sqlite3.Connection = None) -> List[Dict[str, Any]]:
         """Encontrar duplicatas na tabela de fornecedores"""
-        with self.db_manager.get_connection() as conn:
-            cursor = conn.execute("""
-                SELECT id, nome, cnpj, email 
-                FROM fornecedores 
-                WHERE ativo = 1 
-                ORDER BY id
-            """)
-            records = cursor.fetchall()
+        if conn is None:
+            with self.db_manager.get_snapshot_connection() as conn:
+                return self.find_duplicates_fornecedores(conn)
+
+        cursor = conn.execute("""
+            SELECT id, nome, cnpj, email 
+            FROM fornecedores 
+            WHERE ativo = 1 
+            ORDER BY id
+        """)
+        records = cursor.fetchall()
         
         duplicates = []
         processed_ids = set()
@@ -276,38 +285,49 @@ class DuplicateDetector:
     
     def find_all_duplicates(self) -> Dict[str, List[Dict[str, Any]]]:
         """Encontrar todas as duplicatas no sistema"""
-        return {
-            'clientes': self.find_duplicates_clientes(),
-            'produtos': self.find_duplicates_produtos(),
-            'fornecedores': self.find_duplicates_fornecedores()
-        }
+        # Um único snapshot: as três tabelas refletem o mesmo instante
+        with self.db_manager.get_snapshot_connection() as conn:
+            return {
+                'clientes': self.find_duplicates_clientes(conn),
+                'produtos': self.find_duplicates_produtos(conn),
+                'fornecedores': self.find_duplicates_fornecedores(conn)
+            }
     
     def merge_records(self, tabela: str, master_id: int, duplicate_ids: List[int], usuario: str = None) -> bool:
         """Mesclar registros duplicados (manter o master e desativar os duplicados)"""
+        def operacao(conn):
+            # Desativar registros duplicados
+            placeholders = ','.join(['?' for _ in duplicate_ids])
+            conn.execute(f"""
+                UPDATE {tabela} 
+                SET ativo = 0, data_atualizacao = CURRENT_TIMESTAMP, atualizado_por = ?
+                WHERE id IN ({placeholders})
+            """, [usuario] + duplicate_ids)
+            self.db_manager.refresh_content_hashes(conn, tabela, duplicate_ids)
+            
+            # Log de auditoria para cada registro mesclado (a tabela só aceita INSERT/UPDATE/DELETE)
+            for dup_id in duplicate_ids:
+                self.db_manager.log_audit(tabela, dup_id, "UPDATE", 
+                                        {'ativo': True}, 
+                                        {'ativo': False, 'merged_into': master_id}, usuario, conn=conn)
+
         try:
-            with self.db_manager.get_connection() as conn:
-                # Desativar registros duplicados
-                placeholders = ','.join(['?' for _ in duplicate_ids])
-                conn.execute(f"""
-                    UPDATE {tabela} 
-                    SET ativo = 0, data_atualizacao = CURRENT_TIMESTAMP, atualizado_por = ?
-                    WHERE id IN ({placeholders})
-                """, [usuario] + duplicate_ids)
-                
-                # Log de auditoria para cada registro mesclado
-                for dup_id in duplicate_ids:
-                    self.db_manager.log_audit(tabela, dup_id, "MERGE", 
-                                            {'merged_into': master_id}, 
-                                            {'ativo': False}, usuario)
-                
-                conn.commit()
-                return True
+            self.db_manager.execute_write(operacao)
+            self.db_manager.cache.invalidate(tabela, duplicate_ids)
+            return True
         except Exception as e:
             print(f"Erro ao mesclar registros: {e}")
             return False
     
     def get_duplicate_count(self) -> Dict[str, int]:
         """Obter contagem de duplicatas por tipo"""
+        # Recalculado só quando alguma das tabelas muda
+        return self.db_manager.memoize_by_generation(
+            "duplicates.count", ['clientes', 'produtos', 'fornecedores'], self._count_duplicates
+        )
+
+    def _count_duplicates(self) -> Dict[str, int]:
+        """Contar duplicatas varrendo as tabelas"""
         duplicates = self.find_all_duplicates()
         return {
             'clientes': len(duplicates['clientes']),
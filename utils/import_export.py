@@ -10,19 +10,20 @@ import json
 import tempfile
 import os
 
-from database.database_manager import DatabaseManager
+from database.database_manager import DatabaseManager, encoded_condition
+from database.query_budget import query_budgets
 from database.models import Cliente, Produto, Fornecedor
 
 class ImportExportManager:
     """Gerenciador de importação e exportação"""
     
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager: DatabaseManager = None):
+        self.db_manager = db_manager or DatabaseManager()
     
     def export_to_csv(self, tabela: str, filtros: Dict[str, Any] = None) -> bytes:
         """Exportar dados para CSV"""
-        with self.db_manager.get_connection() as conn:
-            query = f"SELECT * FROM {tabela} WHERE ativo = 1"
+        with query_budgets.budget('lote'), self.db_manager.get_snapshot_connection() as conn:
+            query = f"SELECT {self.db_manager.decoded_projection(tabela)} FROM {tabela} WHERE ativo = 1"
             params = []
             
             # Aplicar filtros se fornecidos
@@ -30,7 +31,7 @@ class ImportExportManager:
                 conditions = []
                 for campo, valor in filtros.items():
                     if valor:
-                        conditions.append(f"{campo} LIKE ?")
+                        conditions.append(encoded_condition(tabela, campo, "LIKE ?"))
                         params.append(f"%{valor}%")
                 
                 if conditions:
@@ -57,9 +58,9 @@ class ImportExportManager:
         excel_buffer = io.BytesIO()
         
         with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
-            with self.db_manager.get_connection() as conn:
+            with query_budgets.budget('lote'), self.db_manager.get_snapshot_connection() as conn:
                 for tabela in tabelas:
-                    query = f"SELECT * FROM {tabela} WHERE ativo = 1"
+                    query = f"SELECT {self.db_manager.decoded_projection(tabela)} FROM {tabela} WHERE ativo = 1"
                     params = []
                     
                     # Aplicar filtros específicos da tabela
@@ -67,7 +68,7 @@ class ImportExportManager:
                         conditions = []
                         for campo, valor in filtros[tabela].items():
                             if valor:
-                                conditions.append(f"{campo} LIKE ?")
+                                conditions.append(encoded_condition(tabela, campo, "LIKE ?"))
                                 params.append(f"%{valor}%")
                         
                         if conditions:
@@ -191,14 +192,20 @@ class ImportExportManager:
         return fields_map.get(tabela, [])
     
     def _process_import(self, df: pd.DataFrame, tabela: str, usuario: str = None) -> Dict[str, Any]:
-        """Processar importação dos dados"""
-        registros_importados = 0
+        """Processar importação dos dados (upsert pela chave natural: reimportar não duplica)"""
         registros_erro = 0
         erros = []
         
         # Limpar dados
         df = df.fillna('')
         
+        construtores = {
+            'clientes': self._create_cliente_from_row,
+            'produtos': self._create_produto_from_row,
+            'fornecedores': self._create_fornecedor_from_row
+        }
+        objetos = []
+        linhas = []
         for index, row in df.iterrows():
             try:
                 # Validar registro individual
@@ -209,25 +216,26 @@ class ImportExportManager:
                     continue
                 
                 # Criar objeto do modelo
-                if tabela == 'clientes':
-                    obj = self._create_cliente_from_row(row)
-                    self.db_manager.create_cliente(obj, usuario)
-                elif tabela == 'produtos':
-                    obj = self._create_produto_from_row(row)
-                    self.db_manager.create_produto(obj, usuario)
-                elif tabela == 'fornecedores':
-                    obj = self._create_fornecedor_from_row(row)
-                    self.db_manager.create_fornecedor(obj, usuario)
-                
-                registros_importados += 1
+                objetos.append(construtores[tabela](row))
+                linhas.append(index)
                 
             except Exception as e:
                 registros_erro += 1
                 erros.append(f"Linha {index + 2}: Erro ao importar - {str(e)}")
         
+        # Gravar em lotes; linhas idênticas ao que já está no banco não são reescritas
+        resultado = self.db_manager.upsert_records(tabela, objetos, usuario)
+        for posicao, erro in resultado['erros']:
+            registros_erro += 1
+            erros.append(f"Linha {linhas[posicao] + 2}: Erro ao importar - {str(erro)}")
+        registros_importados = resultado['inseridos'] + resultado['atualizados'] + resultado['inalterados']
+        
         return {
             'sucesso': registros_erro == 0,
             'registros_importados': registros_importados,
+            'registros_inseridos': resultado['inseridos'],
+            'registros_atualizados': resultado['atualizados'],
+            'registros_inalterados': resultado['inalterados'],
             'registros_erro': registros_erro,
             'total_processados': registros_importados + registros_erro,
             'erros': erros[:10],  # Limitar a 10 erros para não sobrecarregar a interface
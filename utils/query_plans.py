@@ -0,0 +1,427 @@
+"""
+Verificação dos planos de consulta (EXPLAIN QUERY PLAN) das consultas quentes
+"""
+from typing import List, Dict, Any, Tuple, Callable
+from datetime import datetime, timedelta
+from pathlib import Path
+import argparse
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+
+from database.database_manager import DatabaseManager, RECORD_MAPPINGS, COUNTED_TABLES, DIGEST_BUCKET_SIZE
+from database.sql_trace import fingerprint
+from database.storage import MemoryBackend
+from database.models import Cliente, Produto, Fornecedor
+from utils.search_engine import SearchEngine
+from utils.audit_manager import AuditManager
+from utils.import_export import ImportExportManager
+from utils.delta_sync import DeltaSync
+from utils.archive_manager import ArchiveManager
+
+def explain(conn: sqlite3.Connection, sql: str, params: Any = ()) -> List[str]:
+    """Obter as linhas de detalhe do plano de execução de uma consulta"""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+def get_hot_queries(search_engine: SearchEngine) -> List[Tuple[str, str, List, str]]:
+    """Consultas quentes no formato (descrição, sql, parâmetros, índice esperado)
+
+    O índice esperado pode ser um prefixo (ex.: qualquer índice parcial da tabela).
+    As consultas de busca são geradas pelo próprio SearchEngine para não divergirem.
+    """
+    queries = []
+
+    for tabela in ('clientes', 'produtos', 'fornecedores'):
+        columns, _ = RECORD_MAPPINGS[tabela]
+        queries.append((
+            f"Listagem de {tabela} ativos",
+            f"SELECT {columns} FROM {tabela} WHERE ativo = 1 ORDER BY nome LIMIT ? OFFSET ?",
+            [20, 0], f"idx_{tabela}_ativos_nome"
+        ))
+        query, params = search_engine.build_search_query(tabela, {})
+        queries.append((
+            f"Registros recentes de {tabela}",
+            query + " ORDER BY data_criacao DESC LIMIT ?", params + [10],
+            f"idx_{tabela}_ativos_data_criacao"
+        ))
+
+    queries.append((
+        "Projeção id, nome, cpf_cnpj ordenada por nome",
+        "SELECT id, nome, cpf_cnpj FROM clientes WHERE ativo = 1 ORDER BY nome",
+        [], "COVERING INDEX idx_clientes_ativos_nome"
+    ))
+
+    queries.append(("Cliente por documento normalizado",
+                    f"SELECT {RECORD_MAPPINGS['clientes'][0]} FROM clientes WHERE cpf_cnpj_digitos = ? AND ativo = 1",
+                    ['12345678900'], "idx_clientes_cpf_cnpj_digitos"))
+    queries.append(("Fornecedor por CNPJ normalizado",
+                    f"SELECT {RECORD_MAPPINGS['fornecedores'][0]} FROM fornecedores WHERE cnpj_digitos = ? AND ativo = 1",
+                    ['12345678000190'], "idx_fornecedores_cnpj_digitos"))
+
+    query, params = search_engine.build_search_query('clientes', {'estado': 'SP'})
+    queries.append(("Busca de clientes por estado", query + " ORDER BY nome ASC LIMIT ? OFFSET ?",
+                    params + [50, 0], "idx_clientes_ativos_estado"))
+
+    query, params = search_engine.build_search_query('clientes', {'tipo': 'pessoa_fisica'})
+    queries.append(("Busca de clientes por tipo", query + " ORDER BY nome ASC LIMIT ? OFFSET ?",
+                    params + [50, 0], "idx_clientes_ativos_tipo"))
+
+    query, params = search_engine.build_search_query('fornecedores', {'estado': 'SP'})
+    queries.append(("Busca de fornecedores por estado", query + " ORDER BY nome ASC LIMIT ? OFFSET ?",
+                    params + [50, 0], "idx_fornecedores_ativos_estado"))
+
+    query, params = search_engine.build_search_query('produtos', {'preco_min': 10, 'preco_max': 100})
+    queries.append(("Busca de produtos por faixa de preço", query + " ORDER BY preco ASC LIMIT ? OFFSET ?",
+                    params + [50, 0], "idx_produtos_ativos_preco"))
+
+    queries.extend([
+        ("Opções de filtro: estados",
+         "SELECT DISTINCT estado FROM clientes WHERE estado IS NOT NULL AND ativo = 1",
+         [], "COVERING INDEX idx_clientes_ativos_estado"),
+        ("Opções de filtro: categorias",
+         "SELECT DISTINCT categoria FROM produtos WHERE categoria IS NOT NULL AND ativo = 1",
+         [], "COVERING INDEX idx_produtos_ativos_categoria"),
+        ("Opções de filtro: subcategorias",
+         "SELECT DISTINCT subcategoria FROM produtos WHERE subcategoria IS NOT NULL AND ativo = 1",
+         [], "COVERING INDEX idx_produtos_ativos_subcategoria"),
+        ("Estatísticas por tipo de cliente",
+         "SELECT tipo, COUNT(*) as total FROM clientes WHERE ativo = 1 GROUP BY tipo",
+         [], "COVERING INDEX idx_clientes_ativos_tipo"),
+        ("Estatísticas por categoria",
+         "SELECT categoria, COUNT(*) as total FROM produtos WHERE ativo = 1 AND categoria IS NOT NULL "
+         "GROUP BY categoria ORDER BY total DESC LIMIT 10",
+         [], "COVERING INDEX idx_produtos_ativos_categoria"),
+        ("Contadores de registros ativos (dashboard)",
+         "SELECT tabela, ativos FROM contadores_registros WHERE tabela IN (?, ?, ?)",
+         list(COUNTED_TABLES), "PRIMARY KEY"),
+        ("Alterações de hoje (dashboard)",
+         "SELECT tabela, total FROM contadores_auditoria WHERE dia = date('now') AND total > 0",
+         [], "PRIMARY KEY"),
+        ("Histórico de um registro",
+         "SELECT * FROM audit_log WHERE tabela = ? AND registro_id = ? ORDER BY data_operacao DESC LIMIT ?",
+         ['clientes', 1, 100], "idx_audit_registro"),
+        ("Atividade de uma tabela",
+         "SELECT * FROM audit_log WHERE tabela = ? ORDER BY data_operacao DESC LIMIT ?",
+         ['clientes', 100], "idx_audit_tabela_data"),
+        ("Atividade de um usuário",
+         "SELECT * FROM audit_log WHERE usuario = ? AND data_operacao >= ? ORDER BY data_operacao DESC LIMIT ?",
+         ['admin', '2000-01-01', 100], "idx_audit_usuario")
+    ])
+
+    return queries
+
+def check_hot_queries(db_manager: DatabaseManager = None) -> List[Dict[str, Any]]:
+    """Confirmar via EXPLAIN QUERY PLAN que cada consulta quente usa o índice previsto"""
+    db_manager = db_manager or DatabaseManager()
+    search_engine = SearchEngine(db_manager)
+
+    results = []
+    with db_manager.get_connection() as conn:
+        for descricao, sql, params, indice in get_hot_queries(search_engine):
+            plano = explain(conn, sql, params)
+            results.append({
+                'consulta': descricao,
+                'indice_esperado': indice,
+                'plano': plano,
+                'ok': any(indice in linha for linha in plano)
+            })
+    return results
+
+# Suíte de regressão: todas as instruções emitidas pelos gerenciadores, sobre um banco sintético
+
+# Consultas que leem a tabela inteira ou ordenam um resultado agregado por natureza.
+# Formato: (padrão sobre a impressão digital da instrução, violações toleradas, motivo)
+PLAN_EXCEPTIONS = [
+    (re.compile(r"^SELECT .+ FROM (clientes|produtos|fornecedores) WHERE ativo = \?"
+                r"( AND \w+ (LIKE \?|IN \(SELECT codigo FROM dicionario WHERE campo = \? AND valor LIKE \?\)))*$"),
+     {'scan'}, "exportação lê todas as linhas ativas"),
+    (re.compile(r"AND \w+ IN \(SELECT codigo FROM dicionario WHERE campo = \? AND valor LIKE \?\) ORDER BY"),
+     {'temp'}, "ordena apenas as linhas dos códigos cujo texto casa com o filtro"),
+    (re.compile(r"ORDER BY \(SELECT valor FROM dicionario WHERE campo = \? AND codigo = \w+\.\w+\)"),
+     {'temp'}, "coluna codificada: a ordem do texto não é a dos códigos"),
+    (re.compile(r"preco >= \? AND preco <= \? ORDER BY (?!preco)"),
+     {'temp'}, "ordena apenas as linhas dentro da faixa de preço"),
+    (re.compile(r"GROUP BY .* ORDER BY (total|dia) DESC"),
+     {'temp'}, "ordenação sobre o resultado já agregado"),
+    (re.compile(r"FROM audit_log (al )?(LEFT JOIN usuarios u ON al\.usuario = u\.username )?"
+                r"WHERE (al\.)?data_operacao >= \? GROUP BY"),
+     {'temp'}, "relatório agregado do período"),
+    (re.compile(r"^SELECT (.+ |COUNT\(\*\) )FROM (clientes|produtos|fornecedores)_arquivo( ORDER BY id DESC LIMIT \? OFFSET \?)?$"),
+     {'scan'}, "arquivo frio: listagem paginada pelo id e contagem das estatísticas")
+]
+
+def find_plan_violations(plano: List[str]) -> set:
+    """Classificar o plano: 'scan' para varredura completa de tabela, 'temp' para B-tree temporária"""
+    violations = set()
+    for linha in plano:
+        if re.match(r"^SCAN \w+$", linha):
+            violations.add('scan')
+        if 'USE TEMP B-TREE' in linha:
+            violations.add('temp')
+    return violations
+
+def populate_synthetic_database(db_manager: DatabaseManager, tamanho: int = 20000, seed: int = 42):
+    """Popular o banco com dados sintéticos de distribuição realista (80% ativos, datas em 2 anos)"""
+    rng = random.Random(seed)
+    estados = ['SP', 'RJ', 'MG', 'BA', 'PR', 'RS', 'SC', 'PE', 'CE', 'GO', 'DF', 'ES', 'PA', 'AM']
+    cidades = [f"Cidade {i}" for i in range(500)]
+    agora = datetime.now()
+
+    def data(dias: int) -> str:
+        return (agora - timedelta(days=rng.uniform(0, dias))).strftime('%Y-%m-%d %H:%M:%S')
+
+    with db_manager.get_connection() as conn:
+        # Colunas de baixa cardinalidade gravadas como códigos do dicionário
+        def codigo(campo: str, valor: str) -> int:
+            return db_manager.dictionary.encode(conn, campo, valor)
+
+        conn.executemany("""
+            INSERT INTO clientes (nome, cpf_cnpj, cpf_cnpj_digitos, email, telefone, endereco, cidade, estado, cep, tipo, ativo, data_criacao, data_atualizacao)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(
+            f"Cliente {rng.randrange(10**6)} {i}", f"{i:011d}", f"{i:011d}", f"cliente{i}@email.com", "11999999999",
+            f"Rua {i}", codigo('cidade', rng.choice(cidades)), codigo('estado', rng.choice(estados)), "01234-567",
+            codigo('tipo', rng.choice(['pessoa_fisica', 'pessoa_juridica'])), int(rng.random() < 0.8), data(730), data(365)
+        ) for i in range(tamanho)])
+
+        conn.executemany("""
+            INSERT INTO produtos (nome, codigo, descricao, categoria, subcategoria, preco, unidade_medida, ativo, data_criacao, data_atualizacao)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(
+            f"Produto {rng.randrange(10**6)} {i}", f"PROD{i:07d}", "Descrição", codigo('categoria', f"Categoria {i % 40}"),
+            codigo('subcategoria', f"Subcategoria {i % 200}"), round(rng.uniform(1, 5000), 2),
+            codigo('unidade_medida', rng.choice(['UN', 'KG', 'CX'])),
+            int(rng.random() < 0.8), data(730), data(365)
+        ) for i in range(tamanho)])
+
+        conn.executemany("""
+            INSERT INTO fornecedores (nome, cnpj, cnpj_digitos, email, telefone, endereco, cidade, estado, cep, contato_principal, ativo, data_criacao, data_atualizacao)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(
+            f"Fornecedor {rng.randrange(10**6)} {i}", f"{i:014d}", f"{i:014d}", f"fornecedor{i}@email.com", "1133333333",
+            f"Av. {i}", codigo('cidade', rng.choice(cidades)), codigo('estado', rng.choice(estados)), "04567-890", "Contato",
+            int(rng.random() < 0.8), data(730), data(365)
+        ) for i in range(tamanho)])
+
+        conn.executemany("""
+            INSERT INTO audit_log (tabela, registro_id, operacao, dados_anteriores, dados_novos, usuario, data_operacao)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(
+            rng.choice(['clientes', 'produtos', 'fornecedores']), rng.randrange(1, tamanho),
+            rng.choice(['INSERT', 'UPDATE', 'DELETE']), None, '{"ativo": true}',
+            rng.choice(['admin', 'editor', 'importador']), data(400)
+        ) for _ in range(tamanho * 3)])
+
+        for tabela in ('clientes', 'produtos', 'fornecedores'):
+            db_manager.refresh_content_hashes(conn, tabela)
+        conn.commit()
+
+def exercise_managers(db_manager: DatabaseManager, search_engine: SearchEngine,
+                      audit_manager: AuditManager, import_export_manager: ImportExportManager,
+                      delta_sync: DeltaSync, archive_manager: ArchiveManager, rodada: int = 0):
+    """Chamar as APIs públicas de leitura e escrita com argumentos representativos
+
+    rodada diferencia as chaves naturais dos registros criados em execuções sucessivas.
+    """
+    db = db_manager
+    for tabela, listar in (('clientes', db.list_clientes), ('produtos', db.list_produtos),
+                           ('fornecedores', db.list_fornecedores)):
+        listar()
+        listar(limit=20, offset=40)
+        listar(ativo_apenas=False, limit=20)
+        listar(limit=20, fields=['id', 'nome'])
+        db.search_records(tabela, 'Registro 1', ['nome'])
+    db.get_cliente(1), db.get_produto(1), db.get_fornecedor(1)
+    db.get_cliente_by_documento('000.000.000-01'), db.get_fornecedor_by_cnpj('00.000.000/0000-01')
+    for tabela in ('clientes', 'produtos', 'fornecedores'):
+        db.get_many(tabela, range(1, 1200, 2))
+    db.get_many_by_key('clientes', 'cpf_cnpj', [f"{i:011d}" for i in range(50)])
+    db.get_many_by_key('clientes', 'cpf_cnpj_digitos', [f"{i:011d}" for i in range(50)])
+    db.get_many_by_key('produtos', 'codigo', [f"PROD{i:07d}" for i in range(50)])
+    db.get_many_by_key('fornecedores', 'cnpj_digitos', [f"{i:014d}" for i in range(50)])
+    db.get_dashboard_metrics()
+    db.get_audit_log(), db.get_audit_log('clientes'), db.get_audit_log('clientes', 1)
+
+    cliente = Cliente("Cliente Regressão", f"9{rodada:010d}", "regressao@email.com", "", "", "São Paulo", "SP", "", "pessoa_fisica")
+    cliente_id = db.create_cliente(cliente, "admin")
+    db.update_cliente(cliente_id, cliente, "admin")
+    db.delete_cliente(cliente_id, "admin")
+    db.upsert_cliente(cliente, "admin")
+    produto = Produto("Produto Regressão", f"REGRESSAO{rodada}", "", "Categoria 1", "", 10.0, "UN")
+    produto_id = db.create_produto(produto, "admin")
+    db.update_produto(produto_id, produto, "admin")
+    db.delete_produto(produto_id, "admin")
+    fornecedor = Fornecedor("Fornecedor Regressão", f"9{rodada:013d}", "regressao@email.com", "", "", "São Paulo", "SP", "", "")
+    fornecedor_id = db.create_fornecedor(fornecedor, "admin")
+    db.update_fornecedor(fornecedor_id, fornecedor, "admin")
+    db.delete_fornecedor(fornecedor_id, "admin")
+    db.upsert_records('fornecedores', [fornecedor, fornecedor], "admin")
+
+    filtros_por_tabela = {
+        'clientes': [{}, {'termo_busca': 'Cliente 1'}, {'estado': 'SP'}, {'tipo': 'pessoa_fisica'},
+                     {'cidade': 'Cidade 1'}, {'estado': 'SP', 'tipo': 'pessoa_juridica'}],
+        'produtos': [{}, {'termo_busca': 'Produto 1'}, {'categoria': 'Categoria 1'},
+                     {'subcategoria': 'Subcategoria 1'}, {'preco_min': 10, 'preco_max': 100}],
+        'fornecedores': [{}, {'termo_busca': 'Fornecedor 1'}, {'estado': 'RJ'}, {'cidade': 'Cidade 2'}]
+    }
+    ordenacoes = {
+        'clientes': ['nome', 'cpf_cnpj', 'email', 'cidade', 'data_criacao'],
+        'produtos': ['nome', 'codigo', 'categoria', 'preco', 'data_criacao'],
+        'fornecedores': ['nome', 'cnpj', 'email', 'cidade', 'data_criacao']
+    }
+    buscas = {'clientes': search_engine.search_clientes, 'produtos': search_engine.search_produtos,
+              'fornecedores': search_engine.search_fornecedores}
+    for tabela, buscar in buscas.items():
+        for filtros in filtros_por_tabela[tabela]:
+            buscar(filtros)
+            search_engine.get_search_count(tabela, filtros)
+        for coluna in ordenacoes[tabela]:
+            buscar({}, order_by=coluna, order_dir='DESC')
+    search_engine.get_filter_options()
+    search_engine.search_global('Regressão')
+    search_engine.get_recent_records()
+    search_engine.get_statistics()
+
+    audit_manager.get_audit_history()
+    audit_manager.get_audit_history(tabela='clientes')
+    audit_manager.get_audit_history(usuario='admin')
+    audit_manager.get_record_versions('clientes', cliente_id)
+    audit_manager.get_activity_summary()
+    audit_manager.get_user_activity('admin')
+    audit_manager.get_table_activity('produtos')
+    audit_manager.export_audit_log({'tabela': 'clientes'})
+    audit_manager.get_compliance_report()
+    feed = audit_manager.changes_since(0, 100)
+    audit_manager.changes_since(feed['cursor'], 100)
+
+    import_export_manager.export_to_csv('clientes')
+    import_export_manager.export_to_csv('clientes', {'nome': 'Cliente 1'})
+    import_export_manager.export_to_excel()
+    import_export_manager.import_from_csv(import_export_manager.get_template_csv('produtos'), 'produtos', 'admin')
+
+    # Atualização dos digests (a manutenção agendada a roda) antes das leituras da sincronização
+    delta_sync.refresh_digests('clientes')
+    for tabela in ('clientes', 'produtos', 'fornecedores'):
+        no = delta_sync.get_range_digests(tabela)[0]
+        delta_sync.get_range_digests(tabela, no['inicio'], no['fim'])
+        delta_sync.get_range_hashes(tabela, no['inicio'], no['inicio'] + DIGEST_BUCKET_SIZE - 1)
+    delta_sync.get_records('clientes', [cliente_id])
+
+    # Por último, pois removem linhas
+    archive_manager.archive_inactive(dias=300, lote=200)
+    for tabela in ('clientes', 'produtos', 'fornecedores'):
+        arquivados = archive_manager.list_archived(tabela, limit=5)
+        archive_manager.restore_archived(tabela, [registro['id'] for registro in arquivados])
+    archive_manager.get_archive_stats()
+    audit_manager.clean_old_logs(dias_manter=365)
+
+def capture_statements(db_manager: DatabaseManager, action: Callable[[], Any]) -> List[str]:
+    """Executar action registrando (via trace callback) cada instrução SQL emitida"""
+    statements = []
+
+    def traced(get_connection: Callable[..., sqlite3.Connection]) -> Callable[..., sqlite3.Connection]:
+        def traced_connection(*args, **kwargs) -> sqlite3.Connection:
+            conn = get_connection(*args, **kwargs)
+            conn.set_trace_callback(statements.append)
+            return conn
+        return traced_connection
+
+    # A thread escritora reabre sua conexão (agora rastreada) na próxima escrita
+    db_manager.writer.close()
+    db_manager.get_connection = traced(db_manager.get_connection)
+    db_manager.get_snapshot_connection = traced(db_manager.get_snapshot_connection)
+    try:
+        action()
+    finally:
+        db_manager.writer.close()
+        del db_manager.get_connection
+        del db_manager.get_snapshot_connection
+    return statements
+
+def run_regression_suite(tamanho: int = 20000, db_path: str = None,
+                         memoria: bool = False) -> List[Dict[str, Any]]:
+    """Rodar todas as instruções dos gerenciadores em EXPLAIN QUERY PLAN, com e sem ANALYZE
+
+    Cada instrução distinta (pela impressão digital) falha quando o plano tem varredura
+    completa de tabela ou B-tree temporária e não está em PLAN_EXCEPTIONS. Com memoria,
+    o banco sintético fica na RAM, sem I/O de disco.
+    """
+    if memoria:
+        db_manager = DatabaseManager(storage=MemoryBackend())
+    else:
+        if db_path is None:
+            db_path = str(Path(tempfile.mkdtemp(prefix='mdm_planos_')) / 'regressao.db')
+        db_manager = DatabaseManager(db_path)
+    populate_synthetic_database(db_manager, tamanho)
+    managers = (SearchEngine(db_manager), AuditManager(db_manager), ImportExportManager(db_manager),
+                DeltaSync(db_manager), ArchiveManager(db_manager))
+
+    results = {}
+    for rodada, estatisticas in enumerate((False, True)):
+        if estatisticas:
+            with db_manager.get_connection() as conn:
+                conn.execute("ANALYZE")
+
+        statements = capture_statements(db_manager, lambda: exercise_managers(db_manager, *managers, rodada))
+        with db_manager.get_connection() as conn:
+            for sql in statements:
+                if not re.match(r"^\s*(SELECT|UPDATE|DELETE|WITH)\b", sql, re.IGNORECASE):
+                    continue
+                chave = fingerprint(sql)
+                plano = explain(conn, sql)
+                violacoes = find_plan_violations(plano)
+                excecao = next((motivo for padrao, toleradas, motivo in PLAN_EXCEPTIONS
+                                if padrao.search(chave) and violacoes <= toleradas), None)
+
+                result = results.setdefault(chave, {
+                    'consulta': chave, 'exemplo': sql, 'plano': plano,
+                    'violacoes': set(), 'excecao': excecao, 'ok': True
+                })
+                result['violacoes'] |= violacoes
+                if violacoes and not excecao:
+                    result['ok'] = False
+                    result['plano'] = plano
+                    result['excecao'] = None
+
+    return list(results.values())
+
+def main() -> int:
+    """Imprimir o relatório de planos e retornar código de saída (1 se houver falhas)"""
+    parser = argparse.ArgumentParser(description="Verificação de planos de consulta do MDM")
+    parser.add_argument('--regressao', action='store_true',
+                        help="rodar a suíte de regressão sobre um banco sintético")
+    parser.add_argument('--tamanho', type=int, default=20000,
+                        help="registros por tabela mestre no banco sintético")
+    parser.add_argument('--memoria', action='store_true',
+                        help="manter o banco sintético em memória")
+    args = parser.parse_args()
+
+    if args.regressao:
+        results = run_regression_suite(args.tamanho, memoria=args.memoria)
+        for result in results:
+            if result['ok']:
+                sufixo = f" ({result['excecao']})" if result['violacoes'] else ""
+                print(f"✅ {result['consulta'][:140]}{sufixo}")
+            else:
+                print(f"❌ {result['consulta']}")
+                for linha in result['plano']:
+                    print(f"      {linha}")
+        falhas = [r for r in results if not r['ok']]
+        print(f"\n{len(results) - len(falhas)}/{len(results)} instruções sem regressão de plano")
+        return 1 if falhas else 0
+
+    results = check_hot_queries()
+    for result in results:
+        status = "✅" if result['ok'] else "❌"
+        print(f"{status} {result['consulta']} (esperado: {result['indice_esperado']})")
+        for linha in result['plano']:
+            print(f"      {linha}")
+
+    falhas = [r for r in results if not r['ok']]
+    print(f"\n{len(results) - len(falhas)}/{len(results)} consultas usando o índice previsto")
+    return 1 if falhas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,17 +5,18 @@ from typing import List, Dict, Any, Optional, Tuple
 import sqlite3
 import re
 
-from database.database_manager import DatabaseManager
+from database.database_manager import DatabaseManager, decoded_column, decoded_value, encoded_condition
 
 class SearchEngine:
     """Motor de busca avançada"""
     
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager: DatabaseManager = None):
+        self.db_manager = db_manager or DatabaseManager()
     
-    def build_search_query(self, tabela: str, filtros: Dict[str, Any]) -> Tuple[str, List]:
+    def build_search_query(self, tabela: str, filtros: Dict[str, Any], fields: List[str] = None) -> Tuple[str, List]:
         """Construir query de busca baseada nos filtros"""
-        base_query = f"SELECT * FROM {tabela} WHERE ativo = 1"
+        projection = self.db_manager.decoded_projection(tabela, fields)
+        base_query = f"SELECT {projection} FROM {tabela} WHERE ativo = 1"
         params = []
         conditions = []
         
@@ -27,7 +28,7 @@ class SearchEngine:
                     "nome LIKE ?",
                     "cpf_cnpj LIKE ?",
                     "email LIKE ?",
-                    "cidade LIKE ?",
+                    encoded_condition(tabela, "cidade", "LIKE ?"),
                     "endereco LIKE ?"
                 ]
                 conditions.append(f"({' OR '.join(text_conditions)})")
@@ -38,8 +39,8 @@ class SearchEngine:
                     "nome LIKE ?",
                     "codigo LIKE ?",
                     "descricao LIKE ?",
-                    "categoria LIKE ?",
-                    "subcategoria LIKE ?"
+                    encoded_condition(tabela, "categoria", "LIKE ?"),
+                    encoded_condition(tabela, "subcategoria", "LIKE ?")
                 ]
                 conditions.append(f"({' OR '.join(text_conditions)})")
                 params.extend([f"%{termo}%" for _ in text_conditions])
@@ -49,7 +50,7 @@ class SearchEngine:
                     "nome LIKE ?",
                     "cnpj LIKE ?",
                     "email LIKE ?",
-                    "cidade LIKE ?",
+                    encoded_condition(tabela, "cidade", "LIKE ?"),
                     "contato_principal LIKE ?"
                 ]
                 conditions.append(f"({' OR '.join(text_conditions)})")
@@ -61,23 +62,23 @@ class SearchEngine:
                 continue
             
             if campo == 'tipo' and tabela == 'clientes':
-                conditions.append("tipo = ?")
+                conditions.append(encoded_condition(tabela, "tipo", "= ?"))
                 params.append(valor)
             
             elif campo == 'categoria' and tabela == 'produtos':
-                conditions.append("categoria LIKE ?")
+                conditions.append(encoded_condition(tabela, "categoria", "LIKE ?"))
                 params.append(f"%{valor}%")
             
             elif campo == 'subcategoria' and tabela == 'produtos':
-                conditions.append("subcategoria LIKE ?")
+                conditions.append(encoded_condition(tabela, "subcategoria", "LIKE ?"))
                 params.append(f"%{valor}%")
             
             elif campo == 'estado':
-                conditions.append("estado = ?")
+                conditions.append(encoded_condition(tabela, "estado", "= ?"))
                 params.append(valor)
             
             elif campo == 'cidade':
-                conditions.append("cidade LIKE ?")
+                conditions.append(encoded_condition(tabela, "cidade", "LIKE ?"))
                 params.append(f"%{valor}%")
             
             elif campo == 'preco_min' and tabela == 'produtos':
@@ -95,14 +96,15 @@ class SearchEngine:
         return base_query, params
     
     def search_clientes(self, filtros: Dict[str, Any], limit: int = 50, offset: int = 0, 
-                       order_by: str = 'nome', order_dir: str = 'ASC') -> List[Dict]:
-        """Buscar clientes com filtros avançados"""
-        query, params = self.build_search_query('clientes', filtros)
+                       order_by: str = 'nome', order_dir: str = 'ASC', fields: List[str] = None) -> List[Dict]:
+        """Buscar clientes com filtros avançados (fields restringe as colunas retornadas)"""
+        query, params = self.build_search_query('clientes', filtros, fields)
         
         # Adicionar ordenação
         valid_columns = ['nome', 'cpf_cnpj', 'email', 'cidade', 'data_criacao']
         if order_by in valid_columns:
-            query += f" ORDER BY {order_by} {order_dir.upper()}"
+            # Colunas codificadas ordenam pelo texto, não pelo código
+            query += f" ORDER BY {decoded_value('clientes', order_by)} {order_dir.upper()}"
         else:
             query += " ORDER BY nome ASC"
         
@@ -115,14 +117,15 @@ class SearchEngine:
             return [dict(row) for row in cursor.fetchall()]
     
     def search_produtos(self, filtros: Dict[str, Any], limit: int = 50, offset: int = 0,
-                       order_by: str = 'nome', order_dir: str = 'ASC') -> List[Dict]:
-        """Buscar produtos com filtros avançados"""
-        query, params = self.build_search_query('produtos', filtros)
+                       order_by: str = 'nome', order_dir: str = 'ASC', fields: List[str] = None) -> List[Dict]:
+        """Buscar produtos com filtros avançados (fields restringe as colunas retornadas)"""
+        query, params = self.build_search_query('produtos', filtros, fields)
         
         # Adicionar ordenação
         valid_columns = ['nome', 'codigo', 'categoria', 'preco', 'data_criacao']
         if order_by in valid_columns:
-            query += f" ORDER BY {order_by} {order_dir.upper()}"
+            # Colunas codificadas ordenam pelo texto, não pelo código
+            query += f" ORDER BY {decoded_value('produtos', order_by)} {order_dir.upper()}"
         else:
             query += " ORDER BY nome ASC"
         
@@ -135,14 +138,15 @@ class SearchEngine:
             return [dict(row) for row in cursor.fetchall()]
     
     def search_fornecedores(self, filtros: Dict[str, Any], limit: int = 50, offset: int = 0,
-                           order_by: str = 'nome', order_dir: str = 'ASC') -> List[Dict]:
-        """Buscar fornecedores com filtros avançados"""
-        query, params = self.build_search_query('fornecedores', filtros)
+                           order_by: str = 'nome', order_dir: str = 'ASC', fields: List[str] = None) -> List[Dict]:
+        """Buscar fornecedores com filtros avançados (fields restringe as colunas retornadas)"""
+        query, params = self.build_search_query('fornecedores', filtros, fields)
         
         # Adicionar ordenação
         valid_columns = ['nome', 'cnpj', 'email', 'cidade', 'data_criacao']
         if order_by in valid_columns:
-            query += f" ORDER BY {order_by} {order_dir.upper()}"
+            # Colunas codificadas ordenam pelo texto, não pelo código
+            query += f" ORDER BY {decoded_value('fornecedores', order_by)} {order_dir.upper()}"
         else:
             query += " ORDER BY nome ASC"
         
@@ -156,8 +160,8 @@ class SearchEngine:
     
     def get_search_count(self, tabela: str, filtros: Dict[str, Any]) -> int:
         """Obter contagem total de resultados da busca"""
-        query, params = self.build_search_query(tabela, filtros)
-        count_query = query.replace("SELECT *", "SELECT COUNT(*)")
+        query, params = self.build_search_query(tabela, filtros, ['id'])
+        count_query = query.replace("SELECT id", "SELECT COUNT(*)", 1)
         
         with self.db_manager.get_connection() as conn:
             cursor = conn.execute(count_query, params)
@@ -165,19 +169,29 @@ class SearchEngine:
     
     def get_filter_options(self) -> Dict[str, List[str]]:
         """Obter opções para filtros (categorias, estados, etc.)"""
+        # Recalculado só quando alguma das tabelas muda
+        return self.db_manager.memoize_by_generation(
+            "search.filter_options", ['clientes', 'produtos', 'fornecedores'], self._load_filter_options
+        )
+
+    def _load_filter_options(self) -> Dict[str, List[str]]:
+        """Consultar no banco as opções de filtro"""
         with self.db_manager.get_connection() as conn:
+            # Códigos distintos pelos índices, traduzidos para o texto no fim
+            decodificar = self.db_manager.dictionary.decoder(conn)
+
+            def distintos(tabela, campo):
+                codigos = conn.execute(f"SELECT DISTINCT {campo} FROM {tabela} WHERE {campo} IS NOT NULL AND ativo = 1").fetchall()
+                return {decodificar(campo, row[0]) for row in codigos} - {'', None}
+
             # Estados únicos
-            estados = [row[0] for row in conn.execute("SELECT DISTINCT estado FROM clientes WHERE estado IS NOT NULL AND estado != '' AND ativo = 1").fetchall()]
-            estados.extend([row[0] for row in conn.execute("SELECT DISTINCT estado FROM fornecedores WHERE estado IS NOT NULL AND estado != '' AND ativo = 1").fetchall()])
-            estados = sorted(list(set(estados)))
+            estados = sorted(distintos('clientes', 'estado') | distintos('fornecedores', 'estado'))
             
             # Categorias de produtos
-            categorias = [row[0] for row in conn.execute("SELECT DISTINCT categoria FROM produtos WHERE categoria IS NOT NULL AND categoria != '' AND ativo = 1").fetchall()]
-            categorias = sorted(categorias)
+            categorias = sorted(distintos('produtos', 'categoria'))
             
             # Subcategorias de produtos
-            subcategorias = [row[0] for row in conn.execute("SELECT DISTINCT subcategoria FROM produtos WHERE subcategoria IS NOT NULL AND subcategoria != '' AND ativo = 1").fetchall()]
-            subcategorias = sorted(subcategorias)
+            subcategorias = sorted(distintos('produtos', 'subcategoria'))
             
             # Tipos de cliente
             tipos_cliente = ['pessoa_fisica', 'pessoa_juridica']
@@ -189,12 +203,14 @@ class SearchEngine:
                 'tipos_cliente': tipos_cliente
             }
     
-    def search_global(self, termo: str, limit: int = 20) -> Dict[str, List[Dict]]:
-        """Busca global em todas as tabelas"""
+    def search_global(self, termo: str, limit: int = 20,
+                      fields: Dict[str, List[str]] = None) -> Dict[str, List[Dict]]:
+        """Busca global em todas as tabelas (fields: colunas por tabela)"""
+        fields = fields or {}
         results = {
-            'clientes': self.search_clientes({'termo_busca': termo}, limit=limit),
-            'produtos': self.search_produtos({'termo_busca': termo}, limit=limit),
-            'fornecedores': self.search_fornecedores({'termo_busca': termo}, limit=limit)
+            'clientes': self.search_clientes({'termo_busca': termo}, limit=limit, fields=fields.get('clientes')),
+            'produtos': self.search_produtos({'termo_busca': termo}, limit=limit, fields=fields.get('produtos')),
+            'fornecedores': self.search_fornecedores({'termo_busca': termo}, limit=limit, fields=fields.get('fornecedores'))
         }
         
         return results
@@ -210,8 +226,8 @@ class SearchEngine:
                 LIMIT ?
             """, (limit,)).fetchall()
             
-            produtos = conn.execute("""
-                SELECT id, nome, codigo, categoria, data_criacao 
+            produtos = conn.execute(f"""
+                SELECT id, nome, codigo, {decoded_column('produtos', 'categoria')}, data_criacao 
                 FROM produtos 
                 WHERE ativo = 1 
                 ORDER BY data_criacao DESC 
@@ -234,7 +250,20 @@ class SearchEngine:
     
     def get_statistics(self) -> Dict[str, Any]:
         """Obter estatísticas de busca"""
+        # Recalculado só quando alguma das tabelas muda
+        return self.db_manager.memoize_by_generation(
+            "search.statistics", ['clientes', 'produtos', 'fornecedores'], self._load_statistics
+        )
+
+    def _load_statistics(self) -> Dict[str, Any]:
+        """Consultar no banco as estatísticas de busca"""
         with self.db_manager.get_connection() as conn:
+            # Agrupadas pelos códigos inteiros; só as linhas do resultado são traduzidas
+            decodificar = self.db_manager.dictionary.decoder(conn)
+
+            def traduzir(campo, linhas):
+                return [{campo: decodificar(campo, row[0]), 'total': row['total']} for row in linhas]
+
             # Estatísticas por estado
             stats_estados = conn.execute("""
                 SELECT estado, COUNT(*) as total
@@ -267,9 +296,9 @@ class SearchEngine:
             """).fetchall()
             
             return {
-                'por_estado': [dict(row) for row in stats_estados],
-                'por_categoria': [dict(row) for row in stats_categorias],
-                'por_tipo_cliente': [dict(row) for row in stats_tipos]
+                'por_estado': traduzir('estado', stats_estados),
+                'por_categoria': traduzir('categoria', stats_categorias),
+                'por_tipo_cliente': traduzir('tipo', stats_tipos)
             }
 
 # Instância global do motor de busca
@@ -9,10 +9,14 @@ import os
 import sqlite3
 
 # Importações dos módulos locais
+from config import CACHE_SNAPSHOT_ENABLED
 from database.database_manager import db_manager
+from database.query_budget import query_budgets, QueryBudgetExceeded
+from database.cache_snapshot import cache_snapshot
 from utils.auth import auth_manager
 from utils.duplicate_detector import duplicate_detector
 from utils.validators import validators
+from utils.search_engine import search_engine
 from database.models import Cliente, Produto, Fornecedor
 
 class MDMWebHandler(BaseHTTPRequestHandler):
@@ -20,7 +24,8 @@ class MDMWebHandler(BaseHTTPRequestHandler):
     
     def do_GET(self):
         """Lidar com requisições GET"""
-        path = urlparse.urlparse(self.path).path
+        parsed = urlparse.urlparse(self.path)
+        path = parsed.path
         
         if path == '/' or path == '/dashboard':
             self.serve_dashboard()
@@ -30,6 +35,8 @@ class MDMWebHandler(BaseHTTPRequestHandler):
             self.serve_api_metrics()
         elif path == '/api/duplicates':
             self.serve_api_duplicates()
+        elif path in ('/api/clientes', '/api/produtos', '/api/fornecedores'):
+            self.serve_api_search(path.rsplit('/', 1)[-1], parsed.query)
         elif path.startswith('/static/'):
             self.serve_static_file(path)
         else:
@@ -472,16 +479,56 @@ class MDMWebHandler(BaseHTTPRequestHandler):
     def serve_api_duplicates(self):
         """Servir API de duplicatas"""
         try:
-            duplicates = duplicate_detector.find_all_duplicates()
+            with query_budgets.budget('interativa'):
+                duplicates = duplicate_detector.find_all_duplicates()
             
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
             self.wfile.write(json.dumps(duplicates, ensure_ascii=False).encode('utf-8'))
             
+        except QueryBudgetExceeded as e:
+            self.serve_json_error(str(e), status=503)
         except Exception as e:
             self.serve_json_error(f"Erro ao carregar duplicatas: {str(e)}")
     
+    def serve_api_search(self, tabela, query_string):
+        """Servir API de busca (?q=&fields=id,nome&limit=&offset= e filtros da tabela)"""
+        search = {
+            'clientes': search_engine.search_clientes,
+            'produtos': search_engine.search_produtos,
+            'fornecedores': search_engine.search_fornecedores
+        }[tabela]
+        
+        try:
+            filtros = {key: values[0] for key, values in urlparse.parse_qs(query_string).items()}
+            fields = filtros.pop('fields', None)
+            limit = int(filtros.pop('limit', 50))
+            offset = int(filtros.pop('offset', 0))
+            order_by = filtros.pop('order_by', 'nome')
+            order_dir = 'DESC' if filtros.pop('order_dir', 'ASC').upper() == 'DESC' else 'ASC'
+            if 'q' in filtros:
+                filtros['termo_busca'] = filtros.pop('q')
+            
+            # Busca sem índice (LIKE '%x%' com OFFSET alto) não segura a thread além do orçamento
+            with query_budgets.budget('interativa'):
+                results = search(filtros, limit=limit, offset=offset, order_by=order_by,
+                                 order_dir=order_dir, fields=fields)
+        except QueryBudgetExceeded as e:
+            self.serve_json_error(str(e), status=503)
+            return
+        except ValueError as e:
+            self.serve_json_error(str(e), status=400)
+            return
+        except Exception as e:
+            self.serve_json_error(f"Erro na busca: {str(e)}")
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(results, ensure_ascii=False).encode('utf-8'))
+    
     def handle_login(self):
         """Lidar com login"""
         try:
@@ -543,17 +590,21 @@ class MDMWebHandler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(html.encode('utf-8'))
     
-    def serve_json_error(self, error_message):
+    def serve_json_error(self, error_message, status=500):
         """Servir erro JSON"""
         error_data = {'error': error_message, 'success': False}
         
-        self.send_response(500)
+        self.send_response(status)
         self.send_header('Content-type', 'application/json')
         self.end_headers()
         self.wfile.write(json.dumps(error_data, ensure_ascii=False).encode('utf-8'))
 
 def run_server(port=8501):
     """Executar servidor web"""
+    if CACHE_SNAPSHOT_ENABLED:
+        for modulo in (auth_manager, duplicate_detector, search_engine):
+            cache_snapshot.register(modulo.db_manager)
+        cache_snapshot.load()
     try:
         server_address = ('', port)
         httpd = HTTPServer(server_address, MDMWebHandler)
@@ -569,6 +620,7 @@ def run_server(port=8501):
         • http://localhost:{port}/login - Página de login
         • http://localhost:{port}/api/metrics - API de métricas
         • http://localhost:{port}/api/duplicates - API de duplicatas
+        • http://localhost:{port}/api/clientes?q=&fields=id,nome,cpf_cnpj - API de busca
         
         ⚡ Servidor rodando... Pressione Ctrl+C para parar.
         """)
@@ -579,6 +631,9 @@ def run_server(port=8501):
         print("\n🛑 Servidor encerrado pelo usuário.")
     except Exception as e:
         print(f"❌ Erro ao iniciar servidor: {e}")
+    finally:
+        if CACHE_SNAPSHOT_ENABLED:
+            cache_snapshot.save()
 
 if __name__ == "__main__":
     run_server()
\ No newline at end of file